@@ -0,0 +1,50 @@
+from django.db.models import Exists, OuterRef
+
+from appointments.models     import (
+    Appointment, UserAppointment, AppointmentImage, State,
+    ArchivedAppointment, ArchivedUserAppointment, ArchivedAppointmentImage
+)
+from appointments.repository import atomic
+
+APPOINTMENT_FIELDS = ['id', 'symptom', 'opinion', 'state_id', 'date', 'time', 'duration', 'created_at', 'updated_at']
+
+def has_patient():
+    # Archived rows need a patient_id, appointments without a UserAppointment stay live like they do for the feed
+    return Exists(UserAppointment.objects.filter(appointment_id=OuterRef('id')))
+
+def archivable_appointments(cutoff):
+    return Appointment.objects.filter(has_patient(), date__lt=cutoff).exclude(state_id=State.BOOKED)
+
+def archive_batch(appointment_ids):
+    # Rows are copied with their original ids so detail links keep working after the move
+    with atomic():
+        appointments = Appointment.objects.select_for_update().filter(
+            has_patient(), id__in = appointment_ids
+        ).exclude(state_id=State.BOOKED).values(*APPOINTMENT_FIELDS)
+        appointments      = list(appointments)
+        ids               = [appointment['id'] for appointment in appointments]
+        user_appointments = list(UserAppointment.objects.filter(
+            appointment_id__in = ids
+        ).values('id', 'patient_id', 'doctor_id', 'appointment_id'))
+        patients          = {
+            user_appointment['appointment_id']: user_appointment['patient_id'] for user_appointment in user_appointments
+        }
+
+        # patient_id is copied onto the archived appointment so history pages are an index range read
+        ArchivedAppointment.objects.bulk_create([
+            ArchivedAppointment(patient_id=patients[appointment['id']], **appointment) for appointment in appointments
+        ])
+        ArchivedUserAppointment.objects.bulk_create([
+            ArchivedUserAppointment(**user_appointment) for user_appointment in user_appointments
+        ])
+        ArchivedAppointmentImage.objects.bulk_create([
+            ArchivedAppointmentImage(**image) for image in AppointmentImage.objects.filter(
+                appointment_id__in = ids
+            ).values('id', 'appointment_id', 'wound_img')
+        ])
+
+        AppointmentImage.objects.filter(appointment_id__in=ids).delete()
+        UserAppointment.objects.filter(appointment_id__in=ids).delete()
+        Appointment.objects.filter(id__in=ids).delete()
+
+    return len(ids)
@@ -0,0 +1,92 @@
+import jwt
+import time
+import random
+
+from datetime   import date, timedelta, time as clock
+from contextlib import contextmanager
+
+from django.db         import connection
+from django.conf       import settings
+from django.test       import Client
+from django.test.utils import setup_databases, teardown_databases
+
+from users.models        import CustomUser, Department, Hospital, Doctor, WorkingDay, WorkingTime
+from appointments.models import Appointment, State, UserAppointment
+
+@contextmanager
+def isolated_database():
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+def seed_department(doctors, days, hours=range(9, 17), booked_ratio=0.5, seed=0):
+    random.seed(seed)
+
+    State.objects.bulk_create([State(id=1, name='진료대기'), State(id=2, name='진료취소'), State(id=3, name='진료완료')])
+    department = Department.objects.create(name='피부과', thumbnail='dermatology.png')
+    hospital   = Hospital.objects.create(name='퍼즐AI병원')
+    patient    = CustomUser.objects.create(name='patient', email='patient@voidoc.com', is_doctor=False)
+
+    CustomUser.objects.bulk_create([
+        CustomUser(name=f'doctor{i}', email=f'doctor{i}@voidoc.com', is_doctor=True) for i in range(doctors)
+    ])
+    users = list(CustomUser.objects.filter(is_doctor=True).order_by('id'))
+    Doctor.objects.bulk_create([
+        Doctor(user=user, department=department, hospital=hospital, profile_img=f'profile{user.id}.png') for user in users
+    ])
+    doctor_ids = list(Doctor.objects.order_by('id').values_list('id', flat=True))
+
+    start = date.today() + timedelta(days=1)
+    WorkingDay.objects.bulk_create([
+        WorkingDay(doctor_id=doctor_id, date=start + timedelta(days=day)) for doctor_id in doctor_ids for day in range(days)
+    ], batch_size=5000)
+
+    working_days = WorkingDay.objects.values_list('id', 'doctor_id', 'date')
+    WorkingTime.objects.bulk_create([
+        WorkingTime(working_day_id=working_day_id, time=clock(hour))
+        for working_day_id, _, _ in working_days for hour in hours
+    ], batch_size=5000)
+
+    booked = [
+        (doctor_id, working_date, clock(hour))
+        for _, doctor_id, working_date in working_days for hour in hours if random.random() < booked_ratio
+    ]
+    Appointment.objects.bulk_create([
+        Appointment(symptom='아파요', opinion='', date=working_date, time=working_time, state_id=1)
+        for _, working_date, working_time in booked
+    ], batch_size=5000)
+    appointment_ids = Appointment.objects.order_by('id').values_list('id', flat=True)
+    UserAppointment.objects.bulk_create([
+        UserAppointment(appointment_id=appointment_id, doctor_id=doctor_id, patient_id=patient.id)
+        for appointment_id, (doctor_id, _, _) in zip(appointment_ids, booked)
+    ], batch_size=5000)
+
+    return department, patient, doctor_ids
+
+def authorized_client(user):
+    token = jwt.encode({'user_id' : user.id}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return Client(HTTP_AUTHORIZATION=token)
+
+def measure(func, repeat):
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+
+def table_size(table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+        else:
+            cursor.execute(
+                'SELECT data_length + index_length FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table]
+            )
+        return cursor.fetchone()[0] or 0
@@ -0,0 +1,216 @@
+import math
+import time
+import random
+import threading
+
+from collections import Counter
+from contextlib  import contextmanager
+
+from django.conf        import settings
+from django.http        import HttpResponse
+from django.core.cache  import cache
+from django.utils.cache import get_conditional_response
+
+from voidoc.routers          import reading_replica
+from appointments.repository import on_commit
+
+VERSION_KEY           = 'patient_version:{}'
+DOCTOR_VERSION_KEY    = 'doctor_version:{}'
+DIRECTORY_VERSION_KEY = 'doctor_directory_version'
+METRICS_KEY           = 'response_cache:{}:{}'
+LEASE_KEY             = 'lease:{}'
+CACHED_HEADERS        = ('ETag', 'Cache-Control', 'Vary')
+
+class CacheStats:
+    """
+    Hit/miss counters kept per process and added to the shared cache every
+    RESPONSE_CACHE_METRICS_FLUSH lookups, so a hit stays a single round-trip.
+    """
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.counts  = Counter()
+        self.pending = 0
+
+    def record(self, name, outcome):
+        with self.lock:
+            self.counts[(name, outcome)] += 1
+            self.pending += 1
+            if self.pending < settings.RESPONSE_CACHE_METRICS_FLUSH:
+                return
+            counts, self.counts, self.pending = self.counts, Counter(), 0
+
+        for (name, outcome), count in counts.items():
+            increment(METRICS_KEY.format(name, outcome), count)
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts, self.pending = self.counts, Counter(), 0
+
+        for (name, outcome), count in counts.items():
+            increment(METRICS_KEY.format(name, outcome), count)
+
+    def totals(self, name):
+        return {outcome : cache.get(METRICS_KEY.format(name, outcome), 0) for outcome in ('hit', 'miss')}
+
+stats = CacheStats()
+
+def increment(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # A lost counter restarts from the clock, so it never falls back to a value old entries were stored under
+        cache.set(key, time.time_ns(), None)
+
+def current_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+def bump_on_commit(keys):
+    # Bumped on commit, a reader that saw the old rows has also seen the old version
+    keys = set(keys)
+    on_commit(lambda: [bump_version(key) for key in keys])
+
+def invalidate_patients(patient_ids):
+    bump_on_commit(VERSION_KEY.format(patient_id) for patient_id in patient_ids)
+
+def invalidate_availability(doctor_ids):
+    bump_on_commit(DOCTOR_VERSION_KEY.format(doctor_id) for doctor_id in doctor_ids)
+
+def invalidate_directory():
+    bump_on_commit([DIRECTORY_VERSION_KEY])
+
+def entry_timeout(timeout):
+    # Replica rows can lag behind a version bump, so what was read from them is not kept past the lag
+    if reading_replica():
+        return min(timeout, settings.REPLICA_CACHE_TIMEOUT)
+    return timeout
+
+class KeyLocks:
+    def __init__(self):
+        self.lock  = threading.Lock()
+        self.locks = {}
+
+    @contextmanager
+    def hold(self, key, blocking=True):
+        with self.lock:
+            entry = self.locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        acquired = entry[0].acquire(blocking)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                entry[0].release()
+            with self.lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self.locks[key]
+
+flights = KeyLocks()
+
+def refresh_early(entry):
+    # XFetch: the closer to expiry and the slower the computation, the likelier one request refreshes ahead of time
+    return time.time() - entry['delta'] * settings.CACHE_EARLY_REFRESH_BETA * math.log(1 - random.random()) >= entry['expires']
+
+def wait_for(key, entry):
+    deadline = time.monotonic() + settings.CACHE_LEASE_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.CACHE_LEASE_POLL)
+        latest = cache.get_many([key, LEASE_KEY.format(key)])
+        if key in latest and (entry is None or latest[key]['expires'] > entry['expires']):
+            return latest[key]
+        if LEASE_KEY.format(key) not in latest:
+            return None
+
+def compute_once(key, compute, timeout):
+    """
+    Returns compute() through the shared cache with at most one computation per key
+    at a time: threads of a worker queue on a per-key lock, workers on a lease held
+    in the cache. While an entry is being refreshed early the others keep serving it.
+    """
+    entry = cache.get(key)
+    if entry and not refresh_early(entry):
+        return entry['value']
+
+    with flights.hold(key, blocking=entry is None) as acquired:
+        if not acquired:
+            return entry['value']
+
+        latest = cache.get(key)
+        if latest and (entry is None or latest['expires'] > entry['expires']):
+            return latest['value']
+
+        leased = cache.add(LEASE_KEY.format(key), 1, settings.CACHE_LEASE_TIMEOUT)
+        if not leased:
+            if entry:
+                return entry['value']
+
+            latest = wait_for(key, entry)
+            if latest:
+                return latest['value']
+
+        try:
+            started = time.monotonic()
+            value   = compute()
+            timeout = entry_timeout(timeout)
+            cache.set(key, {'value' : value, 'delta' : time.monotonic() - started, 'expires' : time.time() + timeout}, timeout)
+        finally:
+            if leased:
+                cache.delete(LEASE_KEY.format(key))
+
+        return value
+
+def cached_response(name, key):
+    """
+    Caches a patient's 200 responses under name + key(request, *args, **kwargs).
+    Doctors' requests are never cached.
+    An entry is only served while it was stored under the patient's current version,
+    and one computed from a replica only for REPLICA_CACHE_TIMEOUT.
+    """
+    def decorator(func):
+        def wrapper(self, request, *args, **kwargs):
+            # Writes only bump the patient's version, so a doctor's copy would never be invalidated
+            if request.user.is_doctor:
+                return func(self, request, *args, **kwargs)
+
+            version_key = VERSION_KEY.format(request.user.id)
+            entry_key   = f'{name}:{request.user.id}:{key(request, *args, **kwargs)}'
+            found       = cache.get_many([version_key, entry_key])
+            version     = found.get(version_key)
+            entry       = found.get(entry_key)
+
+            if version is not None and entry and entry['version'] == version:
+                stats.record(name, 'hit')
+                response = get_conditional_response(request, etag=entry['headers'].get('ETag')) or HttpResponse(
+                    entry['content'], content_type='application/json'
+                )
+                for header, value in entry['headers'].items():
+                    response.headers[header] = value
+                return response
+
+            stats.record(name, 'miss')
+            if version is None:
+                version = current_version(version_key)
+
+            response = func(self, request, *args, **kwargs)
+
+            if response.status_code == 200:
+                cache.set(entry_key, {
+                    'version' : version,
+                    'content' : response.content,
+                    'headers' : {header : response[header] for header in CACHED_HEADERS if response.has_header(header)}
+                }, entry_timeout(settings.RESPONSE_CACHE_TIMEOUT))
+            return response
+        return wrapper
+    return decorator
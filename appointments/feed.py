@@ -0,0 +1,92 @@
+from datetime import datetime
+
+from django.db.models import F, Max, Count
+
+from users.models            import Doctor
+from appointments.cache      import invalidate_patients
+from appointments.models     import Appointment, ArchivedAppointment, PatientFeed
+from appointments.repository import collect
+
+FEED_FIELDS = [
+    'appointment_id', 'patient_id', 'state_id', 'state_name', 'date', 'time',
+    'doctor_id', 'doctor_name', 'doctor_hospital', 'doctor_department', 'doctor_profile_img'
+]
+
+def doctor_columns(relation):
+    return {
+        'doctor_id'         : F(f'{relation}__doctor_id'),
+        'doctor_name'       : F(f'{relation}__doctor__user__name'),
+        'doctor_hospital'   : F(f'{relation}__doctor__hospital__name'),
+        'doctor_department' : F(f'{relation}__doctor__department__name'),
+        'doctor_profile_img': F(f'{relation}__doctor__profile_img')
+    }
+
+def live_rows(**filters):
+    return Appointment.objects.filter(userappointment__isnull=False, **filters).values(
+        'state_id', 'date', 'time',
+        appointment_id = F('id'),
+        patient_id     = F('userappointment__patient_id'),
+        state_name     = F('state__name'),
+        **doctor_columns('userappointment')
+    )
+
+def archived_rows(**filters):
+    return ArchivedAppointment.objects.filter(archiveduserappointment__isnull=False, **filters).values(
+        'patient_id', 'state_id', 'date', 'time',
+        appointment_id = F('id'),
+        state_name     = F('state__name'),
+        **doctor_columns('archiveduserappointment')
+    )
+
+def patient_rows(patient_ids):
+    return list(live_rows(userappointment__patient_id__in=patient_ids)) + list(archived_rows(patient_id__in=patient_ids))
+
+def sync_feed(appointment_ids):
+    # Called inside the writer's transaction so the feed never disagrees with a committed appointment
+    PatientFeed.objects.filter(appointment_id__in=appointment_ids).delete()
+    PatientFeed.objects.bulk_create([PatientFeed(**row) for row in live_rows(id__in=appointment_ids)])
+
+def rebuild_feed(patient_ids):
+    PatientFeed.objects.filter(patient_id__in=patient_ids).delete()
+    rows = patient_rows(patient_ids)
+    PatientFeed.objects.bulk_create([PatientFeed(**row) for row in rows], batch_size=1000)
+    invalidate_patients(patient_ids)
+    return len(rows)
+
+def sync_doctor(doctor_ids):
+    doctors = list(Doctor.objects.filter(id__in=doctor_ids).values(
+        'id', 'profile_img', name=F('user__name'), hospital_name=F('hospital__name'), department_name=F('department__name')
+    ))
+
+    # A doctor's patients live on every shard
+    def sync_shard():
+        for doctor in doctors:
+            PatientFeed.objects.filter(doctor_id=doctor['id']).update(
+                doctor_name        = doctor['name'],
+                doctor_hospital    = doctor['hospital_name'],
+                doctor_department  = doctor['department_name'],
+                doctor_profile_img = doctor['profile_img'],
+                updated_at         = datetime.now()
+            )
+        return PatientFeed.objects.filter(doctor_id__in=doctor_ids).values_list('patient_id', flat=True).distinct()
+
+    invalidate_patients(set(collect(sync_shard)))
+
+def feed_version(patient_id):
+    # Every feed write recreates or stamps its rows, so count and newest stamp change with any visible change
+    version = PatientFeed.objects.filter(patient_id=patient_id).aggregate(total=Count('id'), updated_at=Max('updated_at'))
+    return version['total'], version['updated_at']
+
+def feed_differences(patient_ids):
+    expected = {row['appointment_id']: tuple(row[field] for field in FEED_FIELDS) for row in patient_rows(patient_ids)}
+    actual   = {
+        row[0]: row for row in PatientFeed.objects.filter(patient_id__in=patient_ids).values_list(*FEED_FIELDS)
+    }
+
+    missing = sorted(expected.keys() - actual.keys())
+    extra   = sorted(actual.keys() - expected.keys())
+    stale   = sorted(
+        appointment_id for appointment_id in expected.keys() & actual.keys()
+        if expected[appointment_id] != actual[appointment_id]
+    )
+    return missing, extra, stale
@@ -0,0 +1,52 @@
+import hashlib
+
+from django.forms import ValidationError
+
+from voidoc.storage          import release
+from appointments.models     import AppointmentImage
+from appointments.repository import on_commit
+
+MAX_IMAGES = 6
+
+def content_hash(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+def update_images(appointment_id, uploads, keep_ids=None, remove_ids=(), sessions=(), keys=()):
+    # Without keep_ids or remove_ids the uploads replace every image, but re-sent files keep their row and file
+    existing = {image.id: image for image in AppointmentImage.objects.filter(appointment_id=appointment_id)}
+    uploaded = {}
+    for upload in uploads:
+        uploaded.setdefault(content_hash(upload), upload)
+    for session in sessions:
+        uploaded.setdefault(session.content_hash, session.file_name)
+
+    if keep_ids is None and not remove_ids:
+        removed = {image_id for image_id, image in existing.items() if image.content_hash not in uploaded}
+    else:
+        removed = set(remove_ids) & existing.keys()
+        if keep_ids is not None:
+            removed |= existing.keys() - set(keep_ids)
+
+    kept  = {image.content_hash for image_id, image in existing.items() if image_id not in removed}
+    added = [(digest, upload) for digest, upload in uploaded.items() if digest not in kept]
+
+    # Directly uploaded objects never pass through the app, so they are recorded without a content hash
+    added += [('', key) for key in keys]
+
+    if len(existing) - len(removed) + len(added) > MAX_IMAGES:
+        raise ValidationError('NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6')
+
+    if removed:
+        names = [existing[image_id].wound_img.name for image_id in removed]
+        AppointmentImage.objects.filter(id__in=removed).delete()
+        on_commit(lambda: release(names))
+
+    AppointmentImage.objects.bulk_create([
+        AppointmentImage(appointment_id=appointment_id, wound_img=upload, content_hash=digest) for digest, upload in added
+    ])
+
+    return removed, added
@@ -0,0 +1,37 @@
+import time
+
+from datetime import date, timedelta
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from appointments.archive    import archivable_appointments, archive_batch
+from appointments.repository import using_shard
+
+class Command(BaseCommand):
+    help = 'Move cancelled and closed appointments older than a threshold into the archive tables, shard by shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Archive appointments older than this many days')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-id', type=int, default=0, help='Resume after this appointment id')
+
+    def handle(self, *args, **options):
+        appointments = archivable_appointments(date.today() - timedelta(days=options['days']))
+        archived     = 0
+        started      = time.perf_counter()
+
+        for alias in settings.APPOINTMENT_SHARDS:
+            with using_shard(alias):
+                last_id = options['start_id']
+
+                while True:
+                    ids = list(appointments.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']])
+                    if not ids:
+                        break
+
+                    archived += archive_batch(ids)
+                    last_id   = ids[-1]
+                    self.stdout.write(f'{alias} up to id {last_id}: {archived} archived ({archived / (time.perf_counter() - started):.0f} rows/s)')
+
+        self.stdout.write(f'done: {archived} archived in {time.perf_counter() - started:.1f} s')
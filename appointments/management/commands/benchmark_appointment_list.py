@@ -0,0 +1,47 @@
+from io       import StringIO
+from datetime import date, timedelta, time
+
+from django.core.cache           import cache
+from django.core.management      import call_command
+from django.core.management.base import BaseCommand
+
+from appointments.models    import Appointment, UserAppointment
+from appointments.benchmark import isolated_database, seed_department, authorized_client, measure
+
+class Command(BaseCommand):
+    help = 'Seed a patient with a long closed history and measure the appointment list before and after archiving, with and without the response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            _, patient, doctor_ids = seed_department(1, 14, booked_ratio=1)
+
+            start   = date.today() - timedelta(days=400)
+            history = Appointment.objects.bulk_create([
+                Appointment(symptom='아파요', opinion='연고 처방', date=start - timedelta(days=i // 8), time=time(9 + i % 8), state_id=3)
+                for i in range(options['history'])
+            ], batch_size=5000)
+            if history[0].id is None:
+                history = Appointment.objects.filter(state_id=3)
+            UserAppointment.objects.bulk_create([
+                UserAppointment(appointment_id=appointment.id, doctor_id=doctor_ids[0], patient_id=patient.id)
+                for appointment in history
+            ], batch_size=5000)
+
+            call_command('rebuild_patient_feed', stdout=StringIO())
+            client = authorized_client(patient)
+            self.report(client, 'before archiving', options['repeat'])
+            call_command('archive_appointments', stdout=StringIO())
+            self.report(client, 'after archiving', options['repeat'])
+
+    def report(self, client, label, repeat):
+        for page in (1, 100):
+            url         = f'/appointments/list?page={page}'
+            median, p95 = measure(lambda: (cache.clear(), client.get(url)), repeat)
+            self.stdout.write(f'{label}, page {page}: median {median:.1f} ms, p95 {p95:.1f} ms')
+
+            median, p95 = measure(lambda: client.get(url), repeat)
+            self.stdout.write(f'{label}, page {page}, cached: median {median:.1f} ms, p95 {p95:.1f} ms')
@@ -0,0 +1,40 @@
+from datetime import date, timedelta
+
+from django.db                   import connection, reset_queries
+from django.test.utils           import CaptureQueriesContext
+from django.core.management.base import BaseCommand
+
+from users.models           import CustomUser
+from appointments.models    import Appointment, AppointmentImage
+from appointments.benchmark import isolated_database, seed_department, authorized_client, measure
+
+class Command(BaseCommand):
+    help = 'Seed a fully booked doctor and measure the doctor agenda endpoint for a day and a week'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=2, help='Images per appointment')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            # Around-the-clock slots give a single doctor 168 bookings a week
+            seed_department(1, 7, hours=range(24), booked_ratio=1)
+            AppointmentImage.objects.bulk_create([
+                AppointmentImage(appointment_id=appointment_id, wound_img=f'wound_img/{appointment_id}_{i}.png')
+                for appointment_id in Appointment.objects.values_list('id', flat=True) for i in range(options['images'])
+            ], batch_size=5000)
+
+            client = authorized_client(CustomUser.objects.get(is_doctor=True))
+            start  = (date.today() + timedelta(days=1)).isoformat()
+
+            for days in (1, 7):
+                url = f'/appointments/doctor/agenda?date={start}&days={days}'
+                # The request_started handler clears the query log, so start from an empty one
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    appointments = len(client.get(url).json()['result'])
+
+                median, p95 = measure(lambda: client.get(url), options['repeat'])
+                self.stdout.write(
+                    f'days={days}: {appointments} appointments, {len(queries)} queries, median {median:.1f} ms, p95 {p95:.1f} ms'
+                )
@@ -0,0 +1,47 @@
+import time
+import random
+
+from django.core.management.base import BaseCommand
+
+from appointments.search import DoctorSearchIndex
+
+SURNAMES  = '김이박최정강조윤장임한오서신권황안송류홍'
+SYLLABLES = '민서지현우준영수진하은도윤예성훈연정경재'
+HOSPITALS = ['퍼즐AI병원', '서울중앙병원', '한빛의원', '연세밝은내과', '우리들정형외과', '새봄피부과']
+
+class Command(BaseCommand):
+    help = 'Measure build time and query latency of the in-process doctor search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50000)
+        parser.add_argument('--queries', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        rows = [(
+            doctor_id,
+            random.choice(SURNAMES) + ''.join(random.choices(SYLLABLES, k=2)),
+            f'{random.choice(HOSPITALS)} {doctor_id % 500}호점',
+            doctor_id % 9 + 1
+        ) for doctor_id in range(1, options['doctors'] + 1)]
+
+        index   = DoctorSearchIndex()
+        started = time.perf_counter()
+        index.build_from(rows)
+        self.stdout.write(f'build {len(rows)} doctors: {(time.perf_counter() - started) * 1000:.0f} ms')
+
+        cases = {
+            'surname'           : lambda: (random.choice(SURNAMES), None),
+            'full name'         : lambda: (random.choice(rows)[1], None),
+            'name substring'    : lambda: (random.choice(rows)[1][1:], None),
+            'hospital + dept'   : lambda: (random.choice(HOSPITALS)[:3], random.randint(1, 9)),
+            'name + hospital'   : lambda: (f'{random.choice(rows)[1][:2]} {random.choice(HOSPITALS)[:2]}', None),
+        }
+
+        for label, make_query in cases.items():
+            queries = [make_query() for _ in range(options['queries'])]
+            started = time.perf_counter()
+            matched = sum(len(index.search(query, department_id)) for query, department_id in queries)
+            elapsed = (time.perf_counter() - started) / len(queries) * 1000
+
+            self.stdout.write(f'{label:<16}: {elapsed:.3f} ms/query (avg {matched / len(queries):.0f} matches)')
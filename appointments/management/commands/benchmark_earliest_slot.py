@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from appointments.benchmark import isolated_database, seed_department, authorized_client, measure
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway test database and measure the earliest-available-slot endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=300)
+        parser.add_argument('--days', type=int, default=14)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            department, patient, _ = seed_department(options['doctors'], options['days'], booked_ratio=0.9)
+            client = authorized_client(patient)
+
+            for count in (5, 20, 50):
+                median, p95 = measure(
+                    lambda: client.get(f'/appointments/departments/{department.id}/earliest?count={count}'),
+                    options['repeat']
+                )
+                self.stdout.write(f'{options["doctors"]} doctors, count={count}: median {median:.1f} ms, p95 {p95:.1f} ms')
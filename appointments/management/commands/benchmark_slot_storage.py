@@ -0,0 +1,43 @@
+import io
+import random
+
+from django.db                   import connection
+from django.core.management      import call_command
+from django.core.management.base import BaseCommand
+from django.test.utils           import override_settings
+
+from users.models           import WorkingDay, WorkingTime
+from users.schedules        import working_mask
+from appointments.benchmark import isolated_database, seed_department, measure, table_size
+
+class Command(BaseCommand):
+    help = 'Compare table size and lookup latency of per-slot WorkingTime rows and WorkingDay.slot_mask'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=300)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def report(self, label, lookups):
+        size      = table_size('working_days') + table_size('working_times')
+        rows      = WorkingDay.objects.count() + WorkingTime.objects.count()
+        median, _ = measure(lambda: [working_mask(*lookup) for lookup in lookups], 1)
+
+        self.stdout.write(f'{label:<5}: {rows} rows, {size / 1024 / 1024:.1f} MiB, {median / len(lookups) * 1000:.0f} us per doctor-day lookup')
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seed_department(options['doctors'], options['days'], booked_ratio=0)
+            lookups = random.sample(list(WorkingDay.objects.values_list('doctor_id', 'date')), options['repeat'])
+
+            with override_settings(WORKING_TIME_STORAGE='rows'):
+                self.report('rows', lookups)
+
+            call_command('convert_working_times', delete_rows=True, batch_size=5000, stdout=io.StringIO())
+
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('VACUUM')
+
+            with override_settings(WORKING_TIME_STORAGE='mask'):
+                self.report('mask', lookups)
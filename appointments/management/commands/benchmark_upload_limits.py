@@ -0,0 +1,46 @@
+import time
+
+from django.test                     import RequestFactory
+from django.core.management.base     import BaseCommand
+from django.test.client              import encode_multipart, BOUNDARY, MULTIPART_CONTENT
+from django.core.files.uploadedfile  import SimpleUploadedFile
+
+from appointments.uploads   import LimitedUploadHandler
+from appointments.benchmark import measure
+
+class Command(BaseCommand):
+    help = 'Measure worker time spent parsing rejected uploads with and without the streaming limit handler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=40)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        size  = options['size_mb'] * 1024 * 1024
+        cases = {
+            'oversized image' : [SimpleUploadedFile('wound.png', b'\x89PNG\r\n\x1a\n' + bytes(size))],
+            'wrong type'      : [SimpleUploadedFile('wound.png', b'MZ' + bytes(size))],
+            'seven images'    : [SimpleUploadedFile(f'wound{i}.png', b'\xff\xd8\xff' + bytes(size // 7)) for i in range(7)]
+        }
+
+        for label, images in cases.items():
+            body = encode_multipart(BOUNDARY, {'symptom' : 'symptom', 'image' : images})
+
+            for limited in (False, True):
+                # Requests are built up front so only the body parsing is timed
+                requests    = iter([self.request(body, limited) for _ in range(options['repeat'] + 1)])
+                median, p95 = measure(lambda: self.parse(next(requests)), options['repeat'])
+                self.stdout.write(
+                    f'{label} ({len(body) / 1024 / 1024:.0f} MB), {"limit handler" if limited else "default handlers"}: '
+                    f'median {median:.1f} ms, p95 {p95:.1f} ms'
+                )
+
+    def request(self, body, limited):
+        request = RequestFactory().generic('POST', '/appointments/create', body, content_type=MULTIPART_CONTENT)
+        if limited:
+            request.upload_handlers.insert(0, LimitedUploadHandler(request))
+        return request
+
+    def parse(self, request):
+        for uploaded in request.FILES.values():
+            uploaded.close()
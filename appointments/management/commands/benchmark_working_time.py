@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.cache           import cache
+from django.db.models.functions  import Mod
+from django.core.management.base import BaseCommand
+
+from appointments.models    import Appointment
+from appointments.benchmark import isolated_database, seed_department, authorized_client, measure
+
+class Command(BaseCommand):
+    help = 'Seed doctors with dense schedules and measure the working-time endpoint, full and free-only, with and without the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            _, patient, doctor_ids = seed_department(options['doctors'], options['days'], hours=range(0, 24), booked_ratio=0.9)
+            # Every other booking is cancelled, those slots must show up as free again
+            Appointment.objects.alias(parity=Mod('id', 2)).filter(parity=0).update(state_id=2)
+
+            client = authorized_client(patient)
+            day    = date.today() + timedelta(days=1)
+            url    = f'/appointments/doctor/{doctor_ids[0]}/workingtime?year={day.year}&month={day.month}&day={day.day}'
+
+            for label, query in (('full', ''), ('free only', '&free=1')):
+                median, p95 = measure(lambda: (cache.clear(), client.get(url + query)), options['repeat'])
+                self.stdout.write(f'{label}: median {median:.1f} ms, p95 {p95:.1f} ms')
+
+                median, p95 = measure(lambda: client.get(url + query), options['repeat'])
+                self.stdout.write(f'{label}, cached: median {median:.1f} ms, p95 {p95:.1f} ms')
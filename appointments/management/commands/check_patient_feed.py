@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models            import CustomUser
+from appointments.feed       import feed_differences, rebuild_feed
+from appointments.repository import group_by_shard, using_shard, atomic
+
+class Command(BaseCommand):
+    help = 'Diff the patient appointment feed against live and archived appointments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient-id', type=int, action='append', dest='patient_ids')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--fix', action='store_true', help='Rebuild the feed of patients with differences')
+
+    def handle(self, *args, **options):
+        patient_ids  = options['patient_ids'] or list(
+            CustomUser.objects.filter(is_doctor=False).order_by('id').values_list('id', flat=True)
+        )
+        batch_size   = options['batch_size']
+        inconsistent = 0
+
+        for alias, shard_patient_ids in group_by_shard(patient_ids).items():
+            with using_shard(alias):
+                for index in range(0, len(shard_patient_ids), batch_size):
+                    batch                 = shard_patient_ids[index:index + batch_size]
+                    missing, extra, stale = feed_differences(batch)
+
+                    if not (missing or extra or stale):
+                        continue
+
+                    inconsistent += len(missing) + len(extra) + len(stale)
+                    self.stdout.write(f'missing {missing}, extra {extra}, stale {stale}')
+
+                    if options['fix']:
+                        with atomic():
+                            rebuild_feed(batch)
+
+        if inconsistent and not options['fix']:
+            raise CommandError(f'{inconsistent} patient feed rows differ from their appointments')
+
+        self.stdout.write(f'checked {len(patient_ids)} patients, {inconsistent} rows differ')
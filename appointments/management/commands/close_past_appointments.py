@@ -0,0 +1,75 @@
+import time
+
+from datetime import datetime, timedelta
+
+from django.conf                 import settings
+from django.db.models            import Q
+from django.core.management.base import BaseCommand
+
+from appointments.feed       import sync_feed
+from appointments.cache      import invalidate_patients
+from appointments.models     import Appointment, UserAppointment, State
+from appointments.repository import using_shard, atomic, fan_out
+
+class Command(BaseCommand):
+    help = 'Close past booked appointments (no-show when no opinion was written) in chunked bulk UPDATEs, shard by shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--grace-hours', type=float, default=1)
+        parser.add_argument('--start-id', type=int, default=0, help='Resume after this appointment id')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = datetime.now() - timedelta(hours=options['grace_hours'])
+        past   = Appointment.objects.filter(
+            Q(date__lt=cutoff.date()) | Q(date=cutoff.date(), time__lte=cutoff.time()),
+            state_id = State.BOOKED
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'{sum(fan_out(past.count))} appointments would be closed')
+            return
+
+        closed  = no_show = 0
+        started = time.perf_counter()
+
+        for alias in settings.APPOINTMENT_SHARDS:
+            with using_shard(alias):
+                shard_closed, shard_no_show = self.close(alias, past, options)
+            closed  += shard_closed
+            no_show += shard_no_show
+
+        self.stdout.write(f'done: {closed} closed, {no_show} no-show in {time.perf_counter() - started:.1f} s')
+
+    def close(self, alias, past, options):
+        # Reference tables are not sharded, but the new state row has to exist where the appointments are
+        State.objects.using(alias).get_or_create(id=State.NO_SHOW, defaults={'name' : '미진료'})
+
+        last_id = options['start_id']
+        closed  = no_show = 0
+        started = time.perf_counter()
+
+        while True:
+            ids = list(past.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+
+            # state_id is re-checked so a row cancelled after the id scan is left alone
+            with atomic():
+                batch   = Appointment.objects.filter(id__in=ids, state_id=State.BOOKED)
+                now     = datetime.now()
+                closed  += batch.exclude(opinion='').update(state_id=State.CLOSED, updated_at=now)
+                no_show += batch.filter(opinion='').update(state_id=State.NO_SHOW, updated_at=now)
+                sync_feed(ids)
+                invalidate_patients(UserAppointment.objects.filter(appointment_id__in=ids).values_list('patient_id', flat=True))
+
+            last_id = ids[-1]
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{alias} up to id {last_id}: {closed} closed, {no_show} no-show ({(closed + no_show) / elapsed:.0f} rows/s)')
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        return closed, no_show
@@ -0,0 +1,56 @@
+from datetime  import datetime, timedelta
+from itertools import chain
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from appointments.models     import AppointmentImage, ArchivedAppointmentImage, UploadSession
+from appointments.presigned  import key_owner
+from appointments.repository import collect
+
+class Command(BaseCommand):
+    help = 'Find wound images on disk that no live or archived appointment references, and optionally delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=60, help='Skip files modified in the last N minutes (in-flight uploads)')
+        parser.add_argument('--delete', action='store_true', help='Delete orphans instead of only listing them')
+
+    def handle(self, *args, **options):
+        storage    = AppointmentImage._meta.get_field('wound_img').storage
+        directory  = AppointmentImage._meta.get_field('wound_img').upload_to
+        cutoff     = datetime.now() - timedelta(minutes=options['min_age'])
+        # Every shard writes to the same storage, so a file is only orphaned when no shard references it
+        referenced = set(collect(lambda: chain(
+            AppointmentImage.objects.values_list('wound_img', flat=True).iterator(),
+            ArchivedAppointmentImage.objects.values_list('wound_img', flat=True).iterator(),
+            # Completed chunked uploads are saved before an appointment claims them
+            UploadSession.objects.exclude(file_name='').values_list('file_name', flat=True).iterator()
+        )))
+
+        # Presigned objects have no row until an appointment claims them, so they get as long as an upload session
+        presigned_cutoff = min(cutoff, datetime.now() - settings.UPLOAD_SESSION_LIFETIME)
+
+        orphans = [
+            name for name in self.walk(storage, directory)
+            if name not in referenced
+            and storage.get_modified_time(name) < (presigned_cutoff if key_owner(name) is not None else cutoff)
+        ]
+
+        freed = 0
+        for name in orphans:
+            freed += storage.size(name)
+            if options['delete']:
+                storage.delete(name)
+            else:
+                self.stdout.write(name)
+
+        action = 'deleted' if options['delete'] else 'found'
+        self.stdout.write(f'{action} {len(orphans)} orphaned images, {freed / 1024:.0f} KiB')
+
+    def walk(self, storage, directory):
+        # Content-addressed images live in <ab>/<cd>/ shard directories below the upload directory
+        directories, filenames = storage.listdir(directory)
+        for filename in filenames:
+            yield f'{directory}/{filename}'
+        for subdirectory in directories:
+            yield from self.walk(storage, f'{directory}/{subdirectory}')
@@ -0,0 +1,31 @@
+import os
+
+from datetime import datetime
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from voidoc.storage          import release
+from appointments.models     import UploadSession
+from appointments.uploads    import session_path
+from appointments.repository import collect
+
+class Command(BaseCommand):
+    help = 'Delete upload sessions older than UPLOAD_SESSION_LIFETIME that were never attached to an appointment'
+
+    def handle(self, *args, **options):
+        sessions = collect(self.purge)
+        release([session.file_name for session in sessions if session.file_name])
+
+        self.stdout.write(f'purged {len(sessions)} upload sessions')
+
+    def purge(self):
+        # Runs once per shard with that shard current
+        sessions = list(UploadSession.objects.filter(created_at__lt=datetime.now() - settings.UPLOAD_SESSION_LIFETIME))
+
+        for session in sessions:
+            if os.path.exists(session_path(session)):
+                os.remove(session_path(session))
+
+        UploadSession.objects.filter(id__in=[session.id for session in sessions]).delete()
+        return sessions
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.models            import CustomUser
+from appointments.feed       import rebuild_feed
+from appointments.repository import group_by_shard, using_shard, atomic
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalised patient appointment feed from live and archived appointments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient-id', type=int, action='append', dest='patient_ids')
+        parser.add_argument('--batch-size', type=int, default=500, help='Patients rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        patient_ids = options['patient_ids'] or list(
+            CustomUser.objects.filter(is_doctor=False).order_by('id').values_list('id', flat=True)
+        )
+        batch_size  = options['batch_size']
+        rows        = 0
+        started     = time.perf_counter()
+
+        # A patient's appointments and feed rows live together on the patient's shard
+        for alias, shard_patient_ids in group_by_shard(patient_ids).items():
+            with using_shard(alias):
+                for index in range(0, len(shard_patient_ids), batch_size):
+                    with atomic():
+                        rows += rebuild_feed(shard_patient_ids[index:index + batch_size])
+
+        self.stdout.write(f'rebuilt {rows} feed rows for {len(patient_ids)} patients in {time.perf_counter() - started:.1f} s')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from appointments.cache import stats
+
+class Command(BaseCommand):
+    help = 'Print hit/miss counts of the per-patient response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', default=['appointment_list', 'appointment_detail'])
+
+    def handle(self, *args, **options):
+        for name in options['names']:
+            totals  = stats.totals(name)
+            lookups = totals['hit'] + totals['miss']
+            ratio   = totals['hit'] / lookups if lookups else 0
+            self.stdout.write(f'{name}: {totals["hit"]} hits, {totals["miss"]} misses ({ratio:.1%} hit ratio)')
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time'], name='appointment_date_c89b47_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userappointment',
+            index=models.Index(fields=['doctor', 'appointment'], name='user_appoin_doctor__c36920_idx'),
+        ),
+    ]
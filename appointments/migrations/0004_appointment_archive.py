@@ -0,0 +1,63 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_slot_minutes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0003_appointment_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('symptom', models.TextField()),
+                ('opinion', models.TextField()),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('duration', models.PositiveSmallIntegerField(default=60)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.state')),
+            ],
+            options={
+                'db_table': 'archived_appointments',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedUserAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.archivedappointment')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'archived_user_appointments',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAppointmentImage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('wound_img', models.FileField(upload_to='wound_img')),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.archivedappointment')),
+            ],
+            options={
+                'db_table': 'archived_appointment_images',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['patient', 'state', 'date', 'time'], name='archived_ap_patient_07e3f0_idx'),
+        ),
+    ]
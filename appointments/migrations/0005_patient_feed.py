@@ -0,0 +1,41 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('users', '0006_slot_minutes'),
+        ('appointments', '0004_appointment_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_id', models.BigIntegerField(unique=True)),
+                ('state_name', models.CharField(max_length=30)),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('doctor_name', models.CharField(max_length=50)),
+                ('doctor_hospital', models.CharField(max_length=50)),
+                ('doctor_department', models.CharField(max_length=50)),
+                ('doctor_profile_img', models.CharField(max_length=100)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='appointments.state')),
+            ],
+            options={
+                'db_table': 'patient_feeds',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='patientfeed',
+            index=models.Index(fields=['patient', 'state', 'date', 'time'], name='patient_fee_patient_401d46_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_patient_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointmentimage',
+            name='content_hash',
+            field=models.CharField(default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientfeed',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_patient_feed_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patientfeed',
+            name='doctor_hospital',
+            field=models.CharField(max_length=50, null=True),
+        ),
+    ]
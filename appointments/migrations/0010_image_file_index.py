@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-19 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_patient_feed_doctor_hospital_null'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointmentimage',
+            name='wound_img',
+            field=models.FileField(db_index=True, upload_to='wound_img'),
+        ),
+        migrations.AlterField(
+            model_name='archivedappointmentimage',
+            name='wound_img',
+            field=models.FileField(db_index=True, upload_to='wound_img'),
+        ),
+    ]
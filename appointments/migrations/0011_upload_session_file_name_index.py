@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0010_image_file_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='file_name',
+            field=models.CharField(db_index=True, default='', max_length=100),
+        ),
+    ]
@@ -1,16 +1,23 @@
+import uuid
+
 from django.db import models
 
 class Appointment(models.Model):
+    # What scheduling code reads, symptom and opinion are unbounded TEXT and left to the endpoints that show them
+    SCHEDULE_FIELDS = ('id', 'state', 'date', 'time', 'duration')
+
     symptom    = models.TextField()
     opinion    = models.TextField()
     state      = models.ForeignKey('State', on_delete=models.CASCADE)
     date       = models.DateField()
     time       = models.TimeField()
+    duration   = models.PositiveSmallIntegerField(default=60)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta: 
         db_table = 'appointments'
+        indexes  = [models.Index(fields=['date', 'time'])]
 
 class UserAppointment(models.Model): 
     patient     = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE)
@@ -19,16 +26,87 @@ class UserAppointment(models.Model):
 
     class Meta:
         db_table = 'user_appointments'
+        indexes  = [models.Index(fields=['doctor', 'appointment'])]
 
 class State(models.Model): 
+    BOOKED    = 1
+    CANCELLED = 2
+    CLOSED    = 3
+    NO_SHOW   = 4
+
     name = models.CharField(max_length=30)
 
     class Meta: 
         db_table = 'states'
 
 class AppointmentImage(models.Model):
-    appointment = models.ForeignKey('Appointment', on_delete=models.CASCADE)
-    wound_img   = models.FileField(upload_to='wound_img')
+    appointment  = models.ForeignKey('Appointment', on_delete=models.CASCADE)
+    wound_img    = models.FileField(upload_to='wound_img', db_index=True)
+    content_hash = models.CharField(max_length=64, default='')
+
+    class Meta:
+        db_table = 'appointment_images'
+class ArchivedAppointment(models.Model):
+    id          = models.BigIntegerField(primary_key=True)
+    patient     = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE)
+    symptom     = models.TextField()
+    opinion     = models.TextField()
+    state       = models.ForeignKey('State', on_delete=models.CASCADE)
+    date        = models.DateField()
+    time        = models.TimeField()
+    duration    = models.PositiveSmallIntegerField(default=60)
+    created_at  = models.DateTimeField()
+    updated_at  = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'archived_appointments'
+        indexes  = [models.Index(fields=['patient', 'state', 'date', 'time'])]
+
+class ArchivedUserAppointment(models.Model):
+    id          = models.BigIntegerField(primary_key=True)
+    patient     = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE)
+    doctor      = models.ForeignKey('users.Doctor', on_delete=models.CASCADE)
+    appointment = models.ForeignKey('ArchivedAppointment', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'archived_user_appointments'
+
+class ArchivedAppointmentImage(models.Model):
+    id          = models.BigIntegerField(primary_key=True)
+    appointment = models.ForeignKey('ArchivedAppointment', on_delete=models.CASCADE)
+    wound_img   = models.FileField(upload_to='wound_img', db_index=True)
+
+    class Meta:
+        db_table = 'archived_appointment_images'
+
+class PatientFeed(models.Model):
+    patient            = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE)
+    appointment_id     = models.BigIntegerField(unique=True)
+    state              = models.ForeignKey('State', on_delete=models.CASCADE)
+    state_name         = models.CharField(max_length=30)
+    date               = models.DateField()
+    time               = models.TimeField()
+    doctor             = models.ForeignKey('users.Doctor', on_delete=models.CASCADE)
+    doctor_name        = models.CharField(max_length=50)
+    doctor_hospital    = models.CharField(max_length=50, null=True)
+    doctor_department  = models.CharField(max_length=50)
+    doctor_profile_img = models.CharField(max_length=100)
+    updated_at         = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'patient_feeds'
+        indexes  = [models.Index(fields=['patient', 'state', 'date', 'time'])]
+
+class UploadSession(models.Model):
+    id           = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    patient      = models.ForeignKey('users.CustomUser', on_delete=models.CASCADE)
+    filename     = models.CharField(max_length=100)
+    size         = models.PositiveIntegerField()
+    offset       = models.PositiveIntegerField(default=0)
+    file_name    = models.CharField(max_length=100, default='', db_index=True)
+    content_hash = models.CharField(max_length=64, default='')
+    created_at   = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        db_table = 'appointment_images'
\ No newline at end of file
+        db_table = 'upload_sessions'
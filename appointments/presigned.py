@@ -0,0 +1,113 @@
+import os
+import re
+import hmac
+import time
+import uuid
+import hashlib
+
+from urllib.parse import urlencode
+
+from django.conf                 import settings
+from django.forms                import ValidationError
+from django.utils._os            import safe_join
+from django.core.exceptions      import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+IMAGE_CONTENT_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/heic')
+KEY_PATTERN         = re.compile(r'wound_img/(\d+)/[0-9a-f]{32}(?:\.[a-z0-9]{1,10})?')
+
+class FilesystemObjectStore:
+    """
+    Local stand-in for an S3 bucket. URLs point at ObjectStoreView, which checks
+    the signature and writes the body under OBJECT_STORE_ROOT.
+    """
+    def signature(self, key, expires, content_type):
+        message = f'{key}\n{expires}\n{content_type}'.encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+    def presign_put(self, key, content_type, expires_in):
+        expires = int(time.time()) + expires_in
+        query   = urlencode({
+            'expires'      : expires,
+            'content_type' : content_type,
+            'signature'    : self.signature(key, expires, content_type)
+        })
+        return f'{settings.OBJECT_STORE_URL}/{key}?{query}'
+
+    def verify(self, key, expires, content_type, signature):
+        return int(expires) >= time.time() and hmac.compare_digest(self.signature(key, expires, content_type), signature)
+
+    def path(self, key):
+        return safe_join(settings.OBJECT_STORE_ROOT, key)
+
+    def put(self, key, stream, length):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(f'{path}.tmp', 'wb') as target:
+            remaining = length
+            while remaining > 0:
+                data = stream.read(min(settings.UPLOAD_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                target.write(data)
+                remaining -= len(data)
+        os.replace(f'{path}.tmp', path)
+
+    def size(self, key):
+        try:
+            return os.path.getsize(self.path(key))
+        except OSError:
+            return None
+
+class S3ObjectStore:
+    def __init__(self):
+        try:
+            import boto3
+        except ImportError:
+            raise ImproperlyConfigured('S3ObjectStore requires boto3')
+
+        self.bucket = settings.OBJECT_STORE_BUCKET
+        self.client = boto3.client('s3', endpoint_url=getattr(settings, 'OBJECT_STORE_ENDPOINT', None))
+
+    def presign_put(self, key, content_type, expires_in):
+        return self.client.generate_presigned_url(
+            'put_object',
+            Params    = {'Bucket' : self.bucket, 'Key' : key, 'ContentType' : content_type},
+            ExpiresIn = expires_in
+        )
+
+    def size(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)['ContentLength']
+        except self.client.exceptions.ClientError:
+            return None
+
+def object_store():
+    return import_string(settings.OBJECT_STORE)()
+
+def uses_presigned_uploads():
+    return settings.IMAGE_UPLOAD_MODE == 'presigned'
+
+def new_key(patient_id, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if not re.fullmatch(r'\.[a-z0-9]{1,10}', extension):
+        extension = ''
+    return f'wound_img/{patient_id}/{uuid.uuid4().hex}{extension}'
+
+def key_owner(key):
+    # Only keys shaped exactly like new_key() output have an owner, '..' or extra path segments never match
+    match = KEY_PATTERN.fullmatch(key)
+    return int(match.group(1)) if match else None
+
+def uploaded_keys(patient_id, keys):
+    if keys and not uses_presigned_uploads():
+        raise ValidationError('PRESIGNED_UPLOADS_DISABLED')
+
+    # Keys are scoped to the patient so nobody can attach an object someone else uploaded
+    store = object_store()
+    for key in keys:
+        if key_owner(key) != patient_id or not store.size(key):
+            raise ValidationError('INVALID_IMAGE_KEY')
+
+    return keys
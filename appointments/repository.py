@@ -0,0 +1,79 @@
+import zlib
+
+from itertools          import chain
+from contextlib         import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db   import connections, transaction, DEFAULT_DB_ALIAS
+from django.conf import settings
+
+from voidoc.routers import shard
+
+def shard_for(patient_id):
+    # crc32 rather than hash() so every process maps a patient to the same shard
+    shards = settings.APPOINTMENT_SHARDS
+    return shards[zlib.crc32(str(patient_id).encode()) % len(shards)]
+
+def group_by_shard(patient_ids):
+    grouped = {alias: [] for alias in settings.APPOINTMENT_SHARDS}
+    for patient_id in patient_ids:
+        grouped[shard_for(patient_id)].append(patient_id)
+    return grouped
+
+@contextmanager
+def using_shard(alias):
+    token = shard.set(alias)
+    try:
+        yield alias
+    finally:
+        shard.reset(token)
+
+def patient_shard(func):
+    def wrapper(self, request, *args, **kwargs):
+        with using_shard(shard_for(request.user.id)):
+            return func(self, request, *args, **kwargs)
+    return wrapper
+
+def current_alias():
+    return shard.get() or DEFAULT_DB_ALIAS
+
+def atomic():
+    return transaction.atomic(using=current_alias())
+
+def on_commit(func):
+    transaction.on_commit(func, using=current_alias())
+
+def fan_out(func):
+    """
+    Calls func() once per shard with that shard current and returns the results in
+    APPOINTMENT_SHARDS order. The calling thread takes the first shard itself, the
+    others run in parallel on pool threads that close their connections afterwards.
+    """
+    shards = settings.APPOINTMENT_SHARDS
+
+    def run(alias):
+        with using_shard(alias):
+            try:
+                return func()
+            finally:
+                connections[alias].close()
+
+    if len(shards) == 1:
+        with using_shard(shards[0]):
+            return [func()]
+
+    # Futures fail together: an exception on any shard propagates from result()
+    with ThreadPoolExecutor(max_workers=len(shards) - 1) as pool:
+        futures = [pool.submit(run, alias) for alias in shards[1:]]
+        with using_shard(shards[0]):
+            first = func()
+        return [first] + [future.result() for future in futures]
+
+def collect(func):
+    return list(chain.from_iterable(fan_out(lambda: list(func()))))
+
+def find_shard(func):
+    for alias, found in zip(settings.APPOINTMENT_SHARDS, fan_out(func)):
+        if found:
+            return alias
+    return None
@@ -0,0 +1,95 @@
+import time
+import threading
+
+from django.conf import settings
+
+from users.models import Doctor
+
+class DoctorSearchIndex:
+    def __init__(self):
+        self.snapshot         = ({}, {})
+        self.built_at         = 0
+        self.generation       = 0
+        self.built_generation = None
+        self.lock             = threading.Lock()
+
+    def grams_of(self, text):
+        return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+    def build_from(self, rows):
+        # Read before the rows, so an invalidate() that arrives during the scan leaves the new snapshot stale
+        generation = self.generation
+        doctors    = {}
+        grams      = {}
+
+        for doctor_id, name, hospital, department_id in rows:
+            name     = (name or '').lower()
+            hospital = (hospital or '').lower()
+            doctors[doctor_id] = (name, hospital, department_id)
+
+            for gram in self.grams_of(name) | self.grams_of(hospital):
+                grams.setdefault(gram, set()).add(doctor_id)
+
+        # One assignment swaps doctors and grams together, searches keep whichever pair they started with
+        self.snapshot         = (doctors, grams)
+        self.built_at         = time.monotonic()
+        self.built_generation = generation
+
+    def build(self):
+        rows = Doctor.objects.values_list('id', 'user__name', 'hospital__name', 'department_id')
+        self.build_from(rows.iterator(chunk_size=10000))
+
+    def invalidate(self):
+        self.generation += 1
+
+    def is_stale(self):
+        return self.built_generation != self.generation \
+            or time.monotonic() - self.built_at > settings.DOCTOR_INDEX_REBUILD_INTERVAL
+
+    def refresh(self):
+        if not self.is_stale():
+            return
+
+        # Once there is a snapshot the other threads keep searching it while one of them rebuilds
+        if not self.lock.acquire(blocking=self.built_generation is None):
+            return
+
+        try:
+            if self.is_stale():
+                self.build()
+        finally:
+            self.lock.release()
+
+    def match_term(self, snapshot, term):
+        doctors, grams = snapshot
+
+        if len(term) == 1:
+            return grams.get(term, set())
+
+        postings = sorted((grams.get(term[i:i + 2], set()) for i in range(len(term) - 1)), key=len)
+        candidates = set.intersection(*postings)
+
+        return {
+            doctor_id for doctor_id in candidates
+            if term in doctors[doctor_id][0] or term in doctors[doctor_id][1]
+        }
+
+    def search(self, query, department_id=None, cursor=0):
+        self.refresh()
+
+        snapshot = self.snapshot
+        doctors  = snapshot[0]
+        matched  = doctors.keys()
+
+        for term in query.lower().split():
+            matched = matched & self.match_term(snapshot, term)
+
+            if not matched:
+                return []
+
+        return sorted(
+            doctor_id for doctor_id in matched
+            if doctor_id > cursor and (department_id is None or doctors[doctor_id][2] == department_id)
+        )
+
+doctor_index = DoctorSearchIndex()
@@ -0,0 +1,59 @@
+from django.db                import DEFAULT_DB_ALIAS
+from django.dispatch          import receiver
+from django.db.models.signals import post_save, pre_delete, post_delete
+
+from users.models        import CustomUser, Doctor, Hospital, Department
+from appointments.feed   import sync_doctor
+from appointments.cache  import invalidate_directory
+from appointments.search import doctor_index
+
+@receiver([post_save, post_delete], sender=Doctor)
+@receiver([post_save, post_delete], sender=Hospital)
+def invalidate_doctor_index(sender, **kwargs):
+    doctor_index.invalidate()
+    invalidate_directory()
+
+@receiver([post_save, post_delete], sender=Department)
+def invalidate_directory_department(sender, **kwargs):
+    invalidate_directory()
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_doctor_index_on_rename(sender, instance, update_fields, **kwargs):
+    if not instance.is_doctor or (update_fields and 'name' not in update_fields):
+        return
+
+    doctor_index.invalidate()
+    invalidate_directory()
+
+@receiver(post_save, sender=Doctor)
+def sync_feed_doctor(sender, instance, created, **kwargs):
+    if not created:
+        sync_doctor([instance.id])
+
+@receiver(post_save, sender=Hospital)
+def sync_feed_hospital(sender, instance, created, **kwargs):
+    if not created:
+        sync_doctor(Doctor.objects.filter(hospital=instance).values_list('id', flat=True))
+
+@receiver(pre_delete, sender=Hospital)
+def remember_hospital_doctors(sender, instance, using, **kwargs):
+    # Copies of reference tables on other shards are not the source of truth
+    if using == DEFAULT_DB_ALIAS:
+        instance.doctor_ids = list(Doctor.objects.filter(hospital=instance).values_list('id', flat=True))
+
+@receiver(post_delete, sender=Hospital)
+def sync_feed_hospital_deletion(sender, instance, **kwargs):
+    # SET_NULL clears Doctor.hospital with a bulk update, so no Doctor post_save reaches the feed
+    sync_doctor(getattr(instance, 'doctor_ids', []))
+
+@receiver(post_save, sender=Department)
+def sync_feed_department(sender, instance, created, **kwargs):
+    if not created:
+        sync_doctor(Doctor.objects.filter(department=instance).values_list('id', flat=True))
+
+@receiver(post_save, sender=CustomUser)
+def sync_feed_doctor_rename(sender, instance, created, update_fields, **kwargs):
+    if created or not instance.is_doctor or (update_fields and 'name' not in update_fields):
+        return
+
+    sync_doctor(Doctor.objects.filter(user=instance).values_list('id', flat=True))
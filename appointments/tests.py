@@ -1,13 +1,48 @@
+import os
+import re
 import jwt
-
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from io       import BytesIO, StringIO
+from time     import sleep
+from unittest import mock
 from datetime import datetime, timedelta, date, time
 
-from django.test                    import TestCase, Client
+from django.test                    import TestCase, Client, override_settings
+from django.test.utils              import CaptureQueriesContext
+from django.db                      import connections
 from django.conf                    import settings
+from django.core.management         import call_command, CommandError
+from django.core.cache              import cache
+from django.core.files.storage      import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from users.models        import CustomUser, Department, Hospital, Doctor, WorkingDay, WorkingTime
-from appointments.models import Appointment, AppointmentImage, State, UserAppointment
+from voidoc.storage          import release
+from voidoc.middleware       import PIN_COOKIE
+from users.models            import CustomUser, Department, Hospital, Doctor, WorkingDay, WorkingTime, WorkingTemplate
+from appointments.cache      import stats, compute_once
+from appointments.models     import (
+    Appointment, AppointmentImage, State, UserAppointment,
+    ArchivedAppointment, ArchivedUserAppointment, ArchivedAppointmentImage, PatientFeed, UploadSession
+)
+from appointments.search     import DoctorSearchIndex
+from appointments.archive    import archive_batch
+from appointments.uploads    import append_chunk, session_path
+from appointments.repository import shard_for
+
+PNG = b'\x89PNG\r\n\x1a\n'
+
+def fetched_columns(queries, table):
+    # Columns of table in the select lists of the captured queries, WHERE and ORDER BY are ignored
+    return {
+        column for query in queries if query['sql'].startswith('SELECT')
+        for column in re.findall(rf'"{table}"\."(\w+)"', query['sql'].split(' FROM ')[0])
+    }
 
 class DepartmentsListTest(TestCase):
     def setUp(self):
@@ -56,6 +91,8 @@ class DepartmentsListTest(TestCase):
 
 class DoctorListTest(TestCase):
     def setUp(self):
+        cache.clear()
+
         CustomUser.objects.create_user(
             name      = 'kevin',
             email     = 'kevin@gmail.com',
@@ -96,25 +133,1693 @@ class DoctorListTest(TestCase):
         Hospital.objects.all().delete()
         Doctor.objects.all().delete()
 
-    def test_success_doctor_list(self):
-        client = Client()
-        headers = {"HTTP_Authorization" : self.token}
-        response = client.get('/appointments/departments/1', **headers, content_type='application/json')
+    def test_success_doctor_list(self):
+        client = Client()
+        headers = {"HTTP_Authorization" : self.token}
+        response = client.get('/appointments/departments/1', **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), 
+            {
+                "result": [
+                    {
+                        "id"         : 1,
+                        "names"       : "doctor",
+                        "departments" : "가정의학과",
+                        "hospitals"   : "퍼즐AI병원",
+                        "profile_imgs": f"{settings.LOCAL_PATH}/doctor_profile_img/doctor_profile.png"
+                    }
+                ]
+            }
+        )
+
+class DoctorSearchTest(TestCase):
+    def setUp(self):
+        CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        Department.objects.bulk_create([
+            Department(id = 1, name = "가정의학과", thumbnail = "family_medicine.png"),
+            Department(id = 2, name = "피부과", thumbnail = "dermatology.png")
+        ])
+
+        Hospital.objects.bulk_create([
+            Hospital(id = 1, name = "퍼즐AI병원"),
+            Hospital(id = 2, name = "서울중앙병원")
+        ])
+
+        for i, (name, department_id, hospital_id) in enumerate([("김민준", 1, 1), ("김서연", 2, 2), ("이민호", 1, 2)], start=1):
+            user = CustomUser.objects.create_user(
+                name      = name,
+                email     = f'doctor{i}@gmail.com',
+                password  = 'doctor123',
+                is_doctor = True
+            )
+            Doctor.objects.create(
+                id            = i,
+                user_id       = user.id,
+                department_id = department_id,
+                hospital_id   = hospital_id,
+                profile_img   = f"profile{i}.png"
+            )
+
+        WorkingDay.objects.create(doctor_id = 3, date = date.today() + timedelta(days=2))
+
+        self.token = jwt.encode({"user_id" : CustomUser.objects.get(is_doctor=False).id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        WorkingDay.objects.all().delete()
+
+    def search(self, query_string):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.token}
+
+        return client.get(f'/appointments/doctor/search?{query_string}', **headers, content_type='application/json')
+
+    def test_success_search_by_name_substring(self):
+        response = self.search('q=민')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(),
+            {
+                "result": [
+                    {
+                        "doctor_id"         : 1,
+                        "doctor_name"       : "김민준",
+                        "doctor_department" : "가정의학과",
+                        "doctor_hospital"   : "퍼즐AI병원",
+                        "doctor_profile_img": f"{settings.LOCAL_PATH}/doctor_profile_img/profile1.png"
+                    },
+                    {
+                        "doctor_id"         : 3,
+                        "doctor_name"       : "이민호",
+                        "doctor_department" : "가정의학과",
+                        "doctor_hospital"   : "서울중앙병원",
+                        "doctor_profile_img": f"{settings.LOCAL_PATH}/doctor_profile_img/profile3.png"
+                    }
+                ],
+                "next_cursor": None
+            }
+        )
+
+    def test_success_search_by_name_and_hospital(self):
+        response = self.search('q=김 서울')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([doctor['doctor_id'] for doctor in response.json()['result']], [2])
+
+    def test_success_search_with_department_filter(self):
+        response = self.search('q=병원&department_id=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([doctor['doctor_id'] for doctor in response.json()['result']], [1, 3])
+
+    def test_success_search_available_this_week(self):
+        response = self.search('q=민&available=true')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([doctor['doctor_id'] for doctor in response.json()['result']], [3])
+
+    def test_success_search_keyset_pagination(self):
+        response = self.search('q=병원&limit=2')
+
+        self.assertEqual([doctor['doctor_id'] for doctor in response.json()['result']], [1, 2])
+        self.assertEqual(response.json()['next_cursor'], 2)
+
+        response = self.search('q=병원&limit=2&cursor=2')
+
+        self.assertEqual([doctor['doctor_id'] for doctor in response.json()['result']], [3])
+        self.assertEqual(response.json()['next_cursor'], None)
+
+    def test_success_search_picks_up_renamed_doctor(self):
+        hospital      = Hospital.objects.get(id=1)
+        hospital.name = "새봄병원"
+        hospital.save()
+        response = self.search('q=새봄')
+
+        self.assertEqual([doctor['doctor_id'] for doctor in response.json()['result']], [1])
+
+    def test_success_search_during_rebuild_uses_one_snapshot(self):
+        index = DoctorSearchIndex()
+        index.build_from([(1, '김민준', '퍼즐AI병원', 1), (3, '이민호', '서울중앙병원', 1)])
+        match_term = index.match_term
+
+        def rebuild_midway(snapshot, term):
+            # A concurrent rebuild that drops every doctor lands between two terms
+            index.build_from([])
+            return match_term(snapshot, term)
+
+        with mock.patch.object(index, 'match_term', side_effect=rebuild_midway):
+            self.assertEqual(index.search('민 김', department_id=1), [1])
+
+    def test_success_invalidate_during_build_keeps_index_stale(self):
+        index = DoctorSearchIndex()
+
+        def rows():
+            yield (1, '김민준', '퍼즐AI병원', 1)
+            # A doctor is added after the scan has passed their row
+            index.invalidate()
+
+        index.build_from(rows())
+
+        self.assertTrue(index.is_stale())
+
+    def test_success_search_during_rebuild_serves_old_snapshot(self):
+        index = DoctorSearchIndex()
+        index.build_from([(1, '김민준', '퍼즐AI병원', 1)])
+        index.invalidate()
+
+        # Another thread holds the lock for its rebuild
+        with index.lock:
+            self.assertEqual(index.search('김'), [1])
+
+    def test_fail_search_invalid_query_parameter(self):
+        response = self.search('q=민&cursor=abc')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_QUERY_PARAMETER'})
+
+class EarliestSlotTest(TestCase):
+    def setUp(self):
+        CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        Department.objects.bulk_create([
+            Department(id = 1, name = "피부과", thumbnail = "dermatology.png"),
+            Department(id = 2, name = "소아과", thumbnail = "pediatrics.png")
+        ])
+
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+
+        for i, department_id in enumerate([1, 1, 2], start=1):
+            user = CustomUser.objects.create_user(
+                name      = f'doctor{i}',
+                email     = f'doctor{i}@gmail.com',
+                password  = 'doctor123',
+                is_doctor = True
+            )
+            Doctor.objects.create(
+                id            = i,
+                user_id       = user.id,
+                department_id = department_id,
+                hospital_id   = 1,
+                profile_img   = f"profile{i}.png"
+            )
+
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소")
+        ])
+
+        self.tomorrow = date.today() + timedelta(days=1)
+        self.next_day = date.today() + timedelta(days=2)
+
+        WorkingDay.objects.bulk_create([
+            WorkingDay(id = 1, doctor_id = 1, date = self.tomorrow),
+            WorkingDay(id = 2, doctor_id = 2, date = self.tomorrow),
+            WorkingDay(id = 3, doctor_id = 2, date = self.next_day),
+            WorkingDay(id = 4, doctor_id = 3, date = self.tomorrow),
+            WorkingDay(id = 5, doctor_id = 1, date = date.today())
+        ])
+
+        WorkingTime.objects.bulk_create([
+            WorkingTime(working_day_id = 1, time = time(10)),
+            WorkingTime(working_day_id = 1, time = time(11)),
+            WorkingTime(working_day_id = 2, time = time(9)),
+            WorkingTime(working_day_id = 2, time = time(10)),
+            WorkingTime(working_day_id = 3, time = time(9)),
+            WorkingTime(working_day_id = 4, time = time(8)),
+            WorkingTime(working_day_id = 5, time = time(23))
+        ])
+
+        Appointment.objects.bulk_create([
+            Appointment(id = 1, symptom = "아파요", opinion = "", date = self.tomorrow, time = time(9), state_id = 1),
+            Appointment(id = 2, symptom = "아파요", opinion = "", date = self.tomorrow, time = time(10), state_id = 2)
+        ])
+
+        patient = CustomUser.objects.get(is_doctor=False)
+
+        UserAppointment.objects.bulk_create([
+            UserAppointment(appointment_id = 1, doctor_id = 2, patient_id = patient.id),
+            UserAppointment(appointment_id = 2, doctor_id = 1, patient_id = patient.id)
+        ])
+
+        self.token = jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        UserAppointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        WorkingTime.objects.all().delete()
+
+    def test_success_earliest_slots(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.token}
+
+        with self.assertNumQueries(6):
+            response = client.get('/appointments/departments/1/earliest?count=4', **headers, content_type='application/json')
+
+        tomorrow = self.tomorrow.strftime("%Y-%m-%d")
+        next_day = self.next_day.strftime("%Y-%m-%d")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(),
+            {
+                "result": [
+                    {"doctor_id": 1, "doctor_name": "doctor1", "doctor_hospital": "퍼즐AI병원", "date": tomorrow, "time": "10:00"},
+                    {"doctor_id": 2, "doctor_name": "doctor2", "doctor_hospital": "퍼즐AI병원", "date": tomorrow, "time": "10:00"},
+                    {"doctor_id": 1, "doctor_name": "doctor1", "doctor_hospital": "퍼즐AI병원", "date": tomorrow, "time": "11:00"},
+                    {"doctor_id": 2, "doctor_name": "doctor2", "doctor_hospital": "퍼즐AI병원", "date": next_day, "time": "09:00"}
+                ]
+            }
+        )
+
+    def test_fail_earliest_slots_invalid_query_parameter(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.token}
+
+        response = client.get('/appointments/departments/1/earliest?count=many', **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_QUERY_PARAMETER'})
+
+class WorkingTemplateTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+
+        self.doctor_token  = jwt.encode({"user_id" : doc.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+        self.patient_token = jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+        self.schedule      = {
+            'weekdays'   : [0, 1, 2, 3, 4],
+            'start_time' : '09:00',
+            'end_time'   : '17:00',
+            'break_start': '12:00',
+            'break_end'  : '13:00',
+            'start_date' : '2030-01-07',
+            'end_date'   : '2030-01-20'
+        }
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        WorkingTime.objects.all().delete()
+
+    def test_success_publish_schedule(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.doctor_token}
+
+        response = client.post('/appointments/doctor/schedule', self.schedule, **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['slots'], 70)
+        self.assertEqual(WorkingDay.objects.filter(doctor_id=1).count(), 10)
+        self.assertEqual(WorkingTime.objects.filter(working_day__doctor_id=1).count(), 70)
+        self.assertFalse(WorkingTime.objects.filter(time=time(12)).exists())
+        self.assertFalse(WorkingDay.objects.filter(date=date(2030, 1, 12)).exists())
+
+    def test_success_publish_schedule_is_idempotent(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.doctor_token}
+
+        client.post('/appointments/doctor/schedule', self.schedule, **headers, content_type='application/json')
+        response = client.post('/appointments/doctor/schedule', self.schedule, **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(WorkingDay.objects.filter(doctor_id=1).count(), 10)
+        self.assertEqual(WorkingTime.objects.filter(working_day__doctor_id=1).count(), 70)
+
+    def test_fail_publish_schedule_as_patient(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.patient_token}
+
+        response = client.post('/appointments/doctor/schedule', self.schedule, **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'message' : 'ONLY_DOCTORS_CAN_PUBLISH_SCHEDULES'})
+
+    def test_fail_publish_schedule_invalid_time(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.doctor_token}
+
+        response = client.post('/appointments/doctor/schedule', dict(self.schedule, end_time='25:00'), **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_SCHEDULE'})
+
+    def test_fail_publish_schedule_weekday_out_of_range(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.doctor_token}
+
+        response = client.post('/appointments/doctor/schedule', dict(self.schedule, weekdays=[10]), **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_SCHEDULE'})
+        self.assertFalse(WorkingTemplate.objects.exists())
+
+    @override_settings(WORKING_TIME_STORAGE='mask')
+    def test_success_publish_schedule_as_slot_mask(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.doctor_token}
+
+        client.post('/appointments/doctor/schedule', self.schedule, **headers, content_type='application/json')
+        client.post('/appointments/doctor/schedule', dict(self.schedule, start_time='17:00', end_time='19:00'), **headers, content_type='application/json')
+        response = client.get('/appointments/doctor/1/workingtime?year=2030&month=1&day=7', **headers, content_type='application/json')
+
+        self.assertEqual(WorkingDay.objects.filter(doctor_id=1).count(), 10)
+        self.assertFalse(WorkingTime.objects.exists())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(),
+            {
+                'appointmented_time': [],
+                'working_time'      : ['09:00', '10:00', '11:00', '13:00', '14:00', '15:00', '16:00', '17:00', '18:00']
+            }
+        )
+
+@override_settings(WORKING_TIME_STORAGE='mask')
+class SubHourSlotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png", slot_minutes = 30)
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소")
+        ])
+
+        self.selected_date = date.today() + timedelta(days=3)
+        self.token         = jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+        doctor_token       = jwt.encode({"user_id" : doc.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+
+        Client().post('/appointments/doctor/schedule', {
+            'weekdays'   : list(range(7)),
+            'start_time' : '09:00',
+            'end_time'   : '11:30',
+            'start_date' : self.selected_date.isoformat(),
+            'end_date'   : self.selected_date.isoformat()
+        }, HTTP_Authorization = doctor_token, content_type='application/json')
+
+        Appointment.objects.create(id = 1, symptom = "아파요", opinion = "", date = self.selected_date, time = time(9), duration = 60, state_id = 1)
+        UserAppointment.objects.create(appointment_id = 1, doctor_id = 1, patient_id = patient.id)
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        UserAppointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+
+    def create(self, appointment_time):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.token}
+
+        return client.post('/appointments/create', {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : appointment_time,
+            'symptom'   : "symptom"
+        }, **headers)
+
+    def test_success_half_hour_working_time(self):
+        client  = Client()
+        headers = {"HTTP_Authorization" : self.token}
+        query   = f'year={self.selected_date.year}&month={self.selected_date.month}&day={self.selected_date.day}'
+
+        response = client.get(f'/appointments/doctor/1/workingtime?{query}', **headers, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(),
+            {
+                'appointmented_time': ['09:00', '09:30'],
+                'working_time'      : ['09:00', '09:30', '10:00', '10:30', '11:00']
+            }
+        )
+
+    def test_success_half_hour_appointment_creation(self):
+        response = self.create('10:30')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.get(time=time(10, 30)).duration, 30)
+
+    def test_fail_appointment_creation_off_grid(self):
+        response = self.create('10:15')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_APPOINTMENT_TIME'})
+
+    def test_fail_appointment_creation_overlapping_booking(self):
+        response = self.create('09:30')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'ALREADY_BOOKED_TIME'})
+
+    def test_success_cancelled_appointment_frees_working_time(self):
+        Appointment.objects.create(id = 2, symptom = "아파요", opinion = "", date = self.selected_date, time = time(10), duration = 60, state_id = 2)
+        UserAppointment.objects.create(appointment_id = 2, doctor_id = 1, patient_id = CustomUser.objects.get(is_doctor = False).id)
+        query = f'year={self.selected_date.year}&month={self.selected_date.month}&day={self.selected_date.day}'
+
+        with self.assertNumQueries(3) as queries:
+            response = Client().get(f'/appointments/doctor/1/workingtime?{query}', HTTP_Authorization = self.token)
+
+        self.assertEqual(response.json()['appointmented_time'], ['09:00', '09:30'])
+        self.assertNotIn('symptom', queries.captured_queries[-1]['sql'])
+
+        response = Client().get(f'/appointments/doctor/1/workingtime?{query}&free=1', HTTP_Authorization = self.token)
+
+        self.assertEqual(response.json(), {'free_time' : ['10:00', '10:30', '11:00']})
+
+class ClosePastAppointmentsTest(TestCase):
+    def setUp(self):
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소"),
+            State(id = 3, name = "진료완료")
+        ])
+
+        yesterday = date.today() - timedelta(days=1)
+        tomorrow  = date.today() + timedelta(days=1)
+
+        Appointment.objects.bulk_create([
+            Appointment(id = 1, symptom = "아파요", opinion = "연고 처방", date = yesterday, time = time(10), state_id = 1),
+            Appointment(id = 2, symptom = "아파요", opinion = "", date = yesterday, time = time(11), state_id = 1),
+            Appointment(id = 3, symptom = "아파요", opinion = "", date = yesterday, time = time(12), state_id = 2),
+            Appointment(id = 4, symptom = "아파요", opinion = "", date = tomorrow, time = time(10), state_id = 1),
+            Appointment(id = 5, symptom = "아파요", opinion = "", date = yesterday, time = time(13), state_id = 1)
+        ])
+
+    def tearDown(self):
+        Appointment.objects.all().delete()
+        State.objects.all().delete()
+
+    def states(self):
+        return dict(Appointment.objects.values_list('id', 'state_id'))
+
+    def test_success_close_past_appointments(self):
+        call_command('close_past_appointments', batch_size = 2, stdout = StringIO())
+
+        self.assertEqual(self.states(), {1 : 3, 2 : 4, 3 : 2, 4 : 1, 5 : 4})
+        self.assertTrue(State.objects.filter(id = State.NO_SHOW).exists())
+
+    def test_success_close_past_appointments_is_idempotent(self):
+        call_command('close_past_appointments', stdout = StringIO())
+        out = StringIO()
+        call_command('close_past_appointments', stdout = out)
+
+        self.assertIn('done: 0 closed, 0 no-show', out.getvalue())
+        self.assertEqual(self.states(), {1 : 3, 2 : 4, 3 : 2, 4 : 1, 5 : 4})
+
+    def test_success_close_past_appointments_resumes_after_start_id(self):
+        call_command('close_past_appointments', start_id = 2, stdout = StringIO())
+
+        self.assertEqual(self.states(), {1 : 1, 2 : 1, 3 : 2, 4 : 1, 5 : 4})
+
+    def test_success_close_past_appointments_dry_run(self):
+        out = StringIO()
+        call_command('close_past_appointments', dry_run = True, stdout = out)
+
+        self.assertIn('3 appointments would be closed', out.getvalue())
+        self.assertEqual(Appointment.objects.filter(state_id = 1).count(), 4)
+
+class ArchiveAppointmentsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소"),
+            State(id = 3, name = "진료완료")
+        ])
+
+        old    = date.today() - timedelta(days=400)
+        recent = date.today() - timedelta(days=10)
+        future = date.today() + timedelta(days=3)
+
+        Appointment.objects.bulk_create([
+            Appointment(id = 1, symptom = "아파요", opinion = "연고 처방", date = old, time = time(10), state_id = 3),
+            Appointment(id = 2, symptom = "아파요", opinion = "", date = old, time = time(11), state_id = 2),
+            Appointment(id = 3, symptom = "아파요", opinion = "연고 처방", date = recent, time = time(10), state_id = 3)
+        ] + [
+            Appointment(id = 10 + hour, symptom = "아파요", opinion = "", date = future, time = time(hour), state_id = 1)
+            for hour in range(9, 14)
+        ])
+        UserAppointment.objects.bulk_create([
+            UserAppointment(appointment_id = appointment_id, doctor_id = 1, patient_id = patient.id)
+            for appointment_id in Appointment.objects.values_list('id', flat = True)
+        ])
+        AppointmentImage.objects.create(appointment_id = 1, wound_img = "wound_img/old.png")
+        call_command('rebuild_patient_feed', stdout = StringIO())
+
+        self.token = jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        ArchivedAppointment.objects.all().delete()
+
+    def page(self, page):
+        response = Client().get(f'/appointments/list?page={page}', HTTP_Authorization = self.token)
+        return [appointment['appointment_id'] for appointment in response.json()['result']]
+
+    def test_success_archive_appointments(self):
+        call_command('archive_appointments', stdout = StringIO())
+
+        self.assertEqual(list(ArchivedAppointment.objects.order_by('id').values_list('id', flat = True)), [1, 2])
+        self.assertEqual(ArchivedUserAppointment.objects.count(), 2)
+        self.assertEqual(ArchivedAppointmentImage.objects.get().wound_img, "wound_img/old.png")
+        self.assertFalse(Appointment.objects.filter(id__in = [1, 2]).exists())
+        self.assertFalse(AppointmentImage.objects.exists())
+
+    def test_success_archive_skips_appointment_without_patient(self):
+        Appointment.objects.create(id = 4, symptom = "아파요", opinion = "", date = date.today() - timedelta(days=400), time = time(12), state_id = 2)
+
+        call_command('archive_appointments', stdout = StringIO())
+
+        self.assertEqual(list(ArchivedAppointment.objects.order_by('id').values_list('id', flat = True)), [1, 2])
+        self.assertTrue(Appointment.objects.filter(id = 4).exists())
+        self.assertEqual(archive_batch([4]), 0)
+
+    def test_success_appointment_list_reads_archive_in_order(self):
+        call_command('archive_appointments', stdout = StringIO())
+
+        self.assertEqual(self.page(1), [19, 20, 21, 22])
+        self.assertEqual(self.page(2), [23, 2, 1, 3])
+
+    def test_success_appointment_list_reads_only_the_feed(self):
+        call_command('archive_appointments', stdout = StringIO())
+
+        with self.assertNumQueries(3):
+            self.page(1)
+
+    def test_success_appointment_detail_of_archived_appointment(self):
+        call_command('archive_appointments', stdout = StringIO())
+
+        response = Client().get('/appointments/1', HTTP_Authorization = self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result']['Wound_img'], [f'{settings.LOCAL_PATH}/wound_img/old.png'])
+
+    def test_fail_appointment_list_empty_page(self):
+        call_command('archive_appointments', stdout = StringIO())
+
+        response = Client().get('/appointments/list?page=3', HTTP_Authorization = self.token)
+
+        self.assertEqual(response.json(), {'message' : 'THE_GIVEN_PAGE_CONTAINS_NOTHING'})
+
+class PatientFeedTest(TestCase):
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        self.doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = self.doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소")
+        ])
+
+        self.selected_date = date.today() + timedelta(days=3)
+        self.token         = jwt.encode({"user_id" : self.patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+        working_day        = WorkingDay.objects.create(doctor_id = 1, date = self.selected_date)
+        WorkingTime.objects.bulk_create([WorkingTime(working_day = working_day, time = time(hour)) for hour in (10, 11)])
+
+        Client().post('/appointments/create', {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : 10,
+            'symptom'   : "symptom"
+        }, HTTP_Authorization = self.token)
+        self.appointment_id = Appointment.objects.get().id
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        PatientFeed.objects.all().delete()
+
+    def test_success_feed_row_on_creation(self):
+        feed = PatientFeed.objects.get()
+
+        self.assertEqual(feed.appointment_id, self.appointment_id)
+        self.assertEqual((feed.state_name, feed.date, feed.time), ("진료대기", self.selected_date, time(10)))
+        self.assertEqual((feed.doctor_name, feed.doctor_hospital, feed.doctor_department), ("doctor", "퍼즐AI병원", "피부과"))
+
+    def test_success_feed_follows_change_and_cancellation(self):
+        headers = {"HTTP_Authorization" : self.token}
+
+        Client().post(f'/appointments/{self.appointment_id}/change', {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : 11,
+            'symptom'   : "symptom"
+        }, **headers)
+        self.assertEqual(PatientFeed.objects.get().time, time(11))
+
+        Client().patch(f'/appointments/{self.appointment_id}/cancellation', **headers)
+        self.assertEqual(PatientFeed.objects.get().state_name, "진료취소")
+
+    def test_success_feed_follows_doctor_rename(self):
+        self.doc.name = 'renamed'
+        self.doc.save()
+
+        self.assertEqual(PatientFeed.objects.get().doctor_name, 'renamed')
+
+    def test_success_booking_doctor_without_hospital(self):
+        Hospital.objects.all().delete()
+        cache.clear()
+
+        response = Client().post('/appointments/create', {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : 11,
+            'symptom'   : "symptom"
+        }, HTTP_Authorization = self.token)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(PatientFeed.objects.order_by('time').values_list('doctor_hospital', flat = True)), [None, None])
+
+        response = Client().get('/appointments/list', HTTP_Authorization = self.token)
+        self.assertEqual([appointment['doctor_hospital'] for appointment in response.json()['result']], [None, None])
+
+    def test_success_check_patient_feed(self):
+        out = StringIO()
+        call_command('check_patient_feed', stdout = out)
+
+        self.assertIn('0 rows differ', out.getvalue())
+
+    def test_fail_check_patient_feed_detects_and_fixes_drift(self):
+        PatientFeed.objects.update(state_name = "진료완료")
+
+        with self.assertRaises(CommandError):
+            call_command('check_patient_feed', stdout = StringIO())
+
+        call_command('check_patient_feed', fix = True, stdout = StringIO())
+        self.assertEqual(PatientFeed.objects.get().state_name, "진료대기")
+
+    def test_success_rebuild_patient_feed(self):
+        PatientFeed.objects.all().delete()
+        call_command('rebuild_patient_feed', stdout = StringIO())
+
+        self.assertEqual(PatientFeed.objects.get().appointment_id, self.appointment_id)
+
+class DoctorAgendaTest(TestCase):
+    def setUp(self):
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소")
+        ])
+
+        self.day = date(2022, 7, 11)
+        Appointment.objects.bulk_create([
+            Appointment(id = 1, symptom = "가려워요", opinion = "", date = self.day, time = time(14), state_id = 1),
+            Appointment(id = 2, symptom = "아파요", opinion = "", date = self.day, time = time(10), state_id = 2),
+            Appointment(id = 3, symptom = "따가워요", opinion = "", date = self.day + timedelta(days=1), time = time(9), state_id = 1)
+        ])
+        UserAppointment.objects.bulk_create([
+            UserAppointment(appointment_id = appointment_id, doctor_id = 1, patient_id = patient.id) for appointment_id in (1, 2, 3)
+        ])
+        AppointmentImage.objects.bulk_create([
+            AppointmentImage(appointment_id = 1, wound_img = "wound_img/one.png"),
+            AppointmentImage(appointment_id = 1, wound_img = "wound_img/two.png")
+        ])
+
+        self.doctor_token  = jwt.encode({"user_id" : doc.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+        self.patient_token = jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+
+    def test_success_doctor_agenda(self):
+        response = Client().get('/appointments/doctor/agenda?date=2022-07-11', HTTP_Authorization = self.doctor_token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'result' : [
+                {
+                    'appointment_id'  : 2,
+                    'appointment_date': '2022-07-11(월) 오전 10:00',
+                    'duration'        : 60,
+                    'patient_id'      : CustomUser.objects.get(is_doctor = False).id,
+                    'patient_name'    : 'kevin',
+                    'patient_symptom' : '아파요',
+                    'state_name'      : '진료취소',
+                    'wound_img'       : []
+                },
+                {
+                    'appointment_id'  : 1,
+                    'appointment_date': '2022-07-11(월) 오후 2:00',
+                    'duration'        : 60,
+                    'patient_id'      : CustomUser.objects.get(is_doctor = False).id,
+                    'patient_name'    : 'kevin',
+                    'patient_symptom' : '가려워요',
+                    'state_name'      : '진료대기',
+                    'wound_img'       : [f'{settings.LOCAL_PATH}/wound_img/one.png', f'{settings.LOCAL_PATH}/wound_img/two.png']
+                }
+            ],
+            'next_date' : '2022-07-12'
+        })
+
+    def test_success_doctor_agenda_week_in_fixed_queries(self):
+        client = Client()
+
+        with self.assertNumQueries(3):
+            response = client.get('/appointments/doctor/agenda?date=2022-07-11&days=7', HTTP_Authorization = self.doctor_token)
+
+        self.assertEqual([appointment['appointment_id'] for appointment in response.json()['result']], [2, 1, 3])
+        self.assertEqual(response.json()['next_date'], '2022-07-18')
+
+    def test_fail_doctor_agenda_for_patient(self):
+        response = Client().get('/appointments/doctor/agenda', HTTP_Authorization = self.patient_token)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'message' : 'ONLY_DOCTORS_CAN_VIEW_AGENDA'})
+
+    def test_fail_doctor_agenda_invalid_range(self):
+        response = Client().get('/appointments/doctor/agenda?date=2022-07-11&days=30', HTTP_Authorization = self.doctor_token)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_QUERY_PARAMETER'})
+
+class OpinionTest(TestCase):
+    def setUp(self):
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.create(id = 1, name = "진료대기")
+
+        Appointment.objects.create(id = 1, symptom = "아파요", opinion = "", date = date(2022, 7, 11), time = time(10), state_id = 1)
+        UserAppointment.objects.create(appointment_id = 1, doctor_id = 1, patient_id = patient.id)
+
+        self.doctor_headers  = {"HTTP_Authorization" : jwt.encode({"user_id" : doc.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        self.patient_headers = {"HTTP_Authorization" : jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+
+    def save(self, opinion, updated_at, headers = None):
+        return Client().patch('/appointments/1/opinion', {
+            'opinion'    : opinion,
+            'updated_at' : updated_at
+        }, content_type = 'application/json', **(headers or self.doctor_headers))
+
+    def test_success_opinion_save_and_autosave(self):
+        updated_at = Client().get('/appointments/1/opinion', **self.doctor_headers).json()['updated_at']
+
+        first  = self.save("연고", updated_at)
+        second = self.save("연고 처방", first.json()['updated_at'])
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['message'], 'OPINION_SAVED')
+        self.assertEqual(Appointment.objects.get(id = 1).opinion, "연고 처방")
+
+    def test_fail_opinion_save_with_stale_updated_at(self):
+        updated_at = Client().get('/appointments/1/opinion', **self.doctor_headers).json()['updated_at']
+        self.save("연고", updated_at)
+
+        response = self.save("붕대", updated_at)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['message'], 'OPINION_WAS_CHANGED_BY_ANOTHER_REQUEST')
+        self.assertEqual(response.json()['opinion'], "연고")
+        self.assertEqual(Appointment.objects.get(id = 1).opinion, "연고")
+
+    def test_fail_opinion_save_by_patient(self):
+        updated_at = Appointment.objects.get(id = 1).updated_at.isoformat()
+
+        response = self.save("연고", updated_at, self.patient_headers)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Appointment.objects.get(id = 1).opinion, "")
+
+    def test_fail_opinion_save_invalid_updated_at(self):
+        response = self.save("연고", "yesterday")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_UPDATED_AT'})
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        self.doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = self.doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소")
+        ])
+
+        selected_date = date.today() + timedelta(days=3)
+        working_day   = WorkingDay.objects.create(doctor_id = 1, date = selected_date)
+        WorkingTime.objects.create(working_day = working_day, time = time(10))
+
+        self.headers = {"HTTP_Authorization" : jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        cache.clear()
+        Client().post('/appointments/create', {
+            'doctor_id' : 1,
+            'year'      : selected_date.year,
+            'month'     : selected_date.month,
+            'day'       : selected_date.day,
+            'time'      : 10,
+            'symptom'   : "symptom"
+        }, **self.headers)
+        self.appointment_id = Appointment.objects.get().id
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        PatientFeed.objects.all().delete()
+
+    def revalidate(self, url, etag):
+        return Client().get(url, HTTP_IF_NONE_MATCH = etag, **self.headers)
+
+    def test_success_appointment_list_not_modified_without_running_list_query(self):
+        response = Client().get('/appointments/list', **self.headers)
+        etag     = response['ETag']
+
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertIn('private', response['Cache-Control'])
+
+        # Without the response cache the version lookup is all that runs
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.revalidate('/appointments/list', etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_success_appointment_list_changes_etag_on_cancellation(self):
+        etag = Client().get('/appointments/list', **self.headers)['ETag']
+
+        with self.captureOnCommitCallbacks(execute = True):
+            Client().patch(f'/appointments/{self.appointment_id}/cancellation', **self.headers)
+        response = self.revalidate('/appointments/list', etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result'][0]['state_name'], "진료취소")
+
+    def test_success_appointment_list_changes_etag_on_doctor_rename(self):
+        etag = Client().get('/appointments/list', **self.headers)['ETag']
+
+        self.doc.name = 'renamed'
+        with self.captureOnCommitCallbacks(execute = True):
+            self.doc.save()
+
+        self.assertEqual(self.revalidate('/appointments/list', etag).status_code, 200)
+
+    def test_success_appointment_list_etag_depends_on_page(self):
+        etag = Client().get('/appointments/list', **self.headers)['ETag']
+
+        self.assertEqual(self.revalidate('/appointments/list?page=2', etag).status_code, 200)
+
+    def test_success_appointment_detail_not_modified_until_updated(self):
+        url  = f'/appointments/{self.appointment_id}'
+        etag = Client().get(url, **self.headers)['ETag']
+
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        Appointment.objects.filter(id = self.appointment_id).update(opinion = "opinion", updated_at = datetime.now() + timedelta(seconds=1))
+        cache.clear()
+        response = self.revalidate(url, etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['result']['doctor_opinion'], "opinion")
+
+    def test_success_large_json_is_compressed(self):
+        Department.objects.bulk_create([
+            Department(name = f"진료과{number}", thumbnail = f"department{number}.png") for number in range(40)
+        ])
+
+        response = Client().get('/appointments/departments', HTTP_ACCEPT_ENCODING = 'gzip, deflate', **self.headers)
+        plain    = Client().get('/appointments/departments', **self.headers)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+        revalidated = Client().get('/appointments/departments', HTTP_ACCEPT_ENCODING = 'gzip', HTTP_IF_NONE_MATCH = response['ETag'], **self.headers)
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_success_small_json_is_not_compressed(self):
+        response = Client().get('/appointments/departments', HTTP_ACCEPT_ENCODING = 'gzip', **self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        other = CustomUser.objects.create_user(
+            name      = 'other',
+            email     = 'other@gmail.com',
+            password  = 'other1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([
+            State(id = 1, name = "진료대기"),
+            State(id = 2, name = "진료취소")
+        ])
+
+        self.selected_date = date.today() + timedelta(days=3)
+        working_day        = WorkingDay.objects.create(doctor_id = 1, date = self.selected_date)
+        WorkingTime.objects.create(working_day = working_day, time = time(10))
+
+        self.headers        = {"HTTP_Authorization" : jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        self.other_headers  = {"HTTP_Authorization" : jwt.encode({"user_id" : other.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        self.doctor_headers = {"HTTP_Authorization" : jwt.encode({"user_id" : doc.id, "is_doctor" : True}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        cache.clear()
+
+        with self.captureOnCommitCallbacks(execute = True):
+            self.client.post('/appointments/create', self.form("symptom"), **self.headers)
+        self.appointment_id = Appointment.objects.get().id
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        PatientFeed.objects.all().delete()
+
+    def form(self, symptom):
+        return {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : 10,
+            'symptom'   : symptom
+        }
+
+    def test_success_repeat_list_and_detail_skip_the_database(self):
+        first = Client().get('/appointments/list', **self.headers)
+        Client().get(f'/appointments/{self.appointment_id}', **self.headers)
+
+        with self.assertNumQueries(0):
+            response = Client().get('/appointments/list', **self.headers)
+            detail   = Client().get(f'/appointments/{self.appointment_id}', **self.headers)
+
+        self.assertEqual(response.content, first.content)
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(detail.json()['result']['patient_symptom'], "symptom")
+
+    def test_success_cached_response_answers_if_none_match(self):
+        etag = Client().get('/appointments/list', **self.headers)['ETag']
+
+        with self.assertNumQueries(0):
+            response = Client().get('/appointments/list', HTTP_IF_NONE_MATCH = etag, **self.headers)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_success_cache_is_per_patient(self):
+        Client().get('/appointments/list', **self.headers)
+
+        self.assertEqual(Client().get('/appointments/list', **self.other_headers).json(), {'result' : []})
+
+    def test_success_cancellation_invalidates_list(self):
+        Client().get('/appointments/list', **self.headers)
+
+        with self.captureOnCommitCallbacks(execute = True):
+            Client().patch(f'/appointments/{self.appointment_id}/cancellation', **self.headers)
+
+        response = Client().get('/appointments/list', **self.headers)
+        self.assertEqual(response.json()['result'][0]['state_name'], "진료취소")
+
+    def test_success_change_invalidates_detail(self):
+        Client().get(f'/appointments/{self.appointment_id}', **self.headers)
+
+        with self.captureOnCommitCallbacks(execute = True):
+            Client().post(f'/appointments/{self.appointment_id}/change', self.form("changed"), **self.headers)
+
+        response = Client().get(f'/appointments/{self.appointment_id}', **self.headers)
+        self.assertEqual(response.json()['result']['patient_symptom'], "changed")
+
+    def test_success_opinion_invalidates_patient_detail(self):
+        Client().get(f'/appointments/{self.appointment_id}', **self.headers)
+        updated_at = Client().get(f'/appointments/{self.appointment_id}/opinion', **self.doctor_headers).json()['updated_at']
+
+        with self.captureOnCommitCallbacks(execute = True):
+            Client().patch(
+                f'/appointments/{self.appointment_id}/opinion', {'opinion' : "opinion", 'updated_at' : updated_at},
+                content_type = 'application/json', **self.doctor_headers
+            )
+
+        response = Client().get(f'/appointments/{self.appointment_id}', **self.headers)
+        self.assertEqual(response.json()['result']['doctor_opinion'], "opinion")
+
+    def test_success_opinion_invalidates_doctor_detail(self):
+        Client().get(f'/appointments/{self.appointment_id}', **self.doctor_headers)
+        updated_at = Client().get(f'/appointments/{self.appointment_id}/opinion', **self.doctor_headers).json()['updated_at']
+
+        with self.captureOnCommitCallbacks(execute = True):
+            Client().patch(
+                f'/appointments/{self.appointment_id}/opinion', {'opinion' : "opinion", 'updated_at' : updated_at},
+                content_type = 'application/json', **self.doctor_headers
+            )
+
+        response = Client().get(f'/appointments/{self.appointment_id}', **self.doctor_headers)
+        self.assertEqual(response.json()['result']['doctor_opinion'], "opinion")
+
+    def test_success_version_is_bumped_only_on_commit(self):
+        Client().get('/appointments/list', **self.headers)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Client().patch(f'/appointments/{self.appointment_id}/cancellation', **self.headers)
+
+        self.assertEqual(Client().get('/appointments/list', **self.headers).json()['result'][0]['state_name'], "진료대기")
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Client().get('/appointments/list', **self.headers).json()['result'][0]['state_name'], "진료취소")
+
+    def test_success_booking_invalidates_cached_working_time(self):
+        WorkingTime.objects.create(working_day = WorkingDay.objects.get(), time = time(11))
+        url = f'/appointments/doctor/1/workingtime?year={self.selected_date.year}&month={self.selected_date.month}&day={self.selected_date.day}'
+
+        self.assertEqual(Client().get(url, **self.headers).json()['appointmented_time'], ['10:00'])
+
+        with self.captureOnCommitCallbacks(execute = True):
+            Client().post('/appointments/create', dict(self.form("symptom"), time = 11), **self.other_headers)
+
+        self.assertEqual(Client().get(url, **self.headers).json()['appointmented_time'], ['10:00', '11:00'])
+
+    @override_settings(RESPONSE_CACHE_METRICS_FLUSH = 1)
+    def test_success_hit_and_miss_metrics(self):
+        stats.flush()
+        cache.clear()
+
+        for _ in range(3):
+            Client().get('/appointments/list', **self.headers)
+
+        output = StringIO()
+        call_command('response_cache_stats', 'appointment_list', stdout = output)
+
+        self.assertEqual(output.getvalue(), 'appointment_list: 2 hits, 1 misses (66.7% hit ratio)\n')
+
+class CacheStampedeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.lock  = threading.Lock()
+
+    def slow_compute(self, value = 'fresh'):
+        def compute():
+            with self.lock:
+                self.calls += 1
+            sleep(0.2)
+            return value
+        return compute
+
+    def run_concurrently(self, target, count = 16):
+        barrier = threading.Barrier(count)
+        results = [None] * count
+
+        def worker(index):
+            barrier.wait()
+            results[index] = target()
+
+        threads = [threading.Thread(target = worker, args = (index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_success_simultaneous_misses_compute_once(self):
+        results = self.run_concurrently(lambda: compute_once('stampede', self.slow_compute(), 60))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['fresh'] * 16)
+
+    @override_settings(CACHE_LEASE_POLL = 0.01)
+    def test_success_waits_for_lease_held_by_another_worker(self):
+        cache.add('lease:stampede', 1, 10)
+        threading.Timer(0.1, lambda: cache.set('stampede', {'value' : 'theirs', 'delta' : 0.1, 'expires' : 2 ** 40}, 60)).start()
+
+        self.assertEqual(compute_once('stampede', self.slow_compute(), 60), 'theirs')
+        self.assertEqual(self.calls, 0)
+
+    def test_success_early_refresh_near_expiry(self):
+        cache.set('stampede', {'value' : 'stale', 'delta' : 1.0, 'expires' : datetime.now().timestamp() + 0.5}, 60)
+
+        with mock.patch('appointments.cache.random.random', return_value = 0):
+            self.assertEqual(compute_once('stampede', self.slow_compute(), 60), 'stale')
+
+        with mock.patch('appointments.cache.random.random', return_value = 0.9):
+            self.assertEqual(compute_once('stampede', self.slow_compute(), 60), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_success_early_refresh_keeps_serving_while_refreshing(self):
+        cache.set('stampede', {'value' : 'stale', 'delta' : 1.0, 'expires' : datetime.now().timestamp() + 0.5}, 60)
+
+        with mock.patch('appointments.cache.random.random', return_value = 0.9):
+            results = self.run_concurrently(lambda: compute_once('stampede', self.slow_compute(), 60), count = 8)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results.count('fresh'), 1)
+        self.assertEqual(results.count('stale'), 7)
+
+    def test_success_simultaneous_working_time_requests_compute_once(self):
+        headers       = {"HTTP_Authorization" : jwt.encode({"user_id" : 1}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        selected_date = date.today() + timedelta(days=3)
+        url           = f'/appointments/doctor/1/workingtime?year={selected_date.year}&month={selected_date.month}&day={selected_date.day}'
+        table         = {'working_time' : ['10:00'], 'appointmented_time' : []}
+
+        with mock.patch('appointments.views.WorkingTimeView.time_table', side_effect = lambda *args: self.slow_compute(table)()):
+            responses = self.run_concurrently(lambda: Client().get(url, **headers))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({response.content for response in responses}, {json.dumps(table).encode()})
+
+@override_settings(DATABASE_REPLICAS = ['replica'])
+class ReadReplicaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A second SQLite file stands in for a replica that has not received any rows yet
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica'] = {'ENGINE' : 'django.db.backends.sqlite3', 'NAME' : os.path.join(cls.replica_dir, 'replica.sqlite3')}
+        call_command('migrate', database = 'replica', verbosity = 0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.create(id = 1, name = "진료대기")
+
+        self.selected_date = date.today() + timedelta(days=3)
+        working_day        = WorkingDay.objects.create(doctor_id = 1, date = self.selected_date)
+        WorkingTime.objects.create(working_day = working_day, time = time(10))
+
+        self.headers = {"HTTP_Authorization" : jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        cache.clear()
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        PatientFeed.objects.all().delete()
+
+    def create(self, client):
+        with self.captureOnCommitCallbacks(execute = True):
+            return client.post('/appointments/create', {
+                'doctor_id' : 1,
+                'year'      : self.selected_date.year,
+                'month'     : self.selected_date.month,
+                'day'       : self.selected_date.day,
+                'time'      : 10,
+                'symptom'   : "symptom"
+            }, **self.headers)
+
+    def test_success_opted_in_views_read_from_replica(self):
+        self.assertEqual(Client().get('/appointments/departments/1', **self.headers).json(), {'result' : []})
+        self.assertEqual(len(Client().get('/appointments/departments', **self.headers).json()['result']), 1)
+
+    def test_success_writes_go_to_primary_and_pin_the_client(self):
+        client   = Client()
+        response = self.create(client)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(Appointment.objects.using('default').exists())
+        self.assertFalse(Appointment.objects.using('replica').exists())
+
+        self.assertEqual(Client().get('/appointments/list', **self.headers).json(), {'result' : []})
+        cache.clear()
+        self.assertEqual(len(client.get('/appointments/list', **self.headers).json()['result']), 1)
+
+    def test_success_pin_expires(self):
+        client = Client()
+        self.create(client)
+
+        with mock.patch('django.core.signing.time.time', return_value = datetime.now().timestamp() + settings.PRIMARY_PIN_SECONDS + 1):
+            response = client.get('/appointments/list', **self.headers)
+
+        self.assertEqual(response.json(), {'result' : []})
+
+    def test_success_replica_reads_cached_briefly(self):
+        client = Client()
+
+        with mock.patch.object(cache, 'set', wraps = cache.set) as cache_set:
+            Client().get('/appointments/list', **self.headers)
+            Client().get('/appointments/departments/1', **self.headers)
+            self.create(client)
+            client.get('/appointments/list?page=1', **self.headers)
+
+        timeouts = [(call.args[0].split(':')[0], call.args[2]) for call in cache_set.call_args_list
+                    if call.args[0].startswith(('appointment_list:', 'doctor_directory:'))]
+        self.assertEqual(timeouts, [
+            ('appointment_list', settings.REPLICA_CACHE_TIMEOUT),
+            ('doctor_directory', settings.REPLICA_CACHE_TIMEOUT),
+            ('appointment_list', settings.RESPONSE_CACHE_TIMEOUT)
+        ])
+
+    def test_success_reads_stay_on_primary_without_replicas(self):
+        with override_settings(DATABASE_REPLICAS = []):
+            response = Client().get('/appointments/departments/1', **self.headers)
+
+        self.assertEqual(len(response.json()['result']), 1)
+
+@override_settings(APPOINTMENT_SHARDS = ['default', 'shard1'])
+class ShardingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # A second SQLite file acts as a shard, its ids start high like an auto_increment offset would
+        cls.shard_dir = tempfile.mkdtemp()
+        connections.settings['shard1'] = {'ENGINE' : 'django.db.backends.sqlite3', 'NAME' : os.path.join(cls.shard_dir, 'shard1.sqlite3')}
+        call_command('migrate', database = 'shard1', verbosity = 0)
+        with connections['shard1'].cursor() as cursor:
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'appointments'")
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('appointments', 1000000)")
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['shard1'].close()
+        del connections['shard1']
+        del connections.settings['shard1']
+        shutil.rmtree(cls.shard_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        self.patients = {}
+        for number in range(20):
+            patient = CustomUser.objects.create_user(
+                name      = f'patient{number}',
+                email     = f'patient{number}@gmail.com',
+                password  = 'patient123',
+                is_doctor = 'False'
+            )
+            self.patients.setdefault(shard_for(patient.id), patient)
+            if len(self.patients) == 2:
+                break
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([State(id = 1, name = "진료대기"), State(id = 2, name = "진료취소")])
+
+        # Reference tables are replicated to every shard so shard-local joins keep working
+        for model in (CustomUser, Department, Hospital, Doctor, State):
+            model.objects.using('shard1').bulk_create(list(model.objects.all()))
+
+        self.selected_date = date.today() + timedelta(days=3)
+        working_day        = WorkingDay.objects.create(doctor_id = 1, date = self.selected_date)
+        WorkingTime.objects.bulk_create([WorkingTime(working_day = working_day, time = time(hour)) for hour in (10, 11)])
+
+        self.doctor_token = jwt.encode({"user_id" : doc.id, "is_doctor" : True}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+        cache.clear()
+
+    def tearDown(self):
+        for model in (
+            UploadSession, PatientFeed, AppointmentImage, UserAppointment, Appointment,
+            ArchivedAppointmentImage, ArchivedUserAppointment, ArchivedAppointment, Doctor, State, Hospital, Department, CustomUser
+        ):
+            model.objects.using('shard1').all().delete()
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        PatientFeed.objects.all().delete()
+
+    def token(self, alias):
+        return jwt.encode({"user_id" : self.patients[alias].id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+
+    def create(self, alias, hour):
+        with self.captureOnCommitCallbacks(execute = True):
+            return Client().post('/appointments/create', {
+                'doctor_id' : 1,
+                'year'      : self.selected_date.year,
+                'month'     : self.selected_date.month,
+                'day'       : self.selected_date.day,
+                'time'      : hour,
+                'symptom'   : "symptom"
+            }, HTTP_Authorization = self.token(alias))
+
+    def test_success_rows_land_on_patient_shard(self):
+        self.assertEqual(self.create('shard1', 10).status_code, 201)
+
+        appointment = Appointment.objects.using('shard1').get()
+        self.assertGreater(appointment.id, 1000000)
+        self.assertFalse(Appointment.objects.using('default').exists())
+        self.assertTrue(UserAppointment.objects.using('shard1').filter(patient_id = self.patients['shard1'].id).exists())
+        self.assertTrue(PatientFeed.objects.using('shard1').exists())
+
+        response = Client().get('/appointments/list', HTTP_Authorization = self.token('shard1'))
+        self.assertEqual([row['appointment_id'] for row in response.json()['result']], [appointment.id])
+
+        response = Client().get(f'/appointments/{appointment.id}', HTTP_Authorization = self.token('shard1'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Client().get('/appointments/list', HTTP_Authorization = self.token('default')).json(), {'result' : []})
+
+    def test_fail_double_booking_across_shards(self):
+        self.assertEqual(self.create('default', 10).status_code, 201)
+
+        response = self.create('shard1', 10)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'ALREADY_BOOKED_TIME'})
+        self.assertFalse(Appointment.objects.using('shard1').exists())
+
+    def test_success_doctor_views_merge_shards(self):
+        self.create('shard1', 10)
+        self.create('default', 11)
+
+        response = Client().get(
+            f'/appointments/doctor/1/workingtime?year={self.selected_date.year}&month={self.selected_date.month}&day={self.selected_date.day}',
+            HTTP_Authorization = self.token('default')
+        )
+        self.assertEqual(response.json()['appointmented_time'], ['10:00', '11:00'])
+
+        response = Client().get(f'/appointments/doctor/agenda?date={self.selected_date}', HTTP_Authorization = self.doctor_token)
+        self.assertEqual(
+            [row['patient_id'] for row in response.json()['result']],
+            [self.patients['shard1'].id, self.patients['default'].id]
+        )
+
+    def test_success_opinion_on_other_shard(self):
+        self.create('shard1', 10)
+        appointment = Appointment.objects.using('shard1').get()
+
+        response = Client().get(f'/appointments/{appointment.id}/opinion', HTTP_Authorization = self.doctor_token)
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute = True):
+            response = Client().patch(
+                f'/appointments/{appointment.id}/opinion',
+                json.dumps({'opinion' : '연고 처방', 'updated_at' : response.json()['updated_at']}),
+                content_type       = 'application/json',
+                HTTP_Authorization = self.doctor_token
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Appointment.objects.using('shard1').get().opinion, '연고 처방')
+
+    def test_success_doctor_detail_on_patient_shard(self):
+        for alias in self.patients:
+            self.create(alias, 10 if alias == 'shard1' else 11)
+
+        for alias in self.patients:
+            appointment = Appointment.objects.using(alias).get()
+            response    = Client().get(f'/appointments/{appointment.id}', HTTP_Authorization = self.doctor_token)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['result']['patient_symptom'], "symptom")
+
+    def test_success_doctor_rename_reaches_every_shard(self):
+        self.create('shard1', 10)
+        self.create('default', 11)
+
+        with self.captureOnCommitCallbacks(execute = True):
+            doctor      = Doctor.objects.get(id = 1).user
+            doctor.name = 'renamed'
+            doctor.save()
+
+        self.assertEqual(set(PatientFeed.objects.using('shard1').values_list('doctor_name', flat = True)), {'renamed'})
+        self.assertEqual(set(PatientFeed.objects.using('default').values_list('doctor_name', flat = True)), {'renamed'})
+
+    def test_success_collect_orphan_images_reads_every_shard(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, 'wound_img'))
+        for name in ('shard1.png', 'orphan.png'):
+            with open(os.path.join(media_root, 'wound_img', name), 'wb') as image:
+                image.write(b'image')
+
+        appointment = Appointment.objects.using('shard1').create(symptom = "아파요", date = self.selected_date, time = time(10), state_id = 1)
+        AppointmentImage.objects.using('shard1').create(appointment = appointment, wound_img = 'wound_img/shard1.png')
+
+        with override_settings(MEDIA_ROOT = media_root):
+            call_command('collect_orphan_images', min_age = 0, delete = True, stdout = StringIO())
+
+        self.assertEqual(os.listdir(os.path.join(media_root, 'wound_img')), ['shard1.png'])
+
+    def test_success_purge_upload_sessions_on_every_shard(self):
+        UploadSession.objects.using('shard1').create(patient_id = self.patients['shard1'].id, filename = 'wound.png', size = 5)
+        UploadSession.objects.using('shard1').update(created_at = datetime.now() - settings.UPLOAD_SESSION_LIFETIME - timedelta(minutes=1))
+
+        out = StringIO()
+        call_command('purge_upload_sessions', stdout = out)
+
+        self.assertEqual(out.getvalue(), 'purged 1 upload sessions\n')
+        self.assertFalse(UploadSession.objects.using('shard1').exists())
 
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json(), 
-            {
-                "result": [
-                    {
-                        "id"         : 1,
-                        "names"       : "doctor",
-                        "departments" : "가정의학과",
-                        "hospitals"   : "퍼즐AI병원",
-                        "profile_imgs": f"{settings.LOCAL_PATH}/doctor_profile_img/doctor_profile.png"
-                    }
-                ]
-            }
+    def book_past(self, alias, days, state_id = 1):
+        # Written straight to the shard, the feed is left for the maintenance commands to build
+        appointment = Appointment.objects.using(alias).create(
+            symptom = "아파요", opinion = "", date = date.today() - timedelta(days = days), time = time(10), state_id = state_id
         )
+        UserAppointment.objects.using(alias).create(appointment = appointment, patient = self.patients[alias], doctor_id = 1)
+        return appointment
+
+    def test_success_close_past_appointments_on_every_shard(self):
+        for alias in self.patients:
+            self.book_past(alias, 2)
+
+        call_command('close_past_appointments', stdout = StringIO())
+
+        for alias in self.patients:
+            self.assertEqual(Appointment.objects.using(alias).get().state_id, State.NO_SHOW)
+            self.assertEqual(PatientFeed.objects.using(alias).get().state_id, State.NO_SHOW)
+
+    def test_success_archive_appointments_on_every_shard(self):
+        for alias in self.patients:
+            self.book_past(alias, 400, state_id = 2)
+
+        call_command('archive_appointments', stdout = StringIO())
+
+        for alias in self.patients:
+            self.assertFalse(Appointment.objects.using(alias).exists())
+            self.assertEqual(ArchivedAppointment.objects.using(alias).get().patient_id, self.patients[alias].id)
+
+    def test_success_rebuild_patient_feed_on_every_shard(self):
+        appointments = {alias : self.book_past(alias, 2) for alias in self.patients}
+
+        call_command('rebuild_patient_feed', stdout = StringIO())
+
+        for alias, appointment in appointments.items():
+            self.assertEqual(
+                list(PatientFeed.objects.using(alias).values_list('appointment_id', 'patient_id')),
+                [(appointment.id, self.patients[alias].id)]
+            )
+
+    def test_fail_check_patient_feed_detects_drift_on_every_shard(self):
+        for alias in self.patients:
+            self.book_past(alias, 2)
+
+        with self.assertRaisesMessage(CommandError, '2 patient feed rows differ'):
+            call_command('check_patient_feed', stdout = StringIO())
+
+        call_command('check_patient_feed', fix = True, stdout = StringIO())
+        call_command('check_patient_feed', stdout = StringIO())
+
+        for alias in self.patients:
+            self.assertTrue(PatientFeed.objects.using(alias).exists())
 
 class WorkingDayTest(TestCase):
     def setUp(self):
@@ -224,6 +1929,8 @@ class WorkingDayTest(TestCase):
 
 class WorkingTimeTest(TestCase):
     def setUp(self):
+        cache.clear()
+
         CustomUser.objects.create_user(
             name      = 'kevin',
             email     = 'kevin@gmail.com',
@@ -450,6 +2157,8 @@ class WorkingTimeTest(TestCase):
 
 class AppointmentListTest(TestCase):
     def setUp(self):
+        cache.clear()
+
         CustomUser.objects.create_user(
             name      = 'john',
             email     = 'john@gmail.com',
@@ -560,6 +2269,7 @@ class AppointmentListTest(TestCase):
                 patient_id     = patient.id
             )
         ])
+        call_command('rebuild_patient_feed', stdout = StringIO())
 
         self.token = jwt.encode({"user_id" : CustomUser.objects.get(is_doctor=False).id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
         
@@ -614,6 +2324,8 @@ class AppointmentListTest(TestCase):
 
 class AppointmentDetailTest(TestCase):
     def setUp(self):
+        cache.clear()
+
         CustomUser.objects.create_user(
             name      = 'john',
             email     = 'john@gmail.com',
@@ -1354,4 +3066,609 @@ class AppointmentChangeTest(TestCase):
         response = client.post(f'/appointments/{appointment_id}/change', form_data, **headers)
 
         self.assertEqual(response.status_code, 400)
-        self.assertEqual(response.json(), {'message' : 'NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6'})
\ No newline at end of file
+        self.assertEqual(response.json(), {'message' : 'NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6'})
+    def change(self, **extra):
+        test_date = datetime.now() + timedelta(days=2)
+        form_data = {
+            'doctor_id' : 1,
+            'year'      : test_date.year,
+            'month'     : test_date.month,
+            'day'       : test_date.day,
+            'time'      : test_date.hour,
+            'symptom'   : "symptom"
+        }
+        form_data.update(extra)
+
+        return Client().post('/appointments/1/change', form_data, HTTP_Authorization = self.token)
+
+    def test_success_appointment_change_image_diff(self):
+        response = self.change(
+            keep_image = [1],
+            image      = [SimpleUploadedFile('testcode_image_new.png', PNG + b'new')]
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(AppointmentImage.objects.filter(appointment_id = 1).count(), 2)
+        self.assertTrue(AppointmentImage.objects.filter(id = 1).exists())
+        self.assertFalse(AppointmentImage.objects.filter(id = 2).exists())
+
+    def test_success_appointment_change_remove_image(self):
+        self.change(remove_image = [2])
+
+        self.assertEqual(list(AppointmentImage.objects.filter(appointment_id = 1).values_list('id', flat = True)), [1])
+
+    def test_success_appointment_change_dedupes_resent_image(self):
+        self.change(image = [SimpleUploadedFile('testcode_image_same.png', PNG + b'same')])
+        image = AppointmentImage.objects.get(appointment_id = 1)
+
+        self.change(image = [
+            SimpleUploadedFile('testcode_image_same.png', PNG + b'same'),
+            SimpleUploadedFile('testcode_image_copy.png', PNG + b'same')
+        ])
+
+        self.assertEqual(list(AppointmentImage.objects.filter(appointment_id = 1)), [image])
+
+    def test_success_appointment_change_without_changes_keeps_row(self):
+        self.change(image = [SimpleUploadedFile('testcode_image_same.png', PNG + b'same')])
+        updated_at = Appointment.objects.get(id = 1).updated_at
+
+        with self.assertNumQueries(7):
+            self.change(image = [SimpleUploadedFile('testcode_image_same.png', PNG + b'same')])
+
+        self.assertEqual(Appointment.objects.get(id = 1).updated_at, updated_at)
+
+    def test_fail_appointment_change_too_many_images_after_diff(self):
+        response = self.change(image = [SimpleUploadedFile(f'testcode_image_{i}.png', PNG + bytes([i])) for i in range(5)], keep_image = [1, 2])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6'})
+        self.assertEqual(AppointmentImage.objects.filter(appointment_id = 1).count(), 2)
+
+class ChunkedUploadTest(TestCase):
+    def setUp(self):
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.create(id = 1, name = "진료대기")
+
+        self.selected_date = date.today() + timedelta(days=3)
+        working_day        = WorkingDay.objects.create(doctor_id = 1, date = self.selected_date)
+        WorkingTime.objects.create(working_day = working_day, time = time(10))
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings   = override_settings(MEDIA_ROOT = self.media_root, UPLOAD_SESSION_ROOT = os.path.join(self.media_root, 'sessions'))
+        self.settings.enable()
+
+        self.headers = {"HTTP_Authorization" : jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        self.image   = PNG + bytes(range(256)) * 40
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+
+    def start(self):
+        response = Client().post('/appointments/uploads', {'filename' : 'wound.png', 'size' : len(self.image)}, content_type = 'application/json', **self.headers)
+        return response.json()['upload_id']
+
+    def send(self, upload_id, offset, chunk):
+        return Client().patch(
+            f'/appointments/uploads/{upload_id}', chunk,
+            content_type = 'application/offset+octet-stream', HTTP_UPLOAD_OFFSET = str(offset), **self.headers
+        )
+
+    def upload(self, chunk_size, interrupt_at = ()):
+        # A chunk listed in interrupt_at loses its second half, as if the connection dropped mid-request
+        upload_id = self.start()
+        offset    = 0
+        attempt   = 0
+
+        while offset < len(self.image):
+            chunk = self.image[offset:offset + chunk_size]
+            if attempt in interrupt_at:
+                chunk = chunk[:len(chunk) // 2]
+            attempt += 1
+
+            response = self.send(upload_id, offset, chunk)
+            offset   = response.json()['offset']
+
+        return upload_id, response
+
+    def create(self, upload_ids):
+        return Client().post('/appointments/create', {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : 10,
+            'symptom'   : "symptom",
+            'upload_id' : upload_ids
+        }, **self.headers)
+
+    def test_success_chunked_upload_and_appointment_creation(self):
+        upload_id, response = self.upload(chunk_size = 4096)
+
+        self.assertTrue(response.json()['completed'])
+        self.assertEqual(self.create([upload_id]).status_code, 201)
+
+        image = AppointmentImage.objects.get()
+        self.assertEqual(image.content_hash, hashlib.sha256(self.image).hexdigest())
+        self.assertEqual(image.wound_img.read(), self.image)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_success_chunked_upload_resumes_after_interruptions(self):
+        upload_id, response = self.upload(chunk_size = 3000, interrupt_at = (0, 2, 3))
+
+        self.assertTrue(response.json()['completed'])
+        self.assertEqual(default_storage.open(UploadSession.objects.get().file_name).read(), self.image)
+
+    def test_success_chunked_upload_keeps_bytes_of_dropped_connection(self):
+        session = UploadSession.objects.get(id = self.start())
+
+        # The body ends early although Content-Length promised more
+        written = append_chunk(session, BytesIO(self.image[:700]), 4096)
+
+        self.assertEqual(written, 700)
+        self.assertEqual(os.path.getsize(session_path(session)), 700)
+
+    def test_fail_chunked_upload_offset_mismatch(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, self.image[:1000])
+
+        response = self.send(upload_id, 0, self.image[:1000])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 1000)
+
+    def test_fail_chunked_upload_offset_advanced_while_streaming(self):
+        upload_id = self.start()
+
+        def finish_elsewhere(session, stream, length):
+            # Another request records its chunk after this one passed the offset check
+            UploadSession.objects.filter(id = session.id).update(offset = 1000)
+            return append_chunk(session, stream, length)
+
+        with mock.patch('appointments.views.append_chunk', side_effect = finish_elsewhere):
+            response = self.send(upload_id, 0, self.image[:500])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 1000)
+        self.assertEqual(UploadSession.objects.get().offset, 1000)
+
+    def test_fail_chunked_upload_unsupported_image_type(self):
+        upload_id = self.start()
+
+        response = self.send(upload_id, 0, b'MZ' + self.image[2:1000])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'UNSUPPORTED_IMAGE_TYPE'})
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_fail_chunked_upload_exceeds_declared_size(self):
+        response = self.send(self.start(), 0, self.image + b'extra')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'UPLOAD_EXCEEDS_DECLARED_SIZE'})
+
+    def test_fail_appointment_creation_with_incomplete_upload(self):
+        upload_id = self.start()
+        self.send(upload_id, 0, self.image[:1000])
+
+        response = self.create([upload_id])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_UPLOAD_ID'})
+
+class PresignedUploadTest(TestCase):
+    def setUp(self):
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        other = CustomUser.objects.create_user(
+            name      = 'other',
+            email     = 'other@gmail.com',
+            password  = 'other1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.create(id = 1, name = "진료대기")
+
+        self.selected_date = date.today() + timedelta(days=3)
+        working_day        = WorkingDay.objects.create(doctor_id = 1, date = self.selected_date)
+        WorkingTime.objects.create(working_day = working_day, time = time(10))
+
+        self.store_root = tempfile.mkdtemp()
+        self.settings   = override_settings(IMAGE_UPLOAD_MODE = 'presigned', OBJECT_STORE_ROOT = self.store_root)
+        self.settings.enable()
+
+        self.patient       = patient
+        self.headers       = {"HTTP_Authorization" : jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        self.other_headers = {"HTTP_Authorization" : jwt.encode({"user_id" : other.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+        self.image         = PNG + bytes(range(256)) * 4
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.store_root)
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+
+    def presign(self, headers = None):
+        return Client().post(
+            '/appointments/uploads/presign', {'filename' : 'wound.PNG', 'content_type' : 'image/png', 'size' : len(self.image)},
+            content_type = 'application/json', **(headers or self.headers)
+        )
+
+    def put(self, url, body, content_type = 'image/png'):
+        return Client().put(url, body, content_type = content_type)
+
+    def create(self, keys):
+        return Client().post('/appointments/create', {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : 10,
+            'symptom'   : "symptom",
+            'image_key' : keys
+        }, **self.headers)
+
+    def test_success_presigned_upload_and_appointment_creation(self):
+        presigned = self.presign().json()
+
+        self.assertEqual(self.put(presigned['url'], self.image).status_code, 200)
+        self.assertEqual(self.create([presigned['key']]).status_code, 201)
+
+        image = AppointmentImage.objects.get()
+        self.assertEqual(image.wound_img.name, presigned['key'])
+        self.assertTrue(presigned['key'].endswith('.png'))
+        with open(os.path.join(self.store_root, presigned['key']), 'rb') as stored:
+            self.assertEqual(stored.read(), self.image)
+
+    def test_fail_presigned_upload_tampered_signature(self):
+        url = self.presign().json()['url']
+
+        self.assertEqual(self.put(url.replace('signature=', 'signature=0'), self.image).status_code, 403)
+        self.assertEqual(self.put(url, self.image, content_type = 'text/html').status_code, 403)
+
+    def test_fail_presigned_upload_expired_url(self):
+        url = self.presign().json()['url']
+
+        with mock.patch('appointments.presigned.time.time', return_value = 2 ** 40):
+            response = self.put(url, self.image)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'message' : 'INVALID_SIGNATURE'})
+
+    def test_fail_appointment_creation_with_key_of_other_patient(self):
+        presigned = self.presign(self.other_headers).json()
+        self.put(presigned['url'], self.image)
+
+        response = self.create([presigned['key']])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_IMAGE_KEY'})
+
+        # Traversing out of the patient's own prefix is not accepted either
+        owner    = presigned['key'].split('/')[1]
+        response = self.create([presigned['key'].replace(f'wound_img/{owner}/', f'wound_img/{self.patient.id}/../{owner}/')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_IMAGE_KEY'})
+
+    def test_fail_appointment_creation_with_key_never_uploaded(self):
+        response = self.create([self.presign().json()['key']])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_IMAGE_KEY'})
+
+    def test_fail_presigned_upload_in_local_mode(self):
+        with override_settings(IMAGE_UPLOAD_MODE = 'local'):
+            response = self.presign()
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'message' : 'PRESIGNED_UPLOADS_DISABLED'})
+
+class UploadLimitTest(TestCase):
+    def setUp(self):
+        self.headers = {"HTTP_Authorization" : jwt.encode({"user_id" : 1}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)}
+
+    def create(self, images):
+        return Client().post('/appointments/create', {
+            'doctor_id' : 1,
+            'year'      : 2022,
+            'month'     : 7,
+            'day'       : 11,
+            'time'      : 10,
+            'symptom'   : "symptom",
+            'image'     : images
+        }, **self.headers)
+
+    def test_fail_upload_unsupported_image_type(self):
+        response = self.create([SimpleUploadedFile('testcode_image.png', b'<?php echo 1; ?>')])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'UNSUPPORTED_IMAGE_TYPE'})
+
+    @override_settings(UPLOAD_MAX_SIZE = 1024)
+    def test_fail_upload_image_too_large(self):
+        response = self.create([SimpleUploadedFile('testcode_image.png', PNG + bytes(2048))])
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json(), {'message' : 'IMAGE_TOO_LARGE'})
+
+    @override_settings(UPLOAD_MAX_REQUEST_SIZE = 1024)
+    def test_fail_upload_request_too_large(self):
+        response = self.create([SimpleUploadedFile('testcode_image.png', PNG + bytes(2048))])
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json(), {'message' : 'REQUEST_TOO_LARGE'})
+
+    def test_fail_upload_too_many_images_stops_at_seventh(self):
+        response = self.create([SimpleUploadedFile(f'testcode_image_{i}.png', PNG + bytes([i])) for i in range(7)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'DO_NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6'})
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings   = override_settings(MEDIA_ROOT = self.media_root)
+        self.settings.enable()
+
+        State.objects.create(id = 1, name = "진료대기")
+        Appointment.objects.create(id = 1, symptom = "아파요", opinion = "", date = date(2022, 7, 11), time = time(10), state_id = 1)
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root)
+        Appointment.objects.all().delete()
+
+    def age(self, name):
+        old = datetime.now().timestamp() - settings.STORAGE_RELEASE_GRACE
+        os.utime(default_storage.path(name), (old, old))
+
+    def test_success_identical_uploads_share_one_file(self):
+        first  = AppointmentImage.objects.create(appointment_id = 1, wound_img = SimpleUploadedFile('first.PNG', b'wound'))
+        second = AppointmentImage.objects.create(appointment_id = 1, wound_img = SimpleUploadedFile('second.png', b'wound'))
+        digest = hashlib.sha256(b'wound').hexdigest()
+
+        self.assertEqual(first.wound_img.name, f'wound_img/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual(second.wound_img.name, first.wound_img.name)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'wound_img', digest[:2], digest[2:4])), [f'{digest}.png'])
+
+    def test_success_release_keeps_referenced_files(self):
+        first  = AppointmentImage.objects.create(appointment_id = 1, wound_img = SimpleUploadedFile('first.png', b'wound'))
+        AppointmentImage.objects.create(appointment_id = 1, wound_img = SimpleUploadedFile('second.png', b'wound'))
+        name   = first.wound_img.name
+
+        self.age(name)
+
+        first.delete()
+        release([name])
+        self.assertTrue(default_storage.exists(name))
+
+        AppointmentImage.objects.all().delete()
+        release([name])
+        self.assertFalse(default_storage.exists(name))
+
+    def test_success_release_keeps_files_of_completed_uploads(self):
+        patient = CustomUser.objects.create_user(name = 'kevin', email = 'kevin@gmail.com', password = 'kevin1123', is_doctor = 'False')
+        image   = AppointmentImage.objects.create(appointment_id = 1, wound_img = SimpleUploadedFile('first.png', b'wound'))
+        name    = image.wound_img.name
+        UploadSession.objects.create(patient = patient, filename = 'second.png', size = 5, offset = 5, file_name = name)
+        self.age(name)
+
+        image.delete()
+        release([name])
+
+        self.assertTrue(default_storage.exists(name))
+
+    def test_success_release_keeps_files_reused_by_uncommitted_rows(self):
+        image = AppointmentImage.objects.create(appointment_id = 1, wound_img = SimpleUploadedFile('first.png', b'wound'))
+        name  = image.wound_img.name
+        self.age(name)
+
+        # Another transaction saves the same bytes, its row is not visible while the first row's file is released
+        self.assertEqual(default_storage.save('wound_img/second.png', SimpleUploadedFile('second.png', b'wound')), name)
+        image.delete()
+        release([name])
+
+        self.assertTrue(default_storage.exists(name))
+
+    def test_success_reused_file_is_rewritten_after_deletion(self):
+        name = default_storage.save('wound_img/first.png', SimpleUploadedFile('first.png', b'wound'))
+
+        with mock.patch.object(default_storage, 'touch', return_value = False):
+            self.assertEqual(default_storage.save('wound_img/second.png', SimpleUploadedFile('second.png', b'wound')), name)
+
+        with open(default_storage.path(name), 'rb') as saved:
+            self.assertEqual(saved.read(), b'wound')
+
+    def test_success_content_addressed_media_is_immutable(self):
+        name = AppointmentImage.objects.create(appointment_id = 1, wound_img = SimpleUploadedFile('first.png', b'wound')).wound_img.name
+
+        response = Client().get(f'/media/{name}')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+class CollectOrphanImagesTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'wound_img', 'ab', 'cd'))
+        for name in ('used.png', 'orphan.png', 'ab/cd/sharded.png'):
+            with open(os.path.join(self.media_root, 'wound_img', name), 'wb') as image:
+                image.write(b'image')
+
+        State.objects.create(id = 1, name = "진료대기")
+        Appointment.objects.create(id = 1, symptom = "아파요", opinion = "", date = date(2022, 7, 11), time = time(10), state_id = 1)
+        AppointmentImage.objects.create(appointment_id = 1, wound_img = "wound_img/used.png")
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+        Appointment.objects.all().delete()
+        CustomUser.objects.all().delete()
+
+    def test_success_collect_orphan_images(self):
+        with override_settings(MEDIA_ROOT = self.media_root):
+            out = StringIO()
+            call_command('collect_orphan_images', min_age = 0, stdout = out)
+            self.assertIn('wound_img/orphan.png', out.getvalue())
+            self.assertIn('wound_img/ab/cd/sharded.png', out.getvalue())
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, 'wound_img', 'orphan.png')))
+
+            call_command('collect_orphan_images', min_age = 0, delete = True, stdout = StringIO())
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.media_root, 'wound_img'))), ['ab', 'used.png'])
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'wound_img', 'ab', 'cd')), [])
+
+    def test_success_collect_keeps_unattached_uploads(self):
+        patient = CustomUser.objects.create_user(name = 'kevin', email = 'kevin@gmail.com', password = 'kevin1123', is_doctor = 'False')
+        UploadSession.objects.create(patient = patient, filename = 'orphan.png', size = 5, offset = 5, file_name = 'wound_img/orphan.png')
+        os.makedirs(os.path.join(self.media_root, 'wound_img', str(patient.id)))
+        presigned = f'{patient.id}/{"0" * 32}.png'
+        with open(os.path.join(self.media_root, 'wound_img', presigned), 'wb') as image:
+            image.write(b'image')
+
+        with override_settings(MEDIA_ROOT = self.media_root):
+            call_command('collect_orphan_images', min_age = 0, delete = True, stdout = StringIO())
+
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'wound_img', 'orphan.png')))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, 'wound_img', presigned)))
+
+class ProjectionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        patient = CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'kevin1123',
+            is_doctor = 'False'
+        )
+
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = 'True'
+        )
+
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        State.objects.bulk_create([State(id = 1, name = "진료대기"), State(id = 2, name = "진료취소")])
+
+        self.selected_date = date.today() + timedelta(days=3)
+        working_day        = WorkingDay.objects.create(doctor_id = 1, date = self.selected_date)
+        WorkingTime.objects.bulk_create([WorkingTime(working_day = working_day, time = time(hour)) for hour in (10, 11)])
+
+        self.token        = jwt.encode({"user_id" : patient.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+        self.doctor_token = jwt.encode({"user_id" : doc.id}, settings.SECRET_KEY, algorithm = settings.ALGORITHM)
+
+        with self.captureOnCommitCallbacks(execute = True):
+            Client().post('/appointments/create', self.appointment(10), HTTP_Authorization = self.token)
+        self.appointment_id = Appointment.objects.get().id
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+        Appointment.objects.all().delete()
+        WorkingDay.objects.all().delete()
+        PatientFeed.objects.all().delete()
+
+    def appointment(self, hour):
+        return {
+            'doctor_id' : 1,
+            'year'      : self.selected_date.year,
+            'month'     : self.selected_date.month,
+            'day'       : self.selected_date.day,
+            'time'      : hour,
+            'symptom'   : "아파요" * 1000
+        }
+
+    def fetched(self, table, request):
+        with CaptureQueriesContext(connections['default']) as queries, self.captureOnCommitCallbacks(execute = True):
+            response = request()
+
+        self.assertLess(response.status_code, 300)
+        return fetched_columns(queries.captured_queries, table)
+
+    def test_success_list_reads_only_feed_columns(self):
+        columns = self.fetched('patient_feeds', lambda: Client().get('/appointments/list', HTTP_Authorization = self.token))
+
+        # updated_at only feeds the ETag's MAX()
+        self.assertEqual(columns, {
+            'id', 'appointment_id', 'date', 'time', 'state_name', 'updated_at',
+            'doctor_id', 'doctor_name', 'doctor_hospital', 'doctor_department', 'doctor_profile_img'
+        })
+
+    def test_success_working_time_reads_no_appointment_text(self):
+        day     = self.selected_date
+        columns = self.fetched('appointments', lambda: Client().get(
+            f'/appointments/doctor/1/workingtime?year={day.year}&month={day.month}&day={day.day}', HTTP_Authorization = self.token
+        ))
+
+        self.assertEqual(columns, {'time', 'duration'})
+
+    def test_success_cancellation_reads_schedule_fields(self):
+        columns = self.fetched('appointments', lambda: Client().patch(
+            f'/appointments/{self.appointment_id}/cancellation', HTTP_Authorization = self.token
+        ))
+
+        self.assertEqual(columns, {'id', 'state_id', 'date', 'time', 'duration'})
+
+    def test_success_change_skips_opinion(self):
+        columns = self.fetched('appointments', lambda: Client().post(
+            f'/appointments/{self.appointment_id}/change', self.appointment(11), HTTP_Authorization = self.token
+        ))
+
+        self.assertIn('symptom', columns)
+        self.assertNotIn('opinion', columns)
+
+    def test_success_agenda_skips_opinion(self):
+        columns = self.fetched('appointments', lambda: Client().get(
+            f'/appointments/doctor/agenda?date={self.selected_date}', HTTP_Authorization = self.doctor_token
+        ))
+
+        self.assertIn('symptom', columns)
+        self.assertNotIn('opinion', columns)
@@ -0,0 +1,157 @@
+import os
+import uuid
+
+from contextlib import contextmanager
+
+from django.conf                     import settings
+from django.http                     import JsonResponse
+from django.forms                    import ValidationError
+from django.core.files               import File, locks
+from django.core.files.storage       import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+from appointments.images import MAX_IMAGES, content_hash
+from appointments.models import AppointmentImage, UploadSession
+
+def session_path(session):
+    return os.path.join(settings.UPLOAD_SESSION_ROOT, f'{session.id}.part')
+
+@contextmanager
+def part_lock(session):
+    # flock belongs to the open file, so requests for the same session queue here instead of on a database row
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    with open(session_path(session), 'ab') as part:
+        locks.lock(part, locks.LOCK_EX)
+        try:
+            yield
+        finally:
+            locks.unlock(part)
+
+def append_chunk(session, stream, length):
+    # Copy the body in UPLOAD_CHUNK_SIZE pieces so memory stays bounded however large the chunk is
+    os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+    written = 0
+
+    with open(session_path(session), 'ab') as part:
+        # Drop bytes from an earlier request that died before its offset was recorded
+        part.truncate(session.offset)
+        while written < length:
+            data = stream.read(min(settings.UPLOAD_CHUNK_SIZE, length - written))
+            if not data:
+                break
+            part.write(data)
+            written += len(data)
+
+    return written
+
+def session_head(session):
+    with open(session_path(session), 'rb') as part:
+        return part.read(16)
+
+def discard(session):
+    if os.path.exists(session_path(session)):
+        os.remove(session_path(session))
+    session.delete()
+
+def finalize(session):
+    path = session_path(session)
+    with open(path, 'rb') as part:
+        upload               = File(part, name=session.filename)
+        session.content_hash = content_hash(upload)
+        session.file_name    = default_storage.save(
+            AppointmentImage._meta.get_field('wound_img').generate_filename(None, session.filename), upload
+        )
+    os.remove(path)
+
+def completed_uploads(patient_id, upload_ids):
+    try:
+        upload_ids = {uuid.UUID(upload_id) for upload_id in upload_ids}
+    except ValueError:
+        raise ValidationError('INVALID_UPLOAD_ID')
+
+    sessions = list(UploadSession.objects.filter(id__in=upload_ids, patient_id=patient_id).exclude(file_name=''))
+    if len(sessions) != len(upload_ids):
+        raise ValidationError('INVALID_UPLOAD_ID')
+
+    return sessions
+
+def sniff_image_type(head):
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'heic', b'heix', b'mif1', b'msf1'):
+        return 'image/heic'
+    return None
+
+class LimitedUploadHandler(FileUploadHandler):
+    """
+    Sits in front of Django's memory/temporary-file handlers and stops reading the
+    request body as soon as it breaks a limit, instead of spooling everything first.
+    """
+    errors = {
+        'TOO_MANY_IMAGES'       : 400,
+        'UNSUPPORTED_IMAGE_TYPE': 400,
+        'IMAGE_TOO_LARGE'       : 413,
+        'REQUEST_TOO_LARGE'     : 413
+    }
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.files = 0
+        self.total = 0
+
+    def reject(self, error):
+        self.error = error
+        raise StopUpload(connection_reset=True)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > settings.UPLOAD_MAX_REQUEST_SIZE:
+            self.error = 'REQUEST_TOO_LARGE'
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.files    += 1
+        self.received  = 0
+
+        if self.error:
+            self.reject(self.error)
+        if self.files > MAX_IMAGES:
+            self.reject('TOO_MANY_IMAGES')
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and not sniff_image_type(raw_data[:16]):
+            self.reject('UNSUPPORTED_IMAGE_TYPE')
+
+        self.received += len(raw_data)
+        self.total    += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_SIZE:
+            self.reject('IMAGE_TOO_LARGE')
+        if self.total > settings.UPLOAD_MAX_REQUEST_SIZE:
+            self.reject('REQUEST_TOO_LARGE')
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+def limit_uploads(too_many_message):
+    def decorator(func):
+        def wrapper(self, request, *args, **kwargs):
+            handler = LimitedUploadHandler(request)
+            request.upload_handlers.insert(0, handler)
+
+            # Parse the body here so a violation is answered before the view does any work
+            request.FILES
+            if handler.error:
+                message = too_many_message if handler.error == 'TOO_MANY_IMAGES' else handler.error
+                return JsonResponse({'message' : message}, status=handler.errors[handler.error])
+
+            return func(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
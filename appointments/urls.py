@@ -1,15 +1,24 @@
 from django.urls import path
 
-from appointments.views import DepartmentsListView, DoctorListView, WorkingDayView, WorkingTimeView, CancellationView, AppointmentChangeView, AppointmentCreationView, AppointmentListView, AppointmentDetailView
+from appointments.views import DepartmentsListView, DoctorListView, DoctorSearchView, EarliestSlotView, WorkingTemplateView, DoctorAgendaView, WorkingDayView, WorkingTimeView, CancellationView, OpinionView, AppointmentChangeView, AppointmentCreationView, UploadSessionView, UploadChunkView, PresignedUploadView, ObjectStoreView, AppointmentListView, AppointmentDetailView
 
 urlpatterns = [
     path('/departments', DepartmentsListView.as_view()),
     path('/departments/<int:department_id>', DoctorListView.as_view()),
+    path('/departments/<int:department_id>/earliest', EarliestSlotView.as_view()),
+    path('/doctor/search', DoctorSearchView.as_view()),
+    path('/doctor/schedule', WorkingTemplateView.as_view()),
+    path('/doctor/agenda', DoctorAgendaView.as_view()),
     path('/doctor/<int:doctor_id>/workingday', WorkingDayView.as_view()),
     path('/doctor/<int:doctor_id>/workingtime', WorkingTimeView.as_view()),
     path('/list', AppointmentListView.as_view()),
     path('/<int:appointment_id>', AppointmentDetailView.as_view()),
     path('/<int:appointment_id>/cancellation', CancellationView.as_view()),
+    path('/<int:appointment_id>/opinion', OpinionView.as_view()),
     path('/<int:appointment_id>/change', AppointmentChangeView.as_view()),
-    path('/create', AppointmentCreationView.as_view())
+    path('/create', AppointmentCreationView.as_view()),
+    path('/uploads', UploadSessionView.as_view()),
+    path('/uploads/presign', PresignedUploadView.as_view()),
+    path('/uploads/<uuid:upload_id>', UploadChunkView.as_view()),
+    path('/object-store/<path:key>', ObjectStoreView.as_view())
 ]
\ No newline at end of file
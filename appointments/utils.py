@@ -0,0 +1,25 @@
+from django.forms import ValidationError
+
+from users.slots             import slot_bits, mask_from_intervals
+from users.schedules         import slot_minutes_for
+from appointments.models     import Appointment
+from appointments.repository import collect
+
+class SlotValidation:
+    def validate_slot(self, doctor_id, selected_date, selected_time, exclude_appointment_id=None):
+        minutes = slot_minutes_for(doctor_id)
+
+        if (selected_time.hour * 60 + selected_time.minute) % minutes or selected_time.second:
+            raise ValidationError('INVALID_APPOINTMENT_TIME')
+
+        def booked():
+            # The doctor's bookings are spread over every patient's shard
+            appointments = Appointment.objects.filter(userappointment__doctor_id=doctor_id, date=selected_date, state_id=1)
+            if exclude_appointment_id:
+                appointments = appointments.exclude(id=exclude_appointment_id)
+            return appointments.values_list('time', 'duration')
+
+        if mask_from_intervals(collect(booked)) & slot_bits(selected_time, minutes):
+            raise ValidationError('ALREADY_BOOKED_TIME')
+
+        return minutes
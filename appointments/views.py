@@ -1,16 +1,33 @@
+import os
+
 from datetime import datetime, date, time, timedelta
 
 from django.http                import JsonResponse
 from django.db                  import transaction
 from django.views               import View
 from django.conf                import settings
+from django.forms               import ValidationError
 from django.core.paginator      import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models           import CharField, Value as V, Q, F
+from django.db.models           import CharField, Value as V, F, Exists, OuterRef, Prefetch
 from django.db.models.functions import Concat
 
-from users.utils         import login_decorator, DateTimeFormat
-from users.models        import Department, Doctor, WorkingDay, WorkingTime
-from appointments.models import Appointment, AppointmentImage, UserAppointment
+from voidoc.routers          import read_replica
+from users.utils             import login_decorator, conditional_get, DateTimeFormat, RequestSchema, Field, parse_request
+from users.models            import Department, Doctor, WorkingDay, WorkingTemplate
+from users.slots             import slot_bits, times_from_mask, mask_from_intervals, overlapping_times, parse_slot_time
+from users.schedules         import expand_template, publish_schedule, slot_minutes_for, working_mask, department_working_masks
+from appointments.utils      import SlotValidation
+from appointments.models     import Appointment, AppointmentImage, State, UserAppointment, ArchivedAppointment, PatientFeed, UploadSession
+from appointments.feed       import sync_feed, feed_version
+from appointments.images     import update_images
+from appointments.uploads    import append_chunk, part_lock, finalize, discard, completed_uploads, limit_uploads, session_head, sniff_image_type
+from appointments.search     import doctor_index
+from appointments.cache      import (
+    DOCTOR_VERSION_KEY, DIRECTORY_VERSION_KEY,
+    cached_response, compute_once, current_version, invalidate_patients, invalidate_availability
+)
+from appointments.presigned  import IMAGE_CONTENT_TYPES, FilesystemObjectStore, object_store, uses_presigned_uploads, new_key, uploaded_keys
+from appointments.repository import patient_shard, shard_for, using_shard, atomic, collect, find_shard
 
 class DepartmentsListView(View):
     @login_decorator
@@ -22,10 +39,8 @@ class DepartmentsListView(View):
         return JsonResponse({"result" : list(departments_list)}, status = 200)
 
 class DoctorListView(View):
-    @login_decorator
-    def get(self, request, department_id):
+    def doctor_page(self, department_id, page):
         try: 
-            page    = request.GET.get('page', 1)
             doctors = Doctor.objects.filter(department_id=department_id).annotate(
                 doctor_id          = F('id'),
                 doctor_name        = F('user__name'),
@@ -36,16 +51,214 @@ class DoctorListView(View):
 
             doctors_paginator = Paginator(doctors, 6).page(page).object_list
 
-            return JsonResponse({"result" : list(doctors_paginator)}, status=200)
+            return {"result" : list(doctors_paginator)}
 
         except PageNotAnInteger:
-            return JsonResponse({'message' : 'PAGE_HAS_TO_BE_AN_INTEGER'})
+            return {'message' : 'PAGE_HAS_TO_BE_AN_INTEGER'}
 
         except EmptyPage:
-            return JsonResponse({'message' : 'THE_GIVEN_PAGE_CONTAINS_NOTHING'})
+            return {'message' : 'THE_GIVEN_PAGE_CONTAINS_NOTHING'}
+
+    @login_decorator
+    @read_replica
+    def get(self, request, department_id):
+        page = request.GET.get('page', '1')
+        key  = f'doctor_directory:{current_version(DIRECTORY_VERSION_KEY)}:{department_id}:{page}'
+
+        return JsonResponse(compute_once(key, lambda: self.doctor_page(department_id, page), settings.DIRECTORY_CACHE_TIMEOUT), status=200)
+
+class DoctorSearchView(View):
+    PAGE_SIZE  = 6
+    MAX_LIMIT  = 30
+    CHUNK_SIZE = 200
+
+    @login_decorator
+    def get(self, request):
+        try:
+            query         = request.GET.get('q', '')
+            department_id = request.GET.get('department_id')
+            department_id = int(department_id) if department_id else None
+            available     = request.GET.get('available') == 'true'
+            cursor        = int(request.GET.get('cursor', 0))
+            limit         = min(int(request.GET.get('limit', self.PAGE_SIZE)), self.MAX_LIMIT)
+        except ValueError:
+            return JsonResponse({'message' : 'INVALID_QUERY_PARAMETER'}, status=400)
+
+        doctors = Doctor.objects.annotate(
+            doctor_id          = F('id'),
+            doctor_name        = F('user__name'),
+            doctor_department  = F('department__name'),
+            doctor_hospital    = F('hospital__name'),
+            doctor_profile_img = Concat(V(f'{settings.LOCAL_PATH}/doctor_profile_img/'), 'profile_img', output_field=CharField())
+        ).values('doctor_id', 'doctor_name', 'doctor_department', 'doctor_hospital', 'doctor_profile_img').order_by('id')
+
+        if available:
+            # Same-day appointments are not allowed, so "this week" starts tomorrow
+            today   = date.today()
+            doctors = doctors.filter(Exists(WorkingDay.objects.filter(
+                doctor_id   = OuterRef('id'),
+                date__range = (today + timedelta(days=1), today + timedelta(days=7))
+            )))
+
+        if query.strip():
+            result        = []
+            candidate_ids = doctor_index.search(query, department_id, cursor)
+
+            for i in range(0, len(candidate_ids), self.CHUNK_SIZE):
+                result += doctors.filter(id__in=candidate_ids[i:i + self.CHUNK_SIZE])[:limit + 1 - len(result)]
+                if len(result) > limit:
+                    break
+        else:
+            if department_id:
+                doctors = doctors.filter(department_id=department_id)
+            result = list(doctors.filter(id__gt=cursor)[:limit + 1])
+
+        next_cursor = result[limit - 1]['doctor_id'] if len(result) > limit else None
+
+        return JsonResponse({'result' : result[:limit], 'next_cursor' : next_cursor}, status=200)
+
+class EarliestSlotView(View):
+    MAX_COUNT = 50
+    MAX_DAYS  = 60
+
+    @login_decorator
+    def get(self, request, department_id):
+        try:
+            count = min(int(request.GET.get('count', 5)), self.MAX_COUNT)
+            days  = min(int(request.GET.get('days', 14)), self.MAX_DAYS)
+        except ValueError:
+            return JsonResponse({'message' : 'INVALID_QUERY_PARAMETER'}, status=400)
+
+        # Walk forward one day at a time so the common case (a free slot tomorrow) costs two small queries
+        slot_list = []
+        for offset in range(1, days + 1):
+            selected_date = date.today() + timedelta(days=offset)
+            working_masks = department_working_masks(department_id, selected_date)
+
+            booked = {}
+            for doctor_id, booked_time, duration in collect(lambda: UserAppointment.objects.filter(
+                doctor__department_id = department_id,
+                appointment__date     = selected_date,
+                appointment__state_id = 1
+            ).values_list('doctor_id', 'appointment__time', 'appointment__duration')):
+                booked[doctor_id] = booked.get(doctor_id, 0) | slot_bits(booked_time, duration)
+
+            free_slots = sorted(
+                (working_time, doctor_id, doctor_name, doctor_hospital)
+                for doctor_id, doctor_name, doctor_hospital, minutes, mask in working_masks
+                for working_time in times_from_mask(mask & ~booked.get(doctor_id, 0), minutes)
+            )
+
+            slot_list += [{
+                "doctor_id"      : doctor_id,
+                "doctor_name"    : doctor_name,
+                "doctor_hospital": doctor_hospital,
+                "date"           : selected_date.strftime("%Y-%m-%d"),
+                "time"           : working_time.strftime("%H:%M")
+            } for working_time, doctor_id, doctor_name, doctor_hospital in free_slots[:count - len(slot_list)]]
+
+            if len(slot_list) == count:
+                break
+
+        return JsonResponse({'result' : slot_list}, status=200)
+
+WORKING_TEMPLATE_SCHEMA = RequestSchema(
+    weekdays    = Field(list),
+    start_time  = Field(str),
+    end_time    = Field(str),
+    break_start = Field(str, required=False),
+    break_end   = Field(str, required=False),
+    start_date  = Field(str),
+    end_date    = Field(str)
+)
+
+class WorkingTemplateView(View):
+    MAX_DAYS = 366
+
+    @login_decorator
+    @parse_request(WORKING_TEMPLATE_SCHEMA)
+    def post(self, request):
+        try:
+            doctor     = Doctor.objects.get(user_id=request.user.id)
+            start_date = date.fromisoformat(request.data['start_date'])
+            end_date   = date.fromisoformat(request.data['end_date'])
+            weekdays   = set(map(int, request.data['weekdays']))
+
+            # Checked as numbers, joined digits would let 10 through as Monday and Tuesday
+            if not weekdays <= set(range(7)):
+                raise ValueError
+
+            template   = WorkingTemplate(
+                doctor      = doctor,
+                weekdays    = ''.join(str(weekday) for weekday in sorted(weekdays)),
+                start_time  = time.fromisoformat(request.data['start_time']),
+                end_time    = time.fromisoformat(request.data['end_time']),
+                break_start = time.fromisoformat(request.data['break_start']) if request.data['break_start'] else None,
+                break_end   = time.fromisoformat(request.data['break_end']) if request.data['break_end'] else None
+            )
+
+            if template.start_time >= template.end_time:
+                raise ValueError
+
+            if end_date < start_date or (end_date - start_date).days >= self.MAX_DAYS:
+                return JsonResponse({'message' : 'INVALID_DATE_RANGE'}, status=400)
+
+            with transaction.atomic():
+                template.save()
+                slots = publish_schedule(expand_template(template, start_date, end_date))
+                invalidate_availability([doctor.id])
+
+            return JsonResponse({'message' : 'SCHEDULE_PUBLISHED', 'template_id' : template.id, 'slots' : slots}, status=201)
+        except Doctor.DoesNotExist:
+            return JsonResponse({'message' : 'ONLY_DOCTORS_CAN_PUBLISH_SCHEDULES'}, status=403)
+        except (TypeError, ValueError):
+            return JsonResponse({'message' : 'INVALID_SCHEDULE'}, status=400)
+
+class DoctorAgendaView(View, DateTimeFormat):
+    MAX_DAYS = 7
+
+    @login_decorator
+    def get(self, request):
+        try:
+            doctor     = Doctor.objects.only('id').get(user_id=request.user.id)
+            start_date = date.fromisoformat(request.GET.get('date', date.today().isoformat()))
+            days       = int(request.GET.get('days', 1))
+
+            if not 1 <= days <= self.MAX_DAYS:
+                raise ValueError
+        except Doctor.DoesNotExist:
+            return JsonResponse({'message' : 'ONLY_DOCTORS_CAN_VIEW_AGENDA'}, status=403)
+        except ValueError:
+            return JsonResponse({'message' : 'INVALID_QUERY_PARAMETER'}, status=400)
+
+        # Pages are date ranges, so one page is always three queries per shard however busy the doctor is
+        end_date          = start_date + timedelta(days=days - 1)
+        user_appointments = sorted(collect(lambda: UserAppointment.objects.filter(
+            doctor_id                = doctor.id,
+            appointment__date__range = (start_date, end_date)
+        ).select_related('patient', 'appointment', 'appointment__state').defer('appointment__opinion').prefetch_related(
+            Prefetch('appointment__appointmentimage_set', queryset=AppointmentImage.objects.order_by('id'), to_attr='images')
+        )), key=lambda user_appointment: (user_appointment.appointment.date, user_appointment.appointment.time, user_appointment.appointment_id))
+
+        agenda = [{
+            "appointment_id"  : user_appointment.appointment_id,
+            "appointment_date": self.format_date_time(user_appointment.appointment.date, user_appointment.appointment.time),
+            "duration"        : user_appointment.appointment.duration,
+            "patient_id"      : user_appointment.patient_id,
+            "patient_name"    : user_appointment.patient.name,
+            "patient_symptom" : user_appointment.appointment.symptom,
+            "state_name"      : user_appointment.appointment.state.name,
+            "wound_img"       : [f'{settings.LOCAL_PATH}/{image.wound_img}' for image in user_appointment.appointment.images]
+        } for user_appointment in user_appointments]
+
+        return JsonResponse({
+            'result'    : agenda,
+            'next_date' : (end_date + timedelta(days=1)).isoformat()
+        }, status=200)
 
 class WorkingDayView(View):
     @login_decorator
+    @read_replica
     def get(self, request, doctor_id):
         year        = int(request.GET.get('year'))
         month       = int(request.GET.get('month'))
@@ -55,6 +268,7 @@ class WorkingDayView(View):
 
 class WorkingTimeView(View):
     @login_decorator
+    @read_replica
     def get(self, request, doctor_id):
         year          = int(request.GET.get('year'))
         month         = int(request.GET.get('month'))
@@ -68,38 +282,129 @@ class WorkingTimeView(View):
         elif selected_date == current:
             return JsonResponse({'message' : 'NOT_AVAILABLE_ON_THE_DAY_OF_MAKING_AN_APPOINTMENT'}, status=400)
 
-        q = Q()
-        q.add(Q(userappointment__doctor_id = doctor_id), q.AND)
-        q.add(Q(date = selected_date), q.AND)
-        q.add(Q(state_id = 1) | Q(state_id = 2), q.AND)
+        key = f'working_time:{current_version(DOCTOR_VERSION_KEY.format(doctor_id))}:{doctor_id}:{selected_date.date()}'
+
+        try:
+            time_table = compute_once(key, lambda: self.time_table(doctor_id, selected_date), settings.AVAILABILITY_CACHE_TIMEOUT)
+        except Doctor.DoesNotExist:
+            return JsonResponse({'message' : 'DOCTOR_DOES_NOT_EXIST'}, status=404)
+
+        # Free-only is derived from the shared cached table rather than cached on its own
+        if request.GET.get('free') in ('1', 'true'):
+            booked = set(time_table['appointmented_time'])
+            return JsonResponse({'free_time' : [slot for slot in time_table['working_time'] if slot not in booked]}, status=200)
+
+        return JsonResponse(time_table, status=200)
+
+    def time_table(self, doctor_id, selected_date):
+        # Only booked appointments hold a slot, cancelled and closed ones free it again
+        minutes                 = slot_minutes_for(doctor_id)
+        working                 = working_mask(doctor_id, selected_date.date())
+        booked                  = mask_from_intervals(collect(lambda: UserAppointment.objects.filter(
+            doctor_id             = doctor_id,
+            appointment__date     = selected_date,
+            appointment__state_id = State.BOOKED
+        ).values_list('appointment__time', 'appointment__duration')))
+        appointmented_time_list = [booked_time.strftime("%H:%M") for booked_time in overlapping_times(working, booked, minutes)]
+        working_time_list       = [working_time.strftime("%H:%M") for working_time in times_from_mask(working, minutes)]
+
+        return {'working_time' : working_time_list, 'appointmented_time' : appointmented_time_list}
+
+OPINION_SCHEMA = RequestSchema(
+    opinion    = Field(str),
+    updated_at = Field(str)
+)
+
+class OpinionView(View):
+    def owner_shard(self, request, appointment_id):
+        # Doctors see every patient's shard, so the appointment is looked up on all of them at once
+        return find_shard(lambda: UserAppointment.objects.filter(appointment_id=appointment_id, doctor__user_id=request.user.id).exists())
+
+    @login_decorator
+    def get(self, request, appointment_id):
+        appointment = next(iter(collect(lambda: Appointment.objects.filter(
+            id = appointment_id, userappointment__doctor__user_id = request.user.id
+        ).values('opinion', 'updated_at')[:1])), None)
+
+        if appointment is None:
+            return JsonResponse({'message' : 'APPOINTMENT_DOES_NOT_EXIST'}, status=404)
+
+        return JsonResponse({'opinion' : appointment['opinion'], 'updated_at' : appointment['updated_at'].isoformat()}, status=200)
+
+    @login_decorator
+    @parse_request(OPINION_SCHEMA)
+    def patch(self, request, appointment_id):
+        try:
+            expected = datetime.fromisoformat(request.data['updated_at'])
+        except ValueError:
+            return JsonResponse({'message' : 'INVALID_UPDATED_AT'}, status=400)
+
+        alias = self.owner_shard(request, appointment_id)
+        if alias is None:
+            return JsonResponse({'message' : 'APPOINTMENT_DOES_NOT_EXIST'}, status=404)
+
+        with using_shard(alias):
+            # A conditional single-row UPDATE instead of a row lock, so autosaves never wait on each other
+            updated_at = datetime.now()
+            updated    = Appointment.objects.filter(id=appointment_id, updated_at=expected).update(
+                opinion    = request.data['opinion'],
+                updated_at = updated_at
+            )
+
+            if not updated:
+                current = Appointment.objects.filter(id=appointment_id).values('opinion', 'updated_at').first()
+                if current is None:
+                    return JsonResponse({'message' : 'APPOINTMENT_DOES_NOT_EXIST'}, status=404)
 
-        appointments            = Appointment.objects.filter(q)
-        working_times           = WorkingTime.objects.filter(working_day__doctor_id = doctor_id, working_day__date = selected_date.date())
-        appointmented_time_list = [appointment.time.strftime("%H:%M") for appointment in appointments]
-        working_time_list       = [working_time.time.strftime("%H:%M") for working_time in working_times]
+                return JsonResponse({
+                    'message'    : 'OPINION_WAS_CHANGED_BY_ANOTHER_REQUEST',
+                    'opinion'    : current['opinion'],
+                    'updated_at' : current['updated_at'].isoformat()
+                }, status=409)
 
-        return JsonResponse({'working_time' : working_time_list, 'appointmented_time' : appointmented_time_list}, status=200)
+            invalidate_patients(UserAppointment.objects.filter(appointment_id=appointment_id).values_list('patient_id', flat=True))
+        return JsonResponse({'message' : 'OPINION_SAVED', 'updated_at' : updated_at.isoformat()}, status=200)
+
+def appointment_list_version(request):
+    return request.user.id, request.GET.get('page', '1'), *feed_version(request.user.id)
+
+def appointment_list_key(request):
+    return request.GET.get('page', '1')
+
+def appointment_detail_key(request, appointment_id):
+    return appointment_id
+
+def appointment_detail_version(request, appointment_id):
+    for model in (Appointment, ArchivedAppointment):
+        updated_at = model.objects.filter(id=appointment_id).values_list('updated_at', flat=True).first()
+        if updated_at:
+            return appointment_id, updated_at
 
 class AppointmentListView(View, DateTimeFormat):
     @login_decorator
+    @patient_shard
+    @read_replica
+    @cached_response('appointment_list', appointment_list_key)
+    @conditional_get(appointment_list_version)
     def get(self, request):
         try: 
-            page    = request.GET.get('page', 1)
-            appointments = Appointment.objects.select_related('state').prefetch_related('userappointment_set', 'userappointment_set__doctor', 'userappointment_set__doctor__user', 'userappointment_set__doctor__department', 'userappointment_set__doctor__hospital')\
-                .filter(userappointment__patient_id = request.user.id).order_by('state_id', 'date', 'time')
+            page         = request.GET.get('page', 1)
+            appointments = PatientFeed.objects.filter(patient_id=request.user.id).only(
+                'appointment_id', 'date', 'time', 'state_name', 'doctor', 'doctor_name', 'doctor_hospital', 'doctor_department', 'doctor_profile_img'
+            ).order_by('state_id', 'date', 'time', 'appointment_id')
+            appointments = Paginator(appointments, 4).page(page).object_list
             appointment_list = [{
-                "appointment_id"    : appointment.id,
+                "appointment_id"    : appointment.appointment_id,
                 "appointment_date"  : self.format_date_time(appointment.date, appointment.time),
-                "state_name"        : appointment.state.name,
-                "doctor_id"         : appointment.userappointment_set.first().doctor.id,
-                "doctor_name"       : appointment.userappointment_set.first().doctor.user.name,
-                "doctor_hospital"   : appointment.userappointment_set.first().doctor.hospital.name,
-                "doctor_department" : appointment.userappointment_set.first().doctor.department.name,
-                "doctor_profile_img": f'{settings.LOCAL_PATH}/doctor_profile_img/{appointment.userappointment_set.first().doctor.profile_img}'
+                "state_name"        : appointment.state_name,
+                "doctor_id"         : appointment.doctor_id,
+                "doctor_name"       : appointment.doctor_name,
+                "doctor_hospital"   : appointment.doctor_hospital,
+                "doctor_department" : appointment.doctor_department,
+                "doctor_profile_img": f'{settings.LOCAL_PATH}/doctor_profile_img/{appointment.doctor_profile_img}'
             } for appointment in appointments]
 
-            appointments_paginator = Paginator(appointment_list, 4).page(page).object_list
-            return JsonResponse({'result' : appointments_paginator}, status=200)
+            return JsonResponse({'result' : appointment_list}, status=200)
 
         except PageNotAnInteger:
             return JsonResponse({'message' : 'PAGE_HAS_TO_BE_AN_INTEGER'})
@@ -107,34 +412,64 @@ class AppointmentListView(View, DateTimeFormat):
         except EmptyPage:
             return JsonResponse({'message' : 'THE_GIVEN_PAGE_CONTAINS_NOTHING'})
 
+def appointment_shard(func):
+    def wrapper(self, request, appointment_id, *args, **kwargs):
+        alias = shard_for(request.user.id)
+        if request.user.is_doctor:
+            # A doctor's appointments sit on their patients' shards, live or already archived
+            alias = find_shard(lambda: (
+                Appointment.objects.filter(id=appointment_id, userappointment__doctor__user_id=request.user.id).exists()
+                or ArchivedAppointment.objects.filter(id=appointment_id, archiveduserappointment__doctor__user_id=request.user.id).exists()
+            )) or alias
+
+        with using_shard(alias):
+            return func(self, request, appointment_id, *args, **kwargs)
+    return wrapper
+
 class AppointmentDetailView(View, DateTimeFormat):
     @login_decorator
+    @appointment_shard
+    @cached_response('appointment_detail', appointment_detail_key)
+    @conditional_get(appointment_detail_version)
     def get(self, request, appointment_id):
         try:
-            appointment = Appointment.objects.get(id=appointment_id)
+            try:
+                appointment = Appointment.objects.get(id=appointment_id)
+                images      = appointment.appointmentimage_set.all()
+            except Appointment.DoesNotExist:
+                appointment = ArchivedAppointment.objects.get(id=appointment_id)
+                images      = appointment.archivedappointmentimage_set.all()
+
             appointment_detail = {    
-                "Wound_img"         : [f'{settings.LOCAL_PATH}/{image.wound_img}' for image in appointment.appointmentimage_set.all()],  
+                "Wound_img"         : [f'{settings.LOCAL_PATH}/{image.wound_img}' for image in images],  
                 "patient_symptom"   : appointment.symptom,
                 "doctor_opinion"    : appointment.opinion,
                 "appointment_date"  : self.format_date_time(appointment.date, appointment.time)
             }
 
             return JsonResponse({'result' : appointment_detail}, status=200)
-        except Appointment.DoesNotExist:
+        except ArchivedAppointment.DoesNotExist:
             return JsonResponse({'message' : 'APPOINTMENT_DOES_NOT_EXIST'}, status=404)
 
 class CancellationView(View):
     @login_decorator
+    @patient_shard
     def patch(self, request, appointment_id):
         try:
-            appointment = Appointment.objects.get(id=appointment_id, userappointment__patient_id=request.user.id)
+            appointment = Appointment.objects.filter(
+                id = appointment_id, userappointment__patient_id = request.user.id
+            ).only(*Appointment.SCHEDULE_FIELDS).annotate(booked_doctor_id=F('userappointment__doctor_id')).get()
             appointment_datetime = datetime.combine(appointment.date, appointment.time)
 
             if appointment_datetime - datetime.now() < timedelta(seconds=3600):
                 return JsonResponse({'message' : 'APPOINTMENTS_CAN_BE_CANCELLED_ONLY_AN_HOUR_PRIOR_TO_THE_SCHEDULED_TIME'}, status=400)
 
-            if appointment.state.id == 1:
-                Appointment.objects.filter(id=appointment_id).update(state_id = 2)
+            if appointment.state_id == State.BOOKED:
+                with atomic():
+                    Appointment.objects.filter(id=appointment_id).update(state_id = 2)
+                    sync_feed([appointment_id])
+                    invalidate_patients([request.user.id])
+                    invalidate_availability([appointment.booked_doctor_id])
                 return JsonResponse({'message' : 'APPOINTMENT_HAS_BEEN_CANCELED'}, status=200)
             else:
                 return JsonResponse({'message' : 'ALREADY_CANCELED_OR_CLOSED_APPOINTMENT'}, status = 400)
@@ -143,8 +478,145 @@ class CancellationView(View):
         except Appointment.DoesNotExist:
             return JsonResponse({"message" : "APPOINTMENT_DOES_NOT_EXIST"}, status=404)
 
-class AppointmentCreationView(View):
+UPLOAD_SESSION_SCHEMA = RequestSchema(
+    filename = Field(str),
+    size     = Field(int)
+)
+
+class UploadSessionView(View):
+    @login_decorator
+    @patient_shard
+    @parse_request(UPLOAD_SESSION_SCHEMA)
+    def post(self, request):
+        size = request.data['size']
+
+        if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+            return JsonResponse({'message' : 'INVALID_UPLOAD_SIZE'}, status=400)
+
+        session = UploadSession.objects.create(
+            patient_id = request.user.id,
+            filename   = os.path.basename(request.data['filename'])[-100:],
+            size       = size
+        )
+
+        return JsonResponse({'upload_id' : str(session.id), 'offset' : 0}, status=201)
+
+class UploadChunkView(View):
+    def status(self, session):
+        return {'upload_id' : str(session.id), 'offset' : session.offset, 'size' : session.size, 'completed' : bool(session.file_name)}
+
+    @login_decorator
+    @patient_shard
+    def get(self, request, upload_id):
+        try:
+            session = UploadSession.objects.get(id=upload_id, patient_id=request.user.id)
+            return JsonResponse(self.status(session), status=200)
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'message' : 'UPLOAD_DOES_NOT_EXIST'}, status=404)
+
+    @login_decorator
+    @patient_shard
+    def patch(self, request, upload_id):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return JsonResponse({'message' : 'INVALID_UPLOAD_OFFSET'}, status=400)
+
+        try:
+            session = UploadSession.objects.get(id=upload_id, patient_id=request.user.id)
+
+            # The body is streamed outside any transaction, retries of the same chunk wait on the part file instead
+            with part_lock(session):
+                session.refresh_from_db()
+
+                if session.file_name or offset != session.offset:
+                    return JsonResponse(dict(self.status(session), message='UPLOAD_OFFSET_MISMATCH'), status=409)
+
+                if offset + length > session.size:
+                    return JsonResponse({'message' : 'UPLOAD_EXCEEDS_DECLARED_SIZE'}, status=400)
+
+                session.offset += append_chunk(session, request, length)
+
+                if offset == 0 and not sniff_image_type(session_head(session)):
+                    discard(session)
+                    return JsonResponse({'message' : 'UNSUPPORTED_IMAGE_TYPE'}, status=400)
+
+                if session.offset == session.size:
+                    finalize(session)
+
+                # Only advance from the offset this request started at
+                updated = UploadSession.objects.filter(id=session.id, offset=offset, file_name='').update(
+                    offset       = session.offset,
+                    file_name    = session.file_name,
+                    content_hash = session.content_hash
+                )
+                if not updated:
+                    session = UploadSession.objects.get(id=session.id)
+                    return JsonResponse(dict(self.status(session), message='UPLOAD_OFFSET_MISMATCH'), status=409)
+
+            return JsonResponse(self.status(session), status=200)
+        except UploadSession.DoesNotExist:
+            return JsonResponse({'message' : 'UPLOAD_DOES_NOT_EXIST'}, status=404)
+
+PRESIGNED_UPLOAD_SCHEMA = RequestSchema(
+    filename     = Field(str),
+    content_type = Field(str),
+    size         = Field(int)
+)
+
+class PresignedUploadView(View):
+    @login_decorator
+    @parse_request(PRESIGNED_UPLOAD_SCHEMA)
+    def post(self, request):
+        if not uses_presigned_uploads():
+            return JsonResponse({'message' : 'PRESIGNED_UPLOADS_DISABLED'}, status=404)
+
+        content_type = request.data['content_type']
+
+        if content_type not in IMAGE_CONTENT_TYPES:
+            return JsonResponse({'message' : 'UNSUPPORTED_IMAGE_TYPE'}, status=400)
+
+        if not 0 < request.data['size'] <= settings.UPLOAD_MAX_SIZE:
+            return JsonResponse({'message' : 'INVALID_UPLOAD_SIZE'}, status=400)
+
+        key = new_key(request.user.id, request.data['filename'])
+        url = object_store().presign_put(key, content_type, settings.PRESIGNED_UPLOAD_LIFETIME)
+
+        return JsonResponse({
+            'key'     : key,
+            'url'     : request.build_absolute_uri(url),
+            'method'  : 'PUT',
+            'headers' : {'Content-Type' : content_type}
+        }, status=201)
+
+class ObjectStoreView(View):
+    def put(self, request, key):
+        store = object_store()
+
+        if not isinstance(store, FilesystemObjectStore):
+            return JsonResponse({'message' : 'OBJECT_STORE_IS_NOT_LOCAL'}, status=404)
+
+        try:
+            expires      = request.GET['expires']
+            content_type = request.GET['content_type']
+            length       = int(request.headers['Content-Length'])
+
+            if request.content_type != content_type or not store.verify(key, expires, content_type, request.GET['signature']):
+                return JsonResponse({'message' : 'INVALID_SIGNATURE'}, status=403)
+        except (KeyError, ValueError):
+            return JsonResponse({'message' : 'INVALID_SIGNATURE'}, status=403)
+
+        if length > settings.UPLOAD_MAX_SIZE:
+            return JsonResponse({'message' : 'IMAGE_TOO_LARGE'}, status=413)
+
+        store.put(key, request, length)
+        return JsonResponse({'key' : key}, status=200)
+
+class AppointmentCreationView(View, SlotValidation):
     @login_decorator
+    @patient_shard
+    @limit_uploads('DO_NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6')
     def post(self, request):
         try:
             patient_id          = request.user.id
@@ -152,20 +624,26 @@ class AppointmentCreationView(View):
             appointmented_year  = int(request.POST['year'])
             appointmented_month = int(request.POST['month'])
             appointmented_day   = int(request.POST['day'])
-            appointmented_time  = int(request.POST['time'])
             symptom             = request.POST['symptom']
             images              = request.FILES.getlist('image')
+            upload_ids          = request.POST.getlist('upload_id')
+            image_keys          = request.POST.getlist('image_key')
             selected_date       = date(appointmented_year, appointmented_month, appointmented_day)
-            selected_time       = time(appointmented_time)
+            selected_time       = parse_slot_time(request.POST['time'])
 
-            if len(images) > 6:
+            if len(images) + len(upload_ids) + len(image_keys) > 6:
                 return JsonResponse({'message' : 'DO_NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6'}, status=400)
 
-            with transaction.atomic():
+            duration = self.validate_slot(doctor_id, selected_date, selected_time)
+            sessions = completed_uploads(patient_id, upload_ids)
+            keys     = uploaded_keys(patient_id, image_keys)
+
+            with atomic():
                 new_appointment = Appointment.objects.create(
                     symptom  = symptom,
                     date     = selected_date,
                     time     = selected_time,
+                    duration = duration,
                     state_id = 1
                 )
 
@@ -175,61 +653,97 @@ class AppointmentCreationView(View):
                     patient_id     = patient_id
                 )
                 
-                AppointmentImage.objects.bulk_create([
-                    AppointmentImage(
-                        appointment_id = new_appointment.id,
-                        wound_img      = image
-                    ) for image in images
-                ])
+                update_images(new_appointment.id, images, sessions=sessions, keys=keys)
+                UploadSession.objects.filter(id__in=[session.id for session in sessions]).delete()
+                sync_feed([new_appointment.id])
+                invalidate_patients([patient_id])
+                invalidate_availability([doctor_id])
                 return JsonResponse({'message' : 'YOUR_APPOINTMENT_IS_CREATED'}, status = 201)
         except KeyError:
             return JsonResponse({"message" : "KEY_ERROR"}, status=400)
+        except ValueError:
+            return JsonResponse({"message" : "INVALID_APPOINTMENT_TIME"}, status=400)
+        except ValidationError as e:
+            return JsonResponse({"message" : e.message}, status=400)
+        except Doctor.DoesNotExist:
+            return JsonResponse({"message" : "DOCTOR_DOES_NOT_EXIST"}, status=404)
+
+class AppointmentChangeView(View, SlotValidation):
+    def image_ids(self, request, key):
+        if key not in request.POST:
+            return None
+        return [int(image_id) for image_id in request.POST.getlist(key) if image_id]
 
-class AppointmentChangeView(View):
     @login_decorator
+    @patient_shard
+    @limit_uploads('NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6')
     def post(self, request, appointment_id):
         try:
             doctor_id            = int(request.POST['doctor_id'])
             appointmented_year   = int(request.POST['year'])
             appointmented_month  = int(request.POST['month'])
             appointmented_day    = int(request.POST['day'])
-            appointmented_time   = int(request.POST['time'])
             symptom              = request.POST['symptom']
             images               = request.FILES.getlist('image')
+            upload_ids           = request.POST.getlist('upload_id')
+            image_keys           = request.POST.getlist('image_key')
             selected_date        = date(appointmented_year, appointmented_month, appointmented_day)
-            selected_time        = time(appointmented_time)
-            appointment          = Appointment.objects.get(id=appointment_id, userappointment__patient_id=request.user.id)
+            selected_time        = parse_slot_time(request.POST['time'])
+            # symptom is loaded because an unchanged one is not rewritten, opinion is never needed here
+            appointment          = Appointment.objects.filter(
+                id = appointment_id, userappointment__patient_id = request.user.id
+            ).only(*Appointment.SCHEDULE_FIELDS, 'symptom').annotate(booked_doctor_id=F('userappointment__doctor_id')).get()
             appointment_datetime = datetime.combine(appointment.date, appointment.time)
 
             if appointment_datetime - datetime.now() < timedelta(seconds=3600):
                 return JsonResponse({'message' : 'NOT_ALLOW_TO_RESCHEDULE_YOUR_APPOINTMENT_AN_HOUR_PRIOR_TO_YOUR_SCHEDULED_TIME'}, status=400)
 
-            if len(images) > 6:
+            if len(images) + len(upload_ids) + len(image_keys) > 6:
                 return JsonResponse({'message' : 'NOT_ALLOW_TO_UPLOAD_IMAGES_MORE_THAN_6'}, status=400)
 
-            with transaction.atomic():
-                Appointment.objects.filter(id=appointment_id).update(
-                    symptom    = symptom,
-                    date       = selected_date,
-                    time       = selected_time,
-                    updated_at = datetime.now(),
-                    state_id   = 1
-                )
+            try:
+                keep_ids   = self.image_ids(request, 'keep_image')
+                remove_ids = self.image_ids(request, 'remove_image') or []
+            except ValueError:
+                return JsonResponse({'message' : 'INVALID_IMAGE_ID'}, status=400)
+
+            duration = self.validate_slot(doctor_id, selected_date, selected_time, exclude_appointment_id=appointment_id)
+            sessions = completed_uploads(request.user.id, upload_ids)
+            keys     = uploaded_keys(request.user.id, image_keys)
+            changes  = {
+                field : value for field, value in {
+                    'symptom'  : symptom,
+                    'date'     : selected_date,
+                    'time'     : selected_time,
+                    'duration' : duration,
+                    'state_id' : 1
+                }.items() if getattr(appointment, field) != value
+            }
 
-                UserAppointment.objects.filter(appointment_id = appointment_id).update(
-                    doctor_id = doctor_id
-                )
+            with atomic():
+                # Only columns that actually changed are written, and images are diffed rather than replaced
+                doctor_changed = UserAppointment.objects.filter(appointment_id=appointment_id).exclude(doctor_id=doctor_id).update(doctor_id=doctor_id)
+                removed, added = update_images(appointment_id, images, keep_ids, remove_ids, sessions, keys)
+                UploadSession.objects.filter(id__in=[session.id for session in sessions]).delete()
 
-                AppointmentImage.objects.filter(appointment_id=appointment_id).delete()
-                AppointmentImage.objects.bulk_create([
-                    AppointmentImage(
-                        wound_img      = image,
-                        appointment_id = appointment_id
-                    ) for image in images
-                ])
+                if changes or doctor_changed or removed or added:
+                    Appointment.objects.filter(id=appointment_id).update(updated_at=datetime.now(), **changes)
+                    invalidate_patients([request.user.id])
+
+                if changes.keys() & {'date', 'time', 'state_id'} or doctor_changed:
+                    sync_feed([appointment_id])
+
+                if changes.keys() & {'date', 'time', 'duration', 'state_id'} or doctor_changed:
+                    invalidate_availability([appointment.booked_doctor_id, doctor_id])
 
                 return JsonResponse({'message' : 'YOUR_APPOINTMENT_HAS_BEEN_CHANGED'}, status = 201)
         except KeyError:
             return JsonResponse({"message" : "KEY_ERROR"}, status=400)
+        except ValueError:
+            return JsonResponse({"message" : "INVALID_APPOINTMENT_TIME"}, status=400)
+        except ValidationError as e:
+            return JsonResponse({"message" : e.message}, status=400)
         except Appointment.DoesNotExist:
-            return JsonResponse({"message" : "APPOINTMENT_DOES_NOT_EXIST"}, status=404)
\ No newline at end of file
+            return JsonResponse({"message" : "APPOINTMENT_DOES_NOT_EXIST"}, status=404)
+        except Doctor.DoesNotExist:
+            return JsonResponse({"message" : "DOCTOR_DOES_NOT_EXIST"}, status=404)
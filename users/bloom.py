@@ -0,0 +1,123 @@
+import math
+import logging
+import hashlib
+import threading
+
+from django.db         import connection
+from django.conf       import settings
+from django.core.cache import cache
+
+from users.models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity   = capacity
+        self.size       = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits       = bytearray((self.size + 7) // 8)
+        self.count      = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1     = int.from_bytes(digest[:8], 'little')
+        h2     = int.from_bytes(digest[8:], 'little') | 1
+
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class EmailFilter:
+    MIN_CAPACITY = 10000
+    RECENT_KEY   = 'recent_signup:{}'
+
+    def __init__(self):
+        self.bloom      = None
+        self.pending    = None
+        self.lock       = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.wake       = threading.Event()
+
+    def normalize(self, email):
+        return email.strip().lower()
+
+    def recent_key(self, email):
+        return self.RECENT_KEY.format(hashlib.blake2b(email.encode(), digest_size=16).hexdigest())
+
+    def build(self):
+        with self.build_lock:
+            self._build()
+
+    def _build(self):
+        emails = CustomUser.objects.values_list('email', flat=True)
+
+        with self.lock:
+            self.pending = []
+
+        bloom = BloomFilter(max(emails.count() * 2, self.MIN_CAPACITY), settings.EMAIL_FILTER_ERROR_RATE)
+
+        for email in emails.iterator(chunk_size=10000):
+            bloom.add(self.normalize(email))
+
+        # Emails registered while the table was being scanned are replayed into the new filter
+        with self.lock:
+            for email in self.pending:
+                bloom.add(email)
+            self.pending = None
+            self.bloom   = bloom
+
+    def start(self):
+        """
+        Builds the filter before the worker serves requests, then keeps rebuilding it
+        on a daemon thread every EMAIL_FILTER_REBUILD_INTERVAL, or sooner once signups
+        have filled it past its capacity.
+        """
+        self.rebuild()
+        threading.Thread(target=self.rebuild_forever, name='email-filter', daemon=True).start()
+
+    def rebuild(self):
+        try:
+            self.build()
+        except Exception:
+            # The previous filter, or the database until there is one, keeps answering
+            logger.exception('email filter rebuild failed')
+
+    def rebuild_forever(self):
+        while True:
+            self.wake.wait(settings.EMAIL_FILTER_REBUILD_INTERVAL)
+            self.wake.clear()
+            self.rebuild()
+            # Idle for most of the interval, so the thread does not keep its own connection open
+            connection.close()
+
+    def add(self, email):
+        email = self.normalize(email)
+
+        # Other workers only see the signup after their next rebuild, until then they find it in the shared cache
+        cache.set(self.recent_key(email), 1, timeout=settings.EMAIL_FILTER_REBUILD_INTERVAL * 2)
+
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(email)
+                if self.bloom.count > self.bloom.capacity:
+                    self.wake.set()
+            if self.pending is not None:
+                self.pending.append(email)
+
+    def might_contain(self, email):
+        # Before the first build every email might be taken, callers then ask the database
+        bloom = self.bloom
+        if bloom is None:
+            return True
+
+        email = self.normalize(email)
+        return email in bloom or cache.get(self.recent_key(email)) is not None
+
+email_filter = EmailFilter()
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core import checks
+
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache'
+}
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    # Token revocation, recent signups and response-cache versions only work when every worker sees the same cache
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [checks.Warning(
+            'The default cache is local to each process, so logouts, refresh-token rotation and '
+            'cache invalidation only take effect in the worker that handled them.',
+            hint = 'Point my_settings.CACHES at a shared backend such as Redis or Memcached.',
+            id   = 'users.W001'
+        )]
+    return []
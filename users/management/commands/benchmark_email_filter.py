@@ -0,0 +1,40 @@
+import time
+
+from django.conf                 import settings
+from django.core.management.base import BaseCommand
+
+from users.bloom import BloomFilter
+
+class Command(BaseCommand):
+    help = 'Measure build time, size, lookup latency and false positive rate of the signup email Bloom filter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--lookups', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        users   = options['users']
+        lookups = options['lookups']
+
+        started = time.perf_counter()
+        bloom   = BloomFilter(users * 2, settings.EMAIL_FILTER_ERROR_RATE)
+
+        for i in range(users):
+            bloom.add(f'user{i}@voidoc.com')
+
+        build_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        hits    = sum(f'user{i}@voidoc.com' in bloom for i in range(lookups))
+        hit_ns  = (time.perf_counter() - started) / lookups * 1e9
+
+        started         = time.perf_counter()
+        false_positives = sum(f'free{i}@voidoc.com' in bloom for i in range(lookups))
+        miss_ns         = (time.perf_counter() - started) / lookups * 1e9
+
+        self.stdout.write(f'users            : {users}')
+        self.stdout.write(f'filter size      : {len(bloom.bits) / 1024 / 1024:.2f} MiB ({bloom.hash_count} hashes)')
+        self.stdout.write(f'build time       : {build_time:.2f} s')
+        self.stdout.write(f'registered lookup: {hit_ns:.0f} ns ({hits}/{lookups} found)')
+        self.stdout.write(f'free lookup      : {miss_ns:.0f} ns')
+        self.stdout.write(f'false positives  : {false_positives / lookups:.4%} (fall back to MySQL)')
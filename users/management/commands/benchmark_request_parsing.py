@@ -0,0 +1,39 @@
+import re
+import json
+import timeit
+
+from django.test                 import RequestFactory
+from django.core.validators      import validate_email
+from django.core.management.base import BaseCommand
+
+from users.views import SIGN_UP_SCHEMA
+
+def parse_per_view(request):
+    REGEX_PASSWORD = r'^(?=.*\d)(?=.*[a-zA-Z])[0-9a-zA-Z]{8,}$'
+
+    data      = json.loads(request.body)
+    name      = data['name']
+    email     = data['email']
+    password  = data['password']
+    is_doctor = data['is_doctor']
+
+    validate_email(email)
+    re.match(REGEX_PASSWORD, password)
+    return name, email, password, is_doctor
+
+class Command(BaseCommand):
+    help = 'Compare the shared request schema with the previous per-view signup body parsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        number  = options['number']
+        body    = json.dumps({'name' : 'kevin', 'email' : 'kevin@gmail.com', 'password' : 'asdf12345', 'is_doctor' : False})
+        request = RequestFactory().post('/users/signup', body, content_type='application/json')
+
+        per_view = timeit.timeit(lambda: parse_per_view(request), number=number) / number * 1e6
+        schema   = timeit.timeit(lambda: SIGN_UP_SCHEMA.parse(request), number=number) / number * 1e6
+
+        self.stdout.write(f'per-view parsing: {per_view:.2f} us/request')
+        self.stdout.write(f'request schema  : {schema:.2f} us/request')
@@ -0,0 +1,46 @@
+import time
+
+from django.db                   import transaction
+from django.core.management.base import BaseCommand
+
+from users.slots  import to_mask, to_bytes, mask_from_times
+from users.models import WorkingDay, WorkingTime
+
+class Command(BaseCommand):
+    help = 'Fold per-slot WorkingTime rows into WorkingDay.slot_mask in batches (resumable with --start-id)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--start-id', type=int, default=0)
+        parser.add_argument('--delete-rows', action='store_true', help='Delete converted WorkingTime rows')
+
+    def handle(self, *args, **options):
+        last_id   = options['start_id']
+        converted = 0
+        started   = time.perf_counter()
+
+        while True:
+            working_days = list(WorkingDay.objects.filter(id__gt=last_id).order_by('id').only('id', 'slot_mask')[:options['batch_size']])
+            if not working_days:
+                break
+
+            times = {}
+            for working_day_id, working_time in WorkingTime.objects.filter(
+                working_day_id__in = [working_day.id for working_day in working_days]
+            ).values_list('working_day_id', 'time'):
+                times.setdefault(working_day_id, []).append(working_time)
+
+            for working_day in working_days:
+                working_day.slot_mask = to_bytes(to_mask(working_day.slot_mask) | mask_from_times(times.get(working_day.id, [])))
+
+            with transaction.atomic():
+                WorkingDay.objects.bulk_update(working_days, ['slot_mask'])
+                if options['delete_rows']:
+                    WorkingTime.objects.filter(working_day_id__in=times.keys()).delete()
+
+            last_id    = working_days[-1].id
+            converted += len(working_days)
+            self.stdout.write(f'converted up to working day {last_id} ({converted} days)')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{converted} working days converted in {elapsed:.1f} s')
@@ -0,0 +1,38 @@
+import csv
+import time
+
+from datetime import date, time as clock
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.schedules import publish_schedule, slot_times
+
+class Command(BaseCommand):
+    help = 'Stream a CSV of doctor_id,date,start_time,end_time[,break_start,break_end] rows into working days and times'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def read_entries(self, path):
+        with open(path, newline='', encoding='utf-8') as csv_file:
+            for line, row in enumerate(csv.DictReader(csv_file), start=2):
+                try:
+                    break_start = row.get('break_start') or None
+                    break_end   = row.get('break_end') or None
+
+                    yield int(row['doctor_id']), date.fromisoformat(row['date']), slot_times(
+                        clock.fromisoformat(row['start_time']),
+                        clock.fromisoformat(row['end_time']),
+                        clock.fromisoformat(break_start) if break_start else None,
+                        clock.fromisoformat(break_end) if break_end else None
+                    )
+                except (KeyError, ValueError) as e:
+                    raise CommandError(f'line {line}: {e}')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        slots   = publish_schedule(self.read_entries(options['path']), options['batch_size'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f'{slots} slots imported in {elapsed:.1f} s ({slots / max(elapsed, 1e-9):.0f} slots/s)')
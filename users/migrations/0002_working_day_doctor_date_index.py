@@ -0,0 +1,17 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workingday',
+            index=models.Index(fields=['doctor', 'date'], name='working_day_doctor__efff3f_idx'),
+        ),
+    ]
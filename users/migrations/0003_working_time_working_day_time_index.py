@@ -0,0 +1,17 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_working_day_doctor_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workingtime',
+            index=models.Index(fields=['working_day', 'time'], name='working_tim_working_ec2dd7_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def remove_duplicate_schedules(apps, schema_editor):
+    WorkingDay  = apps.get_model('users', 'WorkingDay')
+    WorkingTime = apps.get_model('users', 'WorkingTime')
+
+    duplicated_days = WorkingDay.objects.values('doctor_id', 'date').annotate(
+        keep_id = models.Min('id'), total = models.Count('id')
+    ).filter(total__gt=1)
+
+    for working_day in duplicated_days.iterator():
+        duplicates = WorkingDay.objects.filter(doctor_id=working_day['doctor_id'], date=working_day['date']).exclude(id=working_day['keep_id'])
+        WorkingTime.objects.filter(working_day__in=duplicates).update(working_day_id=working_day['keep_id'])
+        duplicates.delete()
+
+    duplicated_times = WorkingTime.objects.values('working_day_id', 'time').annotate(
+        keep_id = models.Min('id'), total = models.Count('id')
+    ).filter(total__gt=1)
+
+    for working_time in duplicated_times.iterator():
+        WorkingTime.objects.filter(
+            working_day_id = working_time['working_day_id'], time = working_time['time']
+        ).exclude(id=working_time['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_working_time_working_day_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkingTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekdays', models.CharField(max_length=7)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('break_start', models.TimeField(null=True)),
+                ('break_end', models.TimeField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'working_templates',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='workingday',
+            name='working_day_doctor__efff3f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='workingtime',
+            name='working_tim_working_ec2dd7_idx',
+        ),
+        migrations.RunPython(remove_duplicate_schedules, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='workingday',
+            constraint=models.UniqueConstraint(fields=('doctor', 'date'), name='unique_working_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='workingtime',
+            constraint=models.UniqueConstraint(fields=('working_day', 'time'), name='unique_working_time'),
+        ),
+        migrations.AddField(
+            model_name='workingtemplate',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.doctor'),
+        ),
+    ]
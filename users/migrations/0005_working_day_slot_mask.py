@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_working_schedule_templates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workingday',
+            name='slot_mask',
+            field=models.BinaryField(default=b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', max_length=36),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-19 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_working_day_slot_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(choices=[(10, '10 minutes'), (15, '15 minutes'), (20, '20 minutes'), (30, '30 minutes'), (60, '60 minutes')], default=60),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(choices=[(10, '10 minutes'), (15, '15 minutes'), (20, '20 minutes'), (30, '30 minutes'), (60, '60 minutes')], null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-19 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_slot_minutes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='department',
+            name='thumbnail',
+            field=models.FileField(db_index=True, upload_to='department_thumbnail'),
+        ),
+        migrations.AlterField(
+            model_name='doctor',
+            name='profile_img',
+            field=models.FileField(db_index=True, upload_to='doctor_profile_img'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db                  import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 
+from users.slots import MASK_BYTES
+
 class UserManager(BaseUserManager):
     def create_user(self, name, email, password, is_doctor):
         if not name:
@@ -61,28 +63,46 @@ class CustomUser(AbstractBaseUser):
     class Meta: 
         db_table = 'users'
 
+SLOT_MINUTES_CHOICES = [(minutes, f'{minutes} minutes') for minutes in (10, 15, 20, 30, 60)]
+
 class Doctor(models.Model):
-    user        = models.OneToOneField('CustomUser', on_delete=models.CASCADE)
-    department  = models.ForeignKey('Department', on_delete=models.CASCADE)
-    hospital    = models.ForeignKey('Hospital', on_delete=models.SET_NULL, null=True)
-    profile_img = models.FileField(upload_to="doctor_profile_img")
+    user         = models.OneToOneField('CustomUser', on_delete=models.CASCADE)
+    department   = models.ForeignKey('Department', on_delete=models.CASCADE)
+    hospital     = models.ForeignKey('Hospital', on_delete=models.SET_NULL, null=True)
+    profile_img  = models.FileField(upload_to="doctor_profile_img", db_index=True)
+    slot_minutes = models.PositiveSmallIntegerField(choices=SLOT_MINUTES_CHOICES, null=True)
 
     class Meta: 
         db_table = 'doctors'
 
 class WorkingDay(models.Model): 
-    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE)
-    date   = models.DateField()
+    doctor    = models.ForeignKey('Doctor', on_delete=models.CASCADE)
+    date      = models.DateField()
+    slot_mask = models.BinaryField(max_length=MASK_BYTES, default=bytes(MASK_BYTES))
 
     class Meta: 
-        db_table = 'working_days'
+        db_table    = 'working_days'
+        constraints = [models.UniqueConstraint(fields=['doctor', 'date'], name='unique_working_day')]
 
 class WorkingTime(models.Model):
     working_day = models.ForeignKey('WorkingDay', on_delete=models.CASCADE)
     time        = models.TimeField()
 
     class Meta:
-        db_table = 'working_times'
+        db_table    = 'working_times'
+        constraints = [models.UniqueConstraint(fields=['working_day', 'time'], name='unique_working_time')]
+
+class WorkingTemplate(models.Model):
+    doctor      = models.ForeignKey('Doctor', on_delete=models.CASCADE)
+    weekdays    = models.CharField(max_length=7)
+    start_time  = models.TimeField()
+    end_time    = models.TimeField()
+    break_start = models.TimeField(null=True)
+    break_end   = models.TimeField(null=True)
+    created_at  = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'working_templates'
 
 class Hospital(models.Model): 
     name = models.CharField(max_length=50)
@@ -91,8 +111,9 @@ class Hospital(models.Model):
         db_table = 'hospitals'
 
 class Department(models.Model): 
-    name      = models.CharField(max_length=50)
-    thumbnail = models.FileField(upload_to='department_thumbnail')
+    name         = models.CharField(max_length=50)
+    thumbnail    = models.FileField(upload_to='department_thumbnail', db_index=True)
+    slot_minutes = models.PositiveSmallIntegerField(choices=SLOT_MINUTES_CHOICES, default=60)
 
     class Meta: 
         db_table = 'departments'
\ No newline at end of file
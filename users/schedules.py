@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+from django.db                  import transaction
+from django.conf                import settings
+from django.db.models.functions import Coalesce
+
+from users.slots  import SLOT_UNIT, to_mask, to_bytes, mask_from_times
+from users.models import Doctor, WorkingDay, WorkingTime
+
+SLOT_LENGTH = timedelta(hours=1)
+BATCH_SIZE  = 1000
+
+def slot_times(start_time, end_time, break_start=None, break_end=None):
+    # Masks record working hours at SLOT_UNIT resolution so doctors with sub-hour slots keep partial hours
+    length  = timedelta(minutes=SLOT_UNIT) if uses_slot_mask() else SLOT_LENGTH
+    today   = datetime.today()
+    current = datetime.combine(today, start_time)
+    end     = datetime.combine(today, end_time)
+    times   = []
+
+    while current + length <= end:
+        if not (break_start and break_end and break_start <= current.time() < break_end):
+            times.append(current.time())
+        current += length
+
+    return times
+
+def expand_template(template, start_date, end_date):
+    weekdays = {int(weekday) for weekday in template.weekdays}
+    times    = slot_times(template.start_time, template.end_time, template.break_start, template.break_end)
+    current  = start_date
+
+    while current <= end_date:
+        if current.weekday() in weekdays:
+            yield template.doctor_id, current, times
+        current += timedelta(days=1)
+
+def publish_schedule(entries, batch_size=BATCH_SIZE):
+    batch   = []
+    created = 0
+
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            created += publish_batch(batch)
+            batch    = []
+
+    if batch:
+        created += publish_batch(batch)
+
+    return created
+
+def uses_slot_mask():
+    return settings.WORKING_TIME_STORAGE == 'mask'
+
+def slot_minutes_for(doctor_id):
+    return Doctor.objects.filter(id=doctor_id).annotate(
+        minutes = Coalesce('slot_minutes', 'department__slot_minutes')
+    ).values_list('minutes', flat=True).get()
+
+def working_mask(doctor_id, working_date):
+    if uses_slot_mask():
+        masks = WorkingDay.objects.filter(doctor_id=doctor_id, date=working_date).values_list('slot_mask', flat=True)
+        return mask_from_masks(masks)
+
+    return mask_from_times(WorkingTime.objects.filter(
+        working_day__doctor_id = doctor_id,
+        working_day__date      = working_date
+    ).values_list('time', flat=True))
+
+def department_working_masks(department_id, working_date):
+    fields       = ['id', 'doctor_id', 'doctor__user__name', 'doctor__hospital__name', 'minutes']
+    working_days = WorkingDay.objects.filter(doctor__department_id=department_id, date=working_date).annotate(
+        minutes = Coalesce('doctor__slot_minutes', 'doctor__department__slot_minutes')
+    )
+
+    if uses_slot_mask():
+        return [
+            (doctor_id, doctor_name, doctor_hospital, minutes, to_mask(mask))
+            for _, doctor_id, doctor_name, doctor_hospital, minutes, mask in working_days.values_list(*fields, 'slot_mask')
+        ]
+
+    working_days = list(working_days.values_list(*fields))
+    times        = {}
+    for working_day_id, working_time in WorkingTime.objects.filter(
+        working_day_id__in = [working_day[0] for working_day in working_days]
+    ).values_list('working_day_id', 'time'):
+        times.setdefault(working_day_id, []).append(working_time)
+
+    return [
+        (doctor_id, doctor_name, doctor_hospital, minutes, mask_from_times(times.get(working_day_id, [])))
+        for working_day_id, doctor_id, doctor_name, doctor_hospital, minutes in working_days
+    ]
+
+def mask_from_masks(masks):
+    mask = 0
+    for value in masks:
+        mask |= to_mask(value)
+    return mask
+
+def publish_batch(entries):
+    if uses_slot_mask():
+        return publish_mask_batch(entries)
+
+    # Unique (doctor, date) and (working_day, time) constraints make reruns no-ops
+    with transaction.atomic():
+        WorkingDay.objects.bulk_create([
+            WorkingDay(doctor_id=doctor_id, date=working_date) for doctor_id, working_date, _ in entries
+        ], ignore_conflicts=True)
+
+        doctor_ids   = {doctor_id for doctor_id, _, _ in entries}
+        dates        = {working_date for _, working_date, _ in entries}
+        working_days = {
+            (doctor_id, working_date): working_day_id
+            for working_day_id, doctor_id, working_date in WorkingDay.objects.filter(
+                doctor_id__in = doctor_ids, date__in = dates
+            ).values_list('id', 'doctor_id', 'date')
+        }
+
+        working_times = [
+            WorkingTime(working_day_id=working_days[(doctor_id, working_date)], time=working_time)
+            for doctor_id, working_date, times in entries for working_time in times
+        ]
+        WorkingTime.objects.bulk_create(working_times, ignore_conflicts=True)
+
+    return len(working_times)
+
+def publish_mask_batch(entries):
+    masks = {}
+    for doctor_id, working_date, times in entries:
+        masks[(doctor_id, working_date)] = masks.get((doctor_id, working_date), 0) | mask_from_times(times, SLOT_UNIT)
+
+    with transaction.atomic():
+        existing = WorkingDay.objects.select_for_update().filter(
+            doctor_id__in = {doctor_id for doctor_id, _ in masks},
+            date__in      = {working_date for _, working_date in masks}
+        ).only('id', 'doctor_id', 'date', 'slot_mask')
+
+        updated = []
+        for working_day in existing:
+            key = (working_day.doctor_id, working_day.date)
+            if key in masks:
+                working_day.slot_mask = to_bytes(to_mask(working_day.slot_mask) | masks.pop(key))
+                updated.append(working_day)
+
+        WorkingDay.objects.bulk_update(updated, ['slot_mask'])
+        WorkingDay.objects.bulk_create([
+            WorkingDay(doctor_id=doctor_id, date=working_date, slot_mask=to_bytes(mask))
+            for (doctor_id, working_date), mask in masks.items()
+        ])
+
+    return sum(len(times) for _, _, times in entries)
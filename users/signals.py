@@ -0,0 +1,10 @@
+from django.dispatch            import receiver
+from django.db.models.signals   import post_save
+
+from users.bloom  import email_filter
+from users.models import CustomUser
+
+@receiver(post_save, sender=CustomUser)
+def add_email_to_filter(sender, instance, created, **kwargs):
+    if created:
+        email_filter.add(instance.email)
@@ -0,0 +1,50 @@
+from datetime import time
+
+SLOT_UNIT     = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_UNIT
+MASK_BYTES    = SLOTS_PER_DAY // 8
+
+def to_mask(value):
+    return int.from_bytes(bytes(value or b''), 'little')
+
+def to_bytes(mask):
+    return mask.to_bytes(MASK_BYTES, 'little')
+
+def slot_bits(start_time, minutes):
+    offset = (start_time.hour * 60 + start_time.minute) // SLOT_UNIT
+    return ((1 << (minutes // SLOT_UNIT)) - 1) << offset
+
+def mask_from_times(times, minutes=60):
+    mask = 0
+    for start_time in times:
+        mask |= slot_bits(start_time, minutes)
+    return mask
+
+def mask_from_intervals(intervals):
+    mask = 0
+    for start_time, minutes in intervals:
+        mask |= slot_bits(start_time, minutes)
+    return mask
+
+def times_from_mask(mask, minutes=60):
+    units = minutes // SLOT_UNIT
+    bits  = (1 << units) - 1
+    times = []
+
+    for offset in range(0, min(mask.bit_length(), SLOTS_PER_DAY) - units + 1, units):
+        if (mask >> offset) & bits == bits:
+            times.append(time(offset * SLOT_UNIT // 60, offset * SLOT_UNIT % 60))
+
+    return times
+
+def overlapping_times(working, booked, minutes=60):
+    bits = (1 << (minutes // SLOT_UNIT)) - 1
+    return [
+        slot_time for slot_time in times_from_mask(working, minutes)
+        if booked & (bits << (slot_time.hour * 60 + slot_time.minute) // SLOT_UNIT)
+    ]
+
+def parse_slot_time(value):
+    if ':' in value:
+        return time.fromisoformat(value)
+    return time(int(value))
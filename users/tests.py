@@ -1,9 +1,19 @@
+import jwt
 import json
+import tempfile
 
-from django.test import TestCase, Client, TransactionTestCase
+from datetime import date, time
+from unittest import mock
 
-from users.models import CustomUser
-from users.utils  import Validation
+from django.conf            import settings
+from django.test            import TestCase, Client, TransactionTestCase, override_settings
+from django.core.management import call_command
+
+from users.bloom  import BloomFilter, EmailFilter, email_filter
+from users.slots  import to_mask, to_bytes, mask_from_times, times_from_mask
+from users.models import CustomUser, Department, Hospital, Doctor, WorkingDay, WorkingTime
+from users.utils  import Validation, TokenRevocation
+from users.checks import check_shared_cache
 
 class SignUpTest(TestCase):
     def setUp(self):
@@ -91,6 +101,30 @@ class SignUpTest(TestCase):
             'message': "Users must have the name"
         })
 
+    def test_fail_sign_up_view_with_json_decode_error(self): 
+        client   = Client()
+        response = client.post('/users/signup', '{"name": "john",', content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'message': 'JSON_DECODE_ERROR'
+        })
+
+    def test_fail_sign_up_view_with_invalid_type(self): 
+        client = Client()
+        user   = {
+            'name'     : 'john',
+            'email'    : 'john@gmail.com',
+            'password' : 12345678,
+            'is_doctor': 'False'
+        }
+        response = client.post('/users/signup', json.dumps(user), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'message': 'INVALID_TYPE_OF_PASSWORD'
+        })
+
 class SignUpIntegrityTest(TransactionTestCase):
     def setUp(self):
         CustomUser.objects.create_user(
@@ -152,6 +186,7 @@ class LoginTest(TestCase, Validation):
         self.assertEqual(response.json(), {
             'message'     : 'SUCCESS_PATIENT_LOGIN',
             'access_token': self.generate_jwt(user),
+            'refresh_token': response.json()['refresh_token'],
             'user_id'     : user.id,
             'user_name'   : user.name
         })
@@ -186,6 +221,7 @@ class LoginTest(TestCase, Validation):
         self.assertEqual(response.json(), {
             'message'     : 'SUCCESS_LOGIN',
             'access_token': self.generate_jwt(user),
+            'refresh_token': response.json()['refresh_token'],
             'user_id'     : user.id,
             'user_name'   : user.name
         })
@@ -205,6 +241,7 @@ class LoginTest(TestCase, Validation):
         self.assertEqual(response.json(), {
             'message'     : 'SUCCESS_LOGIN',
             'access_token': self.generate_jwt(doctor),
+            'refresh_token': response.json()['refresh_token'],
             'user_id'          : doctor.id,
             'user_name'        : doctor.name
             }
@@ -240,6 +277,20 @@ class LoginTest(TestCase, Validation):
             'message'     : 'WRONG_EMAIL_OR_PASSWORD',
         })
 
+    def test_fail_login_with_key_error(self):
+        client = Client()
+        user   = {
+            'email' : 'kevin@gmail.com'
+        }
+
+        headers  = {"HTTP_TYPE_OF_APPLICATION" : "app"}
+        response = client.post('/users/login', json.dumps(user), content_type='application/json', **headers)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'message'     : 'KEY_ERROR',
+        })
+
     def test_fail_login_invalid_type_of_application_on_header(self):
         client = Client()
         user   = {
@@ -255,6 +306,96 @@ class LoginTest(TestCase, Validation):
             'message'     : 'INVALID_TYPE_OF_APPLICATION_ON_HEADER',
         })
 
+class TokenRefreshTest(TestCase, Validation):
+    def setUp(self):
+        CustomUser.objects.create_user(
+            name      = 'kevin',
+            email     = 'kevin@gmail.com',
+            password  = 'asdf12345',
+            is_doctor = False
+        )
+        self.user          = CustomUser.objects.get(email='kevin@gmail.com')
+        self.refresh_token = self.generate_refresh_token(self.user)
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+
+    def test_success_token_refresh(self):
+        client   = Client()
+        response = client.post('/users/token/refresh', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+        payload  = jwt.decode(response.json()['access_token'], settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['message'], 'SUCCESS_TOKEN_REFRESH')
+        self.assertNotEqual(response.json()['refresh_token'], self.refresh_token)
+        self.assertEqual(payload['user_id'], self.user.id)
+        self.assertEqual(payload['name'], 'kevin')
+        self.assertEqual(payload['type'], 'access')
+
+    def test_success_token_refresh_with_single_lookup(self):
+        client = Client()
+
+        with self.assertNumQueries(1):
+            response = client.post('/users/token/refresh', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_fail_token_refresh_with_rotated_token(self):
+        client = Client()
+        client.post('/users/token/refresh', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+        response = client.post('/users/token/refresh', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'message' : 'REVOKED_TOKEN'})
+
+    def test_fail_token_refresh_with_access_token(self):
+        client   = Client()
+        response = client.post('/users/token/refresh', json.dumps({'refresh_token' : self.generate_jwt(self.user)}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message' : 'INVALID_TOKEN'})
+
+    def test_fail_token_refresh_after_logout(self):
+        client   = Client()
+        response = client.post('/users/logout', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message' : 'SUCCESS_LOGOUT'})
+
+        response = client.post('/users/token/refresh', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'message' : 'REVOKED_TOKEN'})
+
+    def test_fail_token_refresh_after_password_change(self):
+        self.user.set_password('qwer12345')
+        self.user.save()
+
+        response = Client().post('/users/token/refresh', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'message' : 'REVOKED_TOKEN'})
+
+    def test_fail_token_refresh_for_deleted_user(self):
+        self.user.delete()
+
+        response = Client().post('/users/token/refresh', json.dumps({'refresh_token' : self.refresh_token}), content_type='application/json')
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'message' : 'REVOKED_TOKEN'})
+
+    def test_fail_concurrent_refresh_with_same_token(self):
+        payload = jwt.decode(self.refresh_token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+
+        # Both requests passed every other check, only one may win the revocation
+        self.assertEqual([TokenRevocation().revoke_token(payload) for _ in range(2)], [True, False])
+
+    def test_warns_about_process_local_cache(self):
+        self.assertEqual([warning.id for warning in check_shared_cache(None)], ['users.W001'])
+
+        with override_settings(CACHES = {'default' : {'BACKEND' : 'django.core.cache.backends.redis.RedisCache', 'LOCATION' : 'redis://'}}):
+            self.assertEqual(check_shared_cache(None), [])
+
 class CheckDuplicateTest(TestCase):
     def setUp(self):
         CustomUser.objects.create_user(
@@ -291,6 +432,77 @@ class CheckDuplicateTest(TestCase):
             'message': 'KEY_ERROR'
         })
 
+    def test_success_free_email_answered_without_db_access(self):
+        client = Client()
+        data   = {
+            'email'    : 'john@gmail.com'
+        }
+        email_filter.build()
+
+        with self.assertNumQueries(0):
+            response = client.post('/users/check_duplicate', json.dumps(data), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+
+    def test_success_registered_email_added_to_filter(self):
+        email_filter.build()
+        CustomUser.objects.create_user(
+            name      = 'john',
+            email     = 'John@Gmail.com',
+            password  = 'asdf12345',
+            is_doctor = False
+        )
+
+        self.assertTrue(email_filter.might_contain('john@gmail.com'))
+
+    def test_success_registered_email_seen_by_other_workers(self):
+        other_worker = EmailFilter()
+        other_worker.build()
+        CustomUser.objects.create_user(
+            name      = 'john',
+            email     = 'john@gmail.com',
+            password  = 'asdf12345',
+            is_doctor = False
+        )
+
+        self.assertTrue(other_worker.might_contain('John@Gmail.com'))
+
+    def test_success_unbuilt_filter_defers_to_database(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(EmailFilter().might_contain('john@gmail.com'))
+
+    def test_success_filter_built_on_start_and_rebuilt_in_background(self):
+        worker = EmailFilter()
+
+        with mock.patch('users.bloom.threading.Thread') as thread:
+            worker.start()
+
+        self.assertIsNotNone(worker.bloom)
+        thread.assert_called_once_with(target = worker.rebuild_forever, name = 'email-filter', daemon = True)
+        thread.return_value.start.assert_called_once_with()
+
+        with self.assertNumQueries(0):
+            self.assertFalse(worker.might_contain('john@gmail.com'))
+
+class BloomFilterTest(TestCase):
+    def test_no_false_negatives(self):
+        bloom  = BloomFilter(1000, 0.01)
+        emails = [f'user{i}@gmail.com' for i in range(1000)]
+
+        for email in emails:
+            bloom.add(email)
+
+        self.assertTrue(all(email in bloom for email in emails))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(1000, 0.01)
+
+        for i in range(1000):
+            bloom.add(f'user{i}@gmail.com')
+
+        false_positives = sum(f'free{i}@gmail.com' in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
 class CheckDuplicateEmailIntegrityTest(TransactionTestCase):
     def setUp(self):
         CustomUser.objects.create_user(
@@ -355,6 +567,7 @@ class PasswordChangeTest(TestCase, Validation):
         self.assertEqual(response.json(), {
                 'message'     : 'SUCCESS_LOGIN',
                 "access_token": self.generate_jwt(user),
+                'refresh_token': response.json()['refresh_token'],
                 'user_id'     : user.id,
                 'user_name'   : user.name
             })
@@ -376,6 +589,7 @@ class PasswordChangeTest(TestCase, Validation):
         self.assertEqual(response.json(), {
                 'message'     : 'SUCCESS_LOGIN',
                 "access_token": self.generate_jwt(user),
+                'refresh_token': response.json()['refresh_token'],
                 'user_id'     : user.id,
                 'user_name'   : user.name
             })
@@ -405,6 +619,7 @@ class PasswordChangeTest(TestCase, Validation):
         self.assertEqual(response.json(), {
                 'message'     : 'SUCCESS_LOGIN',
                 "access_token": self.generate_jwt(user),
+                'refresh_token': response.json()['refresh_token'],
                 'user_id'     : user.id,
                 'user_name'   : user.name
             })
@@ -449,4 +664,86 @@ class PasswordChangeTest(TestCase, Validation):
         # Check password reset
         response = client.post('/users/password_change', json.dumps(data), content_type='application/json')
 
-        self.assertEqual(response.json(), {"message": "Enter a valid password."}) 
\ No newline at end of file
+        self.assertEqual(response.json(), {"message": "Enter a valid password."})
+
+class ImportSchedulesTest(TestCase):
+    def setUp(self):
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = True
+        )
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+
+        self.csv_file = tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8')
+        self.csv_file.write(
+            'doctor_id,date,start_time,end_time,break_start,break_end\n'
+            '1,2030-01-07,09:00,18:00,12:00,13:00\n'
+            '1,2030-01-08,14:00,16:00,,\n'
+        )
+        self.csv_file.flush()
+
+    def tearDown(self):
+        self.csv_file.close()
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+
+    def test_success_import_schedules(self):
+        call_command('import_schedules', self.csv_file.name, batch_size=1, stdout=tempfile.TemporaryFile('w'))
+
+        self.assertEqual(WorkingDay.objects.filter(doctor_id=1).count(), 2)
+        self.assertEqual(WorkingTime.objects.filter(working_day__date=date(2030, 1, 7)).count(), 8)
+        self.assertEqual(
+            list(WorkingTime.objects.filter(working_day__date=date(2030, 1, 8)).order_by('time').values_list('time', flat=True)),
+            [time(14), time(15)]
+        )
+
+    def test_success_import_schedules_twice_does_not_duplicate(self):
+        call_command('import_schedules', self.csv_file.name, stdout=tempfile.TemporaryFile('w'))
+        call_command('import_schedules', self.csv_file.name, stdout=tempfile.TemporaryFile('w'))
+
+        self.assertEqual(WorkingDay.objects.filter(doctor_id=1).count(), 2)
+        self.assertEqual(WorkingTime.objects.filter(working_day__doctor_id=1).count(), 10)
+
+class SlotMaskTest(TestCase):
+    def test_mask_round_trip(self):
+        times = [time(9), time(9, 30), time(10), time(13, 30)]
+        mask  = mask_from_times(times, minutes=30)
+
+        self.assertEqual(to_mask(to_bytes(mask)), mask)
+        self.assertEqual(times_from_mask(mask, minutes=30), times)
+        self.assertEqual(times_from_mask(mask, minutes=60), [time(9)])
+
+class ConvertWorkingTimesTest(TestCase):
+    def setUp(self):
+        doc = CustomUser.objects.create_user(
+            name      = 'doctor',
+            email     = 'doctor@gmail.com',
+            password  = 'doctor123',
+            is_doctor = True
+        )
+        Department.objects.create(id = 1, name = "피부과", thumbnail = "dermatology.png")
+        Hospital.objects.create(id = 1, name = "퍼즐AI병원")
+        Doctor.objects.create(id = 1, user_id = doc.id, department_id = 1, hospital_id = 1, profile_img = "profile1.png")
+        WorkingDay.objects.create(id = 1, doctor_id = 1, date = date(2030, 1, 7))
+        WorkingTime.objects.bulk_create([
+            WorkingTime(working_day_id = 1, time = time(9)),
+            WorkingTime(working_day_id = 1, time = time(14))
+        ])
+
+    def tearDown(self):
+        CustomUser.objects.all().delete()
+        Department.objects.all().delete()
+        Hospital.objects.all().delete()
+        Doctor.objects.all().delete()
+
+    def test_success_convert_working_times(self):
+        call_command('convert_working_times', delete_rows=True, stdout=tempfile.TemporaryFile('w'))
+
+        self.assertEqual(times_from_mask(to_mask(WorkingDay.objects.get(id=1).slot_mask)), [time(9), time(14)])
+        self.assertFalse(WorkingTime.objects.exists())
@@ -1,10 +1,12 @@
 from django.urls import path
 
-from users.views import PasswordChangeView, SignUpView, LoginView, CheckDuplicateEmailView
+from users.views import PasswordChangeView, SignUpView, LoginView, CheckDuplicateEmailView, TokenRefreshView, LogoutView
 
 urlpatterns = [
     path('/signup', SignUpView.as_view()),
     path('/login', LoginView.as_view()),
+    path('/token/refresh', TokenRefreshView.as_view()),
+    path('/logout', LogoutView.as_view()),
     path('/check_duplicate', CheckDuplicateEmailView.as_view()),
     path('/password_change', PasswordChangeView.as_view())
 ]
\ No newline at end of file
@@ -1,31 +1,128 @@
-import jwt
 import re
+import jwt
+import json
+import uuid
+import hashlib
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from django.conf     import settings
-from django.http     import JsonResponse
-from django.db.utils import IntegrityError
-from django.forms    import ValidationError
+from django.conf         import settings
+from django.http         import JsonResponse
+from django.db.utils     import IntegrityError
+from django.forms        import ValidationError
+from django.core.cache   import cache
+from django.utils.cache  import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.crypto import salted_hmac
 
+from users.bloom  import email_filter
 from users.models import CustomUser
 
+REGEX_PASSWORD = re.compile(r'^(?=.*\d)(?=.*[a-zA-Z])[0-9a-zA-Z]{8,}$')
+
+def validate_password(password):
+    if not REGEX_PASSWORD.match(password):
+        raise ValidationError('Enter a valid password.')
+
+class Field:
+    def __init__(self, types, *validators, required=True):
+        self.types      = types
+        self.validators = validators
+        self.required   = required
+
+class RequestSchema:
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def parse(self, request):
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            raise ValidationError('JSON_DECODE_ERROR')
+
+        if not isinstance(data, dict):
+            raise ValidationError('JSON_DECODE_ERROR')
+
+        cleaned = {}
+        for name, field in self.fields.items():
+            if not field.required and data.get(name) is None:
+                cleaned[name] = None
+                continue
+
+            value = data[name]
+
+            if not isinstance(value, field.types):
+                raise ValidationError(f'INVALID_TYPE_OF_{name.upper()}')
+
+            for validator in field.validators:
+                validator(value)
+            cleaned[name] = value
+
+        return cleaned
+
+def parse_request(schema):
+    def decorator(func):
+        def wrapper(self, request, *args, **kwargs):
+            try:
+                request.data = schema.parse(request)
+            except KeyError:
+                return JsonResponse({'message' : 'KEY_ERROR'}, status=400)
+            except ValidationError as e:
+                return JsonResponse({'message' : e.message}, status=400)
+
+            return func(self, request, *args, **kwargs)
+        return wrapper
+    return decorator
+
 class Validation:
     def validate_password(self, password):
-        REGEX_PASSWORD = '^(?=.*\d)(?=.*[a-zA-Z])[0-9a-zA-Z]{8,}$'
-
-        if not re.match(REGEX_PASSWORD, password):
-            raise ValidationError('Enter a valid password.')
+        validate_password(password)
 
     def check_duplicate_email(self, email):
-        if CustomUser.objects.filter(email = email).exists():
+        if email_filter.might_contain(email) and CustomUser.objects.filter(email = email).exists():
             raise IntegrityError
 
     def generate_jwt(self, user):
-        payload      = {'user_id': user.id, 'exp': datetime.now() +timedelta(hours=2)}
+        payload = {
+            'user_id'  : user.id,
+            'name'     : user.name,
+            'is_doctor': user.is_doctor,
+            'type'     : 'access',
+            'exp'      : datetime.utcnow() + settings.ACCESS_TOKEN_LIFETIME
+        }
         access_token = jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return access_token
 
+    def password_fingerprint(self, user):
+        # Follows the password hash, so changing the password ends every refresh token issued before it
+        return salted_hmac('refresh_token', user.password).hexdigest()[:16]
+
+    def generate_refresh_token(self, user):
+        payload = {
+            'user_id'  : user.id,
+            'name'     : user.name,
+            'is_doctor': user.is_doctor,
+            'type'     : 'refresh',
+            'jti'      : uuid.uuid4().hex,
+            'password' : self.password_fingerprint(user),
+            'exp'      : datetime.utcnow() + settings.REFRESH_TOKEN_LIFETIME
+        }
+        refresh_token = jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+        return refresh_token
+
+class TokenRevocation:
+    """
+    Revoked refresh tokens are kept in the cache until they expire, so CACHES must be
+    shared between workers (see the users.W001 deploy check).
+    """
+    KEY_PREFIX = 'revoked_token'
+
+    def revoke_token(self, payload):
+        # cache.add is an atomic test-and-set, only one of two concurrent revocations gets True
+        remaining = payload['exp'] - int(datetime.utcnow().timestamp())
+        if remaining <= 0:
+            return False
+        return cache.add(f'{self.KEY_PREFIX}:{payload["jti"]}', 1, timeout=remaining)
+
 class DateTimeFormat:
     def format_date_time(self, date, time):
         if date.weekday() == 0:
@@ -55,15 +152,46 @@ def login_decorator(func):
         try:
             access_token = request.headers.get('Authorization')
             payload      = jwt.decode(access_token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
-            user         = CustomUser.objects.get(id = payload['user_id'])
-            request.user = user
+
+            if payload.get('type', 'access') != 'access':
+                return JsonResponse({'message' : 'INVALID_TOKEN'}, status = 400)
+
+            # Claims carry everything the views need, so the access path never hits the users table
+            request.user = CustomUser(
+                id        = payload['user_id'],
+                name      = payload.get('name', ''),
+                is_doctor = payload.get('is_doctor')
+            )
 
         except jwt.exceptions.DecodeError: 
             return JsonResponse({'message' : 'INVALID_TOKEN'}, status = 400)
-        except CustomUser.DoesNotExist:
+        except KeyError:
             return JsonResponse({'message' : 'INVALID_USER'}, status=400)
         except jwt.ExpiredSignatureError:
             return JsonResponse({'message' : 'EXPIRED_TOKEN'}, status=401)
 
         return func(self,request,*args,**kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def conditional_get(version):
+    """
+    version(request, *args, **kwargs) returns a cheap fingerprint of what the view
+    would render, or None when it cannot tell. A matching If-None-Match is answered
+    with 304 before the view runs its own queries.
+    """
+    def decorator(func):
+        def wrapper(self, request, *args, **kwargs):
+            fingerprint = version(request, *args, **kwargs)
+            if fingerprint is None:
+                return func(self, request, *args, **kwargs)
+
+            etag     = f'W/"{hashlib.md5(repr(fingerprint).encode()).hexdigest()}"'
+            response = get_conditional_response(request, etag=etag) or func(self, request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                response.headers['ETag'] = etag
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ('Authorization',))
+            return response
+        return wrapper
+    return decorator
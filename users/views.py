@@ -1,27 +1,52 @@
-import json
+import jwt
 
+from django.conf            import settings
 from django.views           import View
 from django.http            import JsonResponse
 from django.db.utils        import IntegrityError
-from django.forms           import ValidationError
 from django.core.validators import validate_email
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth    import login, authenticate
+from django.utils.crypto    import constant_time_compare
 
 from users.models import CustomUser
-from users.utils  import Validation
+from users.utils  import Validation, TokenRevocation, RequestSchema, Field, parse_request, validate_password
+
+SIGN_UP_SCHEMA = RequestSchema(
+    name      = Field(str),
+    email     = Field(str, validate_email),
+    password  = Field(str, validate_password),
+    is_doctor = Field((bool, str))
+)
+
+LOGIN_SCHEMA = RequestSchema(
+    email    = Field(str),
+    password = Field(str)
+)
+
+REFRESH_TOKEN_SCHEMA = RequestSchema(
+    refresh_token = Field(str)
+)
+
+CHECK_DUPLICATE_EMAIL_SCHEMA = RequestSchema(
+    email = Field(str)
+)
+
+PASSWORD_CHANGE_SCHEMA = RequestSchema(
+    email        = Field(str),
+    old_password = Field(str),
+    new_password = Field(str, validate_password)
+)
 
 class SignUpView(View, Validation):
+    @parse_request(SIGN_UP_SCHEMA)
     def post(self, request):
         try:
-            data = json.loads(request.body)
-            name            = data['name']
-            email           = data['email']
-            password        = data['password']
-            is_doctor       = data['is_doctor']
-
-            validate_email(email)
-            self.validate_password(password)
+            name      = request.data['name']
+            email     = request.data['email']
+            password  = request.data['password']
+            is_doctor = request.data['is_doctor']
+
             self.check_duplicate_email(email)
 
             CustomUser.objects.create_user(
@@ -31,20 +56,16 @@ class SignUpView(View, Validation):
                 is_doctor = is_doctor
             )
             return JsonResponse({'message' : 'SUCCESS'}, status=201)
-        except KeyError:
-            return JsonResponse({'message' : 'KEY_ERROR'}, status = 400)
-        except ValidationError as e:
-            return JsonResponse({'message' : e.message}, status=400)
         except ValueError as e:
             return JsonResponse({'message' : str(e)}, status=400)
         except IntegrityError:
             return JsonResponse({'message' : 'EMAIL_IS_ALREADY_REGISTERED'}, status=400)
 
 class LoginView(View, Validation):
+    @parse_request(LOGIN_SCHEMA)
     def post(self, request):
-        data     = json.loads(request.body)
-        email    = data['email']
-        password = data['password']
+        email    = request.data['email']
+        password = request.data['password']
         user     = authenticate(request, email=email, password=password)
 
         if user is not None:
@@ -54,10 +75,11 @@ class LoginView(View, Validation):
                     login(request, user)
 
                     return JsonResponse({
-                        'message'     : 'SUCCESS_PATIENT_LOGIN',
-                        "access_token": self.generate_jwt(user),
-                        'user_id'     : user.id,
-                        'user_name'   : user.name
+                        'message'      : 'SUCCESS_PATIENT_LOGIN',
+                        "access_token" : self.generate_jwt(user),
+                        "refresh_token": self.generate_refresh_token(user),
+                        'user_id'      : user.id,
+                        'user_name'    : user.name
                     }, status=200)
                 else:
                     return JsonResponse({
@@ -68,10 +90,11 @@ class LoginView(View, Validation):
                 login(request, user)
 
                 return JsonResponse({
-                    'message'     : 'SUCCESS_LOGIN',
-                    "access_token": self.generate_jwt(user),
-                    'user_id'     : user.id,
-                    'user_name'   : user.name
+                    'message'      : 'SUCCESS_LOGIN',
+                    "access_token" : self.generate_jwt(user),
+                    "refresh_token": self.generate_refresh_token(user),
+                    'user_id'      : user.id,
+                    'user_name'    : user.name
                 }, status=200)
 
             else:
@@ -79,29 +102,70 @@ class LoginView(View, Validation):
         else:
             return JsonResponse({'message' : 'WRONG_EMAIL_OR_PASSWORD'}, status=401)
 
+class TokenRefreshView(View, Validation, TokenRevocation):
+    @parse_request(REFRESH_TOKEN_SCHEMA)
+    def post(self, request):
+        try:
+            payload = jwt.decode(request.data['refresh_token'], settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+
+            if payload.get('type') != 'refresh':
+                return JsonResponse({'message' : 'INVALID_TOKEN'}, status=400)
+
+            # A primary-key lookup only, deleted accounts and changed passwords end the session
+            user = CustomUser.objects.filter(id=payload['user_id']).only('id', 'name', 'is_doctor', 'password').first()
+            if user is None or not constant_time_compare(payload['password'], self.password_fingerprint(user)):
+                return JsonResponse({'message' : 'REVOKED_TOKEN'}, status=401)
+
+            if not self.revoke_token(payload):
+                return JsonResponse({'message' : 'REVOKED_TOKEN'}, status=401)
+
+            return JsonResponse({
+                'message'      : 'SUCCESS_TOKEN_REFRESH',
+                'access_token' : self.generate_jwt(user),
+                'refresh_token': self.generate_refresh_token(user)
+            }, status=200)
+        except KeyError:
+            return JsonResponse({'message' : 'INVALID_TOKEN'}, status=400)
+        except jwt.ExpiredSignatureError:
+            return JsonResponse({'message' : 'EXPIRED_TOKEN'}, status=401)
+        except jwt.exceptions.InvalidTokenError:
+            return JsonResponse({'message' : 'INVALID_TOKEN'}, status=400)
+
+class LogoutView(View, TokenRevocation):
+    @parse_request(REFRESH_TOKEN_SCHEMA)
+    def post(self, request):
+        try:
+            payload = jwt.decode(request.data['refresh_token'], settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+
+            if payload.get('type') != 'refresh':
+                return JsonResponse({'message' : 'INVALID_TOKEN'}, status=400)
+
+            self.revoke_token(payload)
+            return JsonResponse({'message' : 'SUCCESS_LOGOUT'}, status=200)
+        except jwt.ExpiredSignatureError:
+            return JsonResponse({'message' : 'EXPIRED_TOKEN'}, status=401)
+        except jwt.exceptions.InvalidTokenError:
+            return JsonResponse({'message' : 'INVALID_TOKEN'}, status=400)
+
 class CheckDuplicateEmailView(View, Validation):
+    @parse_request(CHECK_DUPLICATE_EMAIL_SCHEMA)
     def post(self, request):
         try:
-            data  = json.loads(request.body)
-            email = data['email']
-            self.check_duplicate_email(email)
+            self.check_duplicate_email(request.data['email'])
             
             return JsonResponse({'message' : 'CAN_REGISTER_WITH_THIS_EMAIL'}, status=201)
         except IntegrityError:
             return JsonResponse({'message' : 'EMAIL_IS_ALREADY_REGISTERED'}, status=400)
-        except KeyError:
-            return JsonResponse({'message' : 'KEY_ERROR'}, status = 400)
 
 class PasswordChangeView(View, Validation):
+    @parse_request(PASSWORD_CHANGE_SCHEMA)
     def post(self, request):
-        data            = json.loads(request.body)
-        email           = data['email']
-        old_password    = data['old_password']
-        new_password    = data['new_password']
+        email        = request.data['email']
+        old_password = request.data['old_password']
+        new_password = request.data['new_password']
         try:
             user = CustomUser.objects.get(email=email)
             user.check_password(old_password)
-            self.validate_password(new_password)
             user.set_password(new_password)
             user.save()
             return JsonResponse({
@@ -110,6 +174,4 @@ class PasswordChangeView(View, Validation):
                 'new_password': new_password,
                 }, status=201) 
         except ObjectDoesNotExist:
-            return JsonResponse({'message' : 'NO_USER_EXISTS_WITH_THIS_EMAIL'}, status=404)
-        except ValidationError as e:
-            return JsonResponse({'message' : e.message}, status=400)
\ No newline at end of file
+            return JsonResponse({'message' : 'NO_USER_EXISTS_WITH_THIS_EMAIL'}, status=404)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import re
+
+from django.conf              import settings
+from django.utils.text        import compress_string
+from django.utils.cache       import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RE_BROTLI    = re.compile(r'\bbr\b')
+RE_GZIP      = re.compile(r'\bgzip\b')
+PIN_COOKIE   = 'primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses JSON responses of at least COMPRESSION_MIN_SIZE bytes, with brotli
+    when it is installed and accepted, otherwise gzip. Smaller bodies go out as-is
+    because the encoding overhead outweighs the saving.
+    """
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        if not response.get('Content-Type', '').startswith('application/json') or len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accepted = request.headers.get('Accept-Encoding', '')
+        if brotli and RE_BROTLI.search(accepted):
+            encoding, content = 'br', brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+        elif RE_GZIP.search(accepted):
+            encoding, content = 'gzip', compress_string(response.content)
+        else:
+            return response
+
+        if len(content) >= len(response.content):
+            return response
+
+        # The bytes differ from what a strong validator promised, so only a weak one stays valid
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = f'W/{etag}'
+
+        response.content                     = content
+        response.headers['Content-Length']   = str(len(content))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+class PrimaryPinningMiddleware(MiddlewareMixin):
+    """
+    A successful write pins the client to the primary for PRIMARY_PIN_SECONDS, so
+    its next reads see the change even if the replicas have not caught up yet.
+    """
+    def process_request(self, request):
+        request.pinned_to_primary = request.get_signed_cookie(
+            PIN_COOKIE, default=None, salt=PIN_COOKIE, max_age=settings.PRIMARY_PIN_SECONDS
+        ) is not None
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_signed_cookie(PIN_COOKIE, '1', salt=PIN_COOKIE, max_age=settings.PRIMARY_PIN_SECONDS, httponly=True)
+        return response
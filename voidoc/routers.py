@@ -0,0 +1,66 @@
+import random
+
+from contextvars import ContextVar
+
+from django.db   import router, DEFAULT_DB_ALIAS
+from django.conf import settings
+
+replica_reads = ContextVar('replica_reads', default=False)
+shard         = ContextVar('shard', default=None)
+
+# Patient-owned tables, split across APPOINTMENT_SHARDS by appointments.repository
+SHARDED_MODELS = {
+    'appointments.Appointment', 'appointments.UserAppointment', 'appointments.AppointmentImage',
+    'appointments.ArchivedAppointment', 'appointments.ArchivedUserAppointment', 'appointments.ArchivedAppointmentImage',
+    'appointments.PatientFeed', 'appointments.UploadSession'
+}
+
+class PatientShardRouter:
+    """
+    Sends sharded models to the shard made current by appointments.repository.
+    Without a current shard they fall through to the primary/replica routing, and
+    so do reads on the 'default' shard since DATABASE_REPLICAS follow 'default'.
+    """
+    def db_for_read(self, model, **hints):
+        alias = self.db_for_write(model, **hints)
+        return alias if alias != DEFAULT_DB_ALIAS else None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label in SHARDED_MODELS:
+            return shard.get()
+        return None
+
+def databases_of(model):
+    if model._meta.label in SHARDED_MODELS:
+        return settings.APPOINTMENT_SHARDS
+    return [router.db_for_read(model)]
+
+class PrimaryReplicaRouter:
+    """
+    Reads go to a replica only inside views wrapped in read_replica, and only for
+    clients that are not pinned to the primary after a recent write. Everything
+    else, management commands included, stays on the primary.
+    """
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+def reading_replica():
+    # Sharded reads outside 'default' never reach a replica, see PatientShardRouter
+    return bool(replica_reads.get() and settings.DATABASE_REPLICAS) and shard.get() in (None, DEFAULT_DB_ALIAS)
+
+def read_replica(func):
+    def wrapper(self, request, *args, **kwargs):
+        token = replica_reads.set(not getattr(request, 'pinned_to_primary', False))
+        try:
+            return func(self, request, *args, **kwargs)
+        finally:
+            replica_reads.reset(token)
+    return wrapper
@@ -1,8 +1,25 @@
 import os
 
 from pathlib     import Path
+from datetime    import timedelta
 from my_settings import SECRET_KEY, DATABASES, DEBUG, ALGORITHM, LOCAL_PATH
 
+# Production needs a shared backend (Redis, Memcached): token revocation and cache versions live here.
+# The LocMem fallback is per process and only suits development and tests, see the users.W001 deploy check.
+try:
+    from my_settings import CACHES
+except ImportError:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+try:
+    from my_settings import APPOINTMENT_SHARDS
+except ImportError:
+    APPOINTMENT_SHARDS = ['default']
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,9 +55,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'voidoc.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'voidoc.middleware.PrimaryPinningMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -73,6 +93,15 @@ WSGI_APPLICATION = 'voidoc.wsgi.application'
 
 DATABASES = DATABASES
 
+# Patient-owned appointment tables are spread over APPOINTMENT_SHARDS by patient id,
+# every other alias in my_settings.DATABASES is a read replica of 'default'
+DATABASE_ROUTERS    = ['voidoc.routers.PatientShardRouter', 'voidoc.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS   = [alias for alias in DATABASES if alias != 'default' and alias not in APPOINTMENT_SHARDS]
+PRIMARY_PIN_SECONDS = 10
+
+# Cache entries computed from a replica may miss the latest write, they expire once the replica has caught up
+REPLICA_CACHE_TIMEOUT = PRIMARY_PIN_SECONDS
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -150,9 +179,57 @@ AUTH_USER_MODEL = "users.CustomUser"
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL  = '/media/'
 
+# Uploaded files are stored by content hash, see voidoc/storage.py. Files written or reused
+# within the grace period are never deleted by release(), their rows may still be uncommitted
+DEFAULT_FILE_STORAGE  = 'voidoc.storage.ContentAddressedStorage'
+STORAGE_RELEASE_GRACE = 10 * 60
+
+# Resumable uploads: partial files live outside MEDIA_ROOT until their last chunk arrives
+UPLOAD_SESSION_ROOT     = os.path.join(BASE_DIR, 'upload_sessions')
+UPLOAD_SESSION_LIFETIME = timedelta(days=1)
+UPLOAD_MAX_SIZE         = 10 * 1024 * 1024
+UPLOAD_MAX_REQUEST_SIZE = 6 * UPLOAD_MAX_SIZE
+UPLOAD_CHUNK_SIZE       = 64 * 1024
+
+# 'local' streams wound images through Django, 'presigned' lets clients PUT them straight to OBJECT_STORE
+IMAGE_UPLOAD_MODE         = 'local'
+OBJECT_STORE              = 'appointments.presigned.FilesystemObjectStore'
+OBJECT_STORE_ROOT         = MEDIA_ROOT
+OBJECT_STORE_URL          = '/appointments/object-store'
+PRESIGNED_UPLOAD_LIFETIME = 900
+
+# JSON responses below this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+BROTLI_QUALITY       = 5
+
+# Per-patient appointment list/detail responses, dropped early by a version bump on every write
+RESPONSE_CACHE_TIMEOUT       = 300
+RESPONSE_CACHE_METRICS_FLUSH = 100
+
+# Shared results such as the doctor directory and availability are computed once per key, see compute_once
+DIRECTORY_CACHE_TIMEOUT    = 300
+AVAILABILITY_CACHE_TIMEOUT = 30
+CACHE_EARLY_REFRESH_BETA   = 1.0
+CACHE_LEASE_TIMEOUT        = 10
+CACHE_LEASE_POLL           = 0.05
+
 # Algorithm
 ALGORITHM = ALGORITHM
 
+# JWT
+ACCESS_TOKEN_LIFETIME  = timedelta(minutes=30)
+REFRESH_TOKEN_LIFETIME = timedelta(days=14)
+
+# Email Bloom Filter
+EMAIL_FILTER_ERROR_RATE       = 0.01
+EMAIL_FILTER_REBUILD_INTERVAL = 300
+
+# Doctor Search Index
+DOCTOR_INDEX_REBUILD_INTERVAL = 300
+
+# Working Time Storage ('rows': one WorkingTime per slot, 'mask': WorkingDay.slot_mask)
+WORKING_TIME_STORAGE = 'rows'
+
 # Local Path
 LOCAL_PATH = LOCAL_PATH
 
@@ -0,0 +1,105 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+
+from contextlib import contextmanager
+
+from django.apps               import apps
+from django.conf               import settings
+from django.db.models          import FileField
+from django.views.static       import serve
+from django.core.files         import locks
+from django.core.files.storage import FileSystemStorage, default_storage
+
+from voidoc.routers import databases_of
+
+CONTENT_ADDRESSED_NAME  = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}(?:\.\w+)?$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Plain columns that hold a storage name, completed uploads point at their file before an image row does
+NAME_FIELDS = {('appointments.UploadSession', 'file_name')}
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Saves every file as <upload_to>/<ab>/<cd>/<sha256><ext>, so identical uploads
+    share one file and a name never points at different bytes.
+    """
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        content.seek(0)
+
+        directory, filename = os.path.split(name)
+        name = os.path.join(directory, digest[:2], digest[2:4], digest + os.path.splitext(filename)[1].lower())
+        if self.exists(name) and self.touch(name):
+            return name
+
+        # Write under a unique name and rename, so concurrent uploads of the same bytes cannot collide
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def touch(self, name):
+        # A reused file is referenced by a row that is not committed yet, the fresh mtime keeps release() off it
+        with locked(self.path(name)) as present:
+            if present:
+                os.utime(self.path(name))
+            return present
+
+@contextmanager
+def locked(path):
+    """
+    Holds an exclusive lock on the file at path, yielding whether it still exists.
+    Writers reusing a file and release() deleting it take turns through this lock.
+    """
+    try:
+        handle = open(path, 'rb')
+    except FileNotFoundError:
+        yield False
+        return
+
+    with handle:
+        locks.lock(handle, locks.LOCK_EX)
+        try:
+            # The file may have been unlinked while we waited for the lock
+            yield os.path.exists(path) and os.path.samestat(os.fstat(handle.fileno()), os.stat(path))
+        finally:
+            locks.unlock(handle)
+
+def file_fields():
+    for model in apps.get_models():
+        for field in model._meta.fields:
+            if isinstance(field, FileField) or (model._meta.label, field.name) in NAME_FIELDS:
+                yield model, field
+
+def could_reference(field, name):
+    if not isinstance(field, FileField):
+        return True
+    return callable(field.upload_to) or name.startswith(f'{field.upload_to}/')
+
+def reference_count(name):
+    # Every file column is indexed, and only columns whose upload_to matches the name are asked
+    return sum(
+        model._default_manager.using(alias).filter(**{field.name : name}).count()
+        for model, field in file_fields() if could_reference(field, name) for alias in databases_of(model)
+    )
+
+def release(names):
+    # Content-addressed files are shared between rows, so a file is only deleted once nothing references it.
+    # Recently written or reused files may belong to a transaction that has not committed its row yet, those
+    # are left for collect_orphan_images.
+    for name in names:
+        path = default_storage.path(name)
+        with locked(path) as present:
+            if present and time.time() - os.path.getmtime(path) >= settings.STORAGE_RELEASE_GRACE and not reference_count(name):
+                default_storage.delete(name)
+
+def serve_media(request, path):
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if CONTENT_ADDRESSED_NAME.search(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -1,7 +1,7 @@
-from django.urls               import path, include, re_path
-from django.contrib            import admin
-from django.conf               import settings
-from django.views.static import serve
+from django.urls    import path, include, re_path
+from django.contrib import admin
+
+from voidoc.storage import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,7 +10,5 @@ urlpatterns = [
 ]
 
 urlpatterns += [
-    re_path(r'^media/(?P<path>.*)$', serve, {
-        'document_root': settings.MEDIA_ROOT
-    }),
+    re_path(r'^media/(?P<path>.*)$', serve_media),
 ]
\ No newline at end of file
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voidoc.settings')
 
 application = get_wsgi_application()
+
+# Only serving processes build the signup email filter, tests and management commands never import this module
+from users.bloom import email_filter
+
+email_filter.start()